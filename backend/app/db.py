@@ -1,22 +1,135 @@
+from contextlib import contextmanager
 import json
 import os
+import queue
 import sqlite3
-from typing import Iterable, List, Optional
+import threading
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
 
 DB_PATH = os.getenv("MEDSCHED_DB_PATH", os.path.join(os.path.dirname(__file__), "data.db"))
 
+# Aplicados a cada conexão nova. WAL deixa leituras correrem junto com a escrita e, com
+# synchronous=NORMAL, o commit não espera fsync (só o checkpoint espera).
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+)
+# Comandos preparados mantidos por conexão (cache do módulo sqlite3, indexado pelo texto SQL).
+_COMANDOS_EM_CACHE = 128
+
+_SQL_SALVAR_USUARIO = """
+    INSERT INTO usuarios (id, nome, email, telefone, perfil, especialidades, senha)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(email) DO UPDATE SET
+        nome=excluded.nome,
+        telefone=excluded.telefone,
+        perfil=excluded.perfil,
+        especialidades=excluded.especialidades,
+        senha=excluded.senha
+"""
+
+# Alterações de agenda/consultas aceitas por `aplicar_alteracoes`: tipo -> comando SQL.
+_SQL_ALTERACOES = {
+    "slot": "INSERT INTO slots (medico_id, inicio, fim, bloqueado) VALUES (?, ?, ?, ?)",
+    "desbloqueio": "DELETE FROM slots WHERE medico_id = ? AND inicio = ? AND fim = ? AND bloqueado = 1",
+    "regra": """
+        INSERT INTO regras (medico_id, dia_semana, hora_inicio, hora_fim, duracao_minutos, vigente_de, vigente_ate)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """,
+    "regra_removida": """
+        DELETE FROM regras WHERE medico_id = ? AND dia_semana = ? AND hora_inicio = ? AND hora_fim = ?
+            AND duracao_minutos = ? AND vigente_de = ? AND vigente_ate IS ?
+    """,
+    "consulta": """
+        INSERT INTO consultas (id, paciente_id, medico_id, inicio, fim, status, observacoes, criada_em, atualizada_em)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET
+            status=excluded.status,
+            observacoes=excluded.observacoes,
+            atualizada_em=excluded.atualizada_em
+    """,
+}
+
+
+class _Conexao(sqlite3.Connection):
+    # geração do pool em que a conexão foi aberta; `Database.fechar` invalida as anteriores
+    geracao = 0
+
 
 class Database:
-    def __init__(self, path: str = DB_PATH) -> None:
+    """
+    Acesso ao SQLite por um pool pequeno de conexões duradouras: cada operação empresta uma
+    conexão e a devolve ao terminar, então pragmas e comandos preparados são reaproveitados
+    entre chamadas e threads. Conexões além de `tamanho_pool` são fechadas na devolução.
+    """
+
+    def __init__(self, path: str = DB_PATH, tamanho_pool: int = 8) -> None:
         self.path = path
+        self._pool: "queue.LifoQueue[_Conexao]" = queue.LifoQueue(maxsize=tamanho_pool)
+        self._guarda = threading.Lock()
+        self._geracao = 0
+        self._esquema_pronto = False
         self._ensure()
 
-    def _connect(self):
-        return sqlite3.connect(self.path)
+    def _connect(self) -> _Conexao:
+        conn = sqlite3.connect(
+            self.path, factory=_Conexao, check_same_thread=False, cached_statements=_COMANDOS_EM_CACHE
+        )
+        conn.geracao = self._geracao
+        conn.row_factory = sqlite3.Row
+        for pragma in _PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def _conexao(self) -> Iterator[_Conexao]:
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            self._devolver(conn)
+
+    def _devolver(self, conn: _Conexao) -> None:
+        with self._guarda:
+            if conn.geracao == self._geracao:
+                try:
+                    self._pool.put_nowait(conn)
+                    return
+                except queue.Full:
+                    pass
+        conn.close()
+
+    def fechar(self) -> None:
+        """
+        Fecha as conexões ociosas e descarta as emprestadas quando voltarem; a próxima operação
+        reabre o arquivo (e recria o esquema), o que permite apagá-lo ou trocá-lo em seguida.
+        """
+        with self._guarda:
+            self._geracao += 1
+            self._esquema_pronto = False
+            while True:
+                try:
+                    conn = self._pool.get_nowait()
+                except queue.Empty:
+                    break
+                conn.close()
 
     def _ensure(self) -> None:
-        conn = self._connect()
-        conn.execute(
+        if self._esquema_pronto:
+            return
+        with self._conexao() as conn:
+            self._criar_esquema(conn)
+        self._esquema_pronto = True
+
+    @staticmethod
+    def _criar_esquema(conn: sqlite3.Connection) -> None:
+        conn.executescript(
             """
             CREATE TABLE IF NOT EXISTS usuarios (
                 id TEXT PRIMARY KEY,
@@ -27,10 +140,49 @@ class Database:
                 especialidades TEXT,
                 senha TEXT
             );
+
+            -- horários em minutos desde 1970-01-01 (UTC), como em Agenda
+            CREATE TABLE IF NOT EXISTS slots (
+                medico_id TEXT NOT NULL,
+                inicio INTEGER NOT NULL,
+                fim INTEGER NOT NULL,
+                bloqueado INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_slots_medico_inicio ON slots (medico_id, inicio);
+
+            CREATE TABLE IF NOT EXISTS regras (
+                medico_id TEXT NOT NULL,
+                dia_semana INTEGER NOT NULL,
+                hora_inicio TEXT NOT NULL,
+                hora_fim TEXT NOT NULL,
+                duracao_minutos INTEGER NOT NULL,
+                vigente_de TEXT NOT NULL,
+                vigente_ate TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_regras_medico ON regras (medico_id);
+
+            CREATE TABLE IF NOT EXISTS consultas (
+                id TEXT PRIMARY KEY,
+                paciente_id TEXT NOT NULL,
+                medico_id TEXT NOT NULL,
+                inicio TEXT NOT NULL,
+                fim TEXT NOT NULL,
+                status TEXT NOT NULL,
+                observacoes TEXT,
+                criada_em TEXT NOT NULL,
+                atualizada_em TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_consultas_medico_inicio ON consultas (medico_id, inicio);
+            CREATE INDEX IF NOT EXISTS idx_consultas_paciente_inicio ON consultas (paciente_id, inicio);
+            CREATE INDEX IF NOT EXISTS idx_consultas_status ON consultas (status);
+
+            -- tokens assinados revogados antes de expirar (segundos desde 1970-01-01, UTC)
+            CREATE TABLE IF NOT EXISTS tokens_revogados (
+                jti TEXT PRIMARY KEY,
+                expira_em INTEGER NOT NULL
+            );
             """
         )
-        conn.commit()
-        conn.close()
 
     def salvar_usuario(
         self,
@@ -43,38 +195,68 @@ class Database:
         especialidades: Optional[List[str]],
         senha: Optional[str],
     ) -> None:
-        conn = self._connect()
-        conn.execute(
-            """
-            INSERT INTO usuarios (id, nome, email, telefone, perfil, especialidades, senha)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(email) DO UPDATE SET
-                nome=excluded.nome,
-                telefone=excluded.telefone,
-                perfil=excluded.perfil,
-                especialidades=excluded.especialidades,
-                senha=excluded.senha;
-            """,
-            (
-                id,
-                nome,
-                email.lower().strip(),
-                telefone,
-                perfil,
-                json.dumps(especialidades or []),
-                senha,
-            ),
-        )
-        conn.commit()
-        conn.close()
+        self._ensure()
+        with self._conexao() as conn, conn:
+            conn.execute(
+                _SQL_SALVAR_USUARIO,
+                (id, nome, email.lower().strip(), telefone, perfil, json.dumps(especialidades or []), senha),
+            )
+
+    def atualizar_senha(self, usuario_id: str, senha: str) -> None:
+        self._ensure()
+        with self._conexao() as conn, conn:
+            conn.execute("UPDATE usuarios SET senha = ? WHERE id = ?", (senha, usuario_id))
 
     def carregar_por_perfil(self, perfil: str) -> Iterable[sqlite3.Row]:
-        conn = self._connect()
-        conn.row_factory = sqlite3.Row
-        cur = conn.execute("SELECT * FROM usuarios WHERE perfil = ?", (perfil,))
-        rows = cur.fetchall()
-        conn.close()
-        return rows
+        return self._consultar("SELECT * FROM usuarios WHERE perfil = ?", (perfil,))
+
+    def carregar_usuarios(self) -> Iterator[Tuple[Any, ...]]:
+        """
+        Todos os usuários numa única consulta, entregues à medida que o cursor avança, como
+        tuplas (id, nome, email, perfil, telefone, senha, especialidades) — sem `sqlite3.Row`,
+        que pesa na subida com muitos usuários.
+        """
+        self._ensure()
+        with self._conexao() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.arraysize = 1000
+            yield from cursor.execute(
+                "SELECT id, nome, email, perfil, telefone, senha, especialidades FROM usuarios"
+            )
+
+    def aplicar_alteracoes(self, alteracoes: Iterable[Tuple[str, Tuple[Any, ...]]]) -> None:
+        """Grava um lote de alterações (ver `_SQL_ALTERACOES`) numa única transação."""
+        self._ensure()
+        with self._conexao() as conn, conn:
+            for tipo, params in alteracoes:
+                conn.execute(_SQL_ALTERACOES[tipo], params)
+
+    def revogar_token(self, jti: str, expira_em: int) -> None:
+        self._ensure()
+        with self._conexao() as conn, conn:
+            conn.execute("INSERT OR IGNORE INTO tokens_revogados (jti, expira_em) VALUES (?, ?)", (jti, expira_em))
+
+    def carregar_tokens_revogados(self, agora: int) -> List[str]:
+        """Revogações ainda relevantes; as de tokens já expirados são apagadas no caminho."""
+        self._ensure()
+        with self._conexao() as conn, conn:
+            conn.execute("DELETE FROM tokens_revogados WHERE expira_em <= ?", (agora,))
+            return [jti for (jti,) in conn.execute("SELECT jti FROM tokens_revogados")]
+
+    def carregar_slots(self) -> List[sqlite3.Row]:
+        return self._consultar("SELECT * FROM slots ORDER BY medico_id, inicio")
+
+    def carregar_regras(self) -> List[sqlite3.Row]:
+        return self._consultar("SELECT * FROM regras ORDER BY medico_id")
+
+    def carregar_consultas(self) -> List[sqlite3.Row]:
+        return self._consultar("SELECT * FROM consultas ORDER BY inicio")
+
+    def _consultar(self, sql: str, params: Tuple[Any, ...] = ()) -> List[sqlite3.Row]:
+        self._ensure()
+        with self._conexao() as conn:
+            return conn.execute(sql, params).fetchall()
 
 
 db = Database()
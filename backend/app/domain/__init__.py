@@ -1,22 +1,29 @@
 """Camada de domínio do sistema de agendamento médico."""
 
-from .enums import Perfil, StatusConsulta
-from .entities import Usuario, Paciente, Medico, Administrador, Agenda, SlotAgenda, Consulta
-from .services import AgendamentoService
-from .exceptions import DomainError, SchedulingError, ValidationError
+from .enums import Perfil, StatusConsulta, TipoMudanca
+from .entities import Usuario, Paciente, Medico, Administrador, Agenda, SlotAgenda, RegraRecorrencia, Consulta
+from .services import AgendamentoService, RepositorioAgendamento, RepositorioComposto, Mudanca, Versoes
+from .exceptions import DomainError, LoteRejeitadoError, SchedulingError, ValidationError
 
 __all__ = [
     "Perfil",
     "StatusConsulta",
+    "TipoMudanca",
     "Usuario",
     "Paciente",
     "Medico",
     "Administrador",
     "Agenda",
     "SlotAgenda",
+    "RegraRecorrencia",
     "Consulta",
     "AgendamentoService",
+    "RepositorioAgendamento",
+    "RepositorioComposto",
+    "Mudanca",
+    "Versoes",
     "DomainError",
     "SchedulingError",
+    "LoteRejeitadoError",
     "ValidationError",
 ]
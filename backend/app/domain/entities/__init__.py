@@ -1,5 +1,5 @@
 from .user import Usuario, Paciente, Medico, Administrador
-from .agenda import Agenda, SlotAgenda
+from .agenda import Agenda, RegraRecorrencia, SlotAgenda
 from .appointment import Consulta
 
 __all__ = [
@@ -9,5 +9,6 @@ __all__ = [
     "Administrador",
     "Agenda",
     "SlotAgenda",
+    "RegraRecorrencia",
     "Consulta",
 ]
@@ -1,10 +1,55 @@
 from __future__ import annotations
+from array import array
+from bisect import bisect_left, bisect_right
 from dataclasses import dataclass, field
-from datetime import datetime
-from typing import List, Optional
+from datetime import date, datetime, time, timedelta, timezone
+import heapq
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 from ..exceptions import ValidationError
 
+_EPOCA = datetime(1970, 1, 1)
+_MINUTO = timedelta(minutes=1)
+_MINUTOS_POR_DIA = 24 * 60
+# Janela usada para gerar slots de regras quando a consulta não informa `ate`.
+HORIZONTE_REGRAS = timedelta(days=28)
+# Até quantos slots um lote é inserido um a um antes de valer a pena mesclar os arrays inteiros.
+_INSERCOES_PONTUAIS = 32
+
+
+def utc_sem_fuso(instante: datetime) -> datetime:
+    """
+    Instante em UTC sem fuso, a forma em que o domínio guarda e compara horários: valores com
+    fuso ("Z", "+00:00", "-03:00") são convertidos; valores sem fuso já são tomados como UTC.
+    """
+    if instante.tzinfo is not None:
+        return instante.astimezone(timezone.utc).replace(tzinfo=None)
+    return instante
+
+
+def minutos_desde_epoca(instante: datetime) -> int:
+    """Converte um instante (UTC) em minutos desde 1970-01-01; exige precisão de minutos."""
+    instante = utc_sem_fuso(instante)
+    if instante.second or instante.microsecond:
+        raise ValidationError("Horários da agenda devem ser informados em minutos inteiros.")
+    return (instante - _EPOCA) // _MINUTO
+
+
+def minutos_arredondados(instante: datetime, para_cima: bool = False) -> int:
+    """Como `minutos_desde_epoca`, mas aceita segundos arredondando para baixo (ou para cima)."""
+    if para_cima:
+        return -((_EPOCA - utc_sem_fuso(instante)) // _MINUTO)
+    return (utc_sem_fuso(instante) - _EPOCA) // _MINUTO
+
+
+def instante_de_minutos(minutos: int) -> datetime:
+    return _EPOCA + timedelta(minutes=minutos)
+
+
+def _limite_em_minutos(instante: datetime) -> int:
+    # Limites de busca podem ter segundos: arredonda para o primeiro minuto >= instante.
+    return minutos_arredondados(instante, para_cima=True)
+
 
 @dataclass(frozen=True)
 class SlotAgenda:
@@ -19,43 +64,283 @@ class SlotAgenda:
         return self.inicio < outro.fim and outro.inicio < self.fim
 
 
+@dataclass(frozen=True)
+class RegraRecorrencia:
+    """Disponibilidade semanal: slots de `duracao_minutos` entre `hora_inicio` e `hora_fim` (UTC)."""
+
+    dia_semana: int  # 0 = segunda-feira
+    hora_inicio: time
+    hora_fim: time
+    duracao_minutos: int
+    vigente_de: date
+    vigente_ate: Optional[date] = None
+
+    def __post_init__(self) -> None:
+        if not 0 <= self.dia_semana <= 6:
+            raise ValidationError("Dia da semana inválido (0 = segunda, 6 = domingo).")
+        if any(h.second or h.microsecond for h in (self.hora_inicio, self.hora_fim)):
+            raise ValidationError("Horários da agenda devem ser informados em minutos inteiros.")
+        if self.duracao_minutos <= 0 or self._abertura + self.duracao_minutos > self._fechamento:
+            raise ValidationError("Regra inválida: o expediente deve comportar ao menos um slot.")
+        if self.vigente_ate is not None and self.vigente_ate < self.vigente_de:
+            raise ValidationError("Regra inválida: vigência termina antes de começar.")
+
+    @property
+    def _abertura(self) -> int:
+        return self.hora_inicio.hour * 60 + self.hora_inicio.minute
+
+    @property
+    def _fechamento(self) -> int:
+        return self.hora_fim.hour * 60 + self.hora_fim.minute
+
+    def vale_em(self, dia: date) -> bool:
+        if dia.weekday() != self.dia_semana or dia < self.vigente_de:
+            return False
+        return self.vigente_ate is None or dia <= self.vigente_ate
+
+    def sobrepoe(self, outra: "RegraRecorrencia") -> bool:
+        if self.dia_semana != outra.dia_semana:
+            return False
+        if self._fechamento <= outra._abertura or outra._fechamento <= self._abertura:
+            return False
+        fim_a, fim_b = self.vigente_ate or date.max, outra.vigente_ate or date.max
+        return self.vigente_de <= fim_b and outra.vigente_de <= fim_a
+
+    def gerar(self, dia: date) -> Iterator[Tuple[int, int]]:
+        """(início, fim) em minutos desde a época de cada slot que a regra produz em `dia`."""
+        if not self.vale_em(dia):
+            return
+        base = minutos_desde_epoca(datetime.combine(dia, time()))
+        for minuto in range(self._abertura, self._fechamento - self.duracao_minutos + 1, self.duracao_minutos):
+            yield base + minuto, base + minuto + self.duracao_minutos
+
+    def intervalos(self, de: datetime, ate: datetime) -> Iterator[Tuple[datetime, datetime]]:
+        """Slots que a regra produz com início em [de, ate), como pares de datetimes (UTC)."""
+        de_min, ate_min = _limite_em_minutos(de), _limite_em_minutos(ate)
+        dia = instante_de_minutos(de_min).date()
+        while dia <= instante_de_minutos(ate_min).date():
+            for ini, fi in self.gerar(dia):
+                if de_min <= ini < ate_min:
+                    yield instante_de_minutos(ini), instante_de_minutos(fi)
+            dia += timedelta(days=1)
+
+    def gera(self, inicio: int, fim: int) -> bool:
+        if fim - inicio != self.duracao_minutos:
+            return False
+        instante = instante_de_minutos(inicio)
+        if not self.vale_em(instante.date()):
+            return False
+        desde_abertura = instante.hour * 60 + instante.minute - self._abertura
+        return (
+            desde_abertura >= 0
+            and desde_abertura % self.duracao_minutos == 0
+            and self._abertura + desde_abertura + self.duracao_minutos <= self._fechamento
+        )
+
+
 @dataclass
 class Agenda:
+    """
+    Slots de um médico em formato compacto: arrays paralelos de início/fim em minutos
+    desde a época (UTC) e um byte de bloqueio por slot, ordenados por início.
+    Objetos `SlotAgenda` só são criados ao iterar `slots()`.
+
+    Regras de recorrência geram slots sob demanda na janela consultada; um slot gerado é
+    omitido quando colide com qualquer slot explícito (livre ou bloqueado), de modo que
+    `bloquear` serve para registrar exceções às regras.
+    """
+
     medico_id: str
-    _slots: List[SlotAgenda] = field(default_factory=list)
+    _inicios: array = field(default_factory=lambda: array("q"), init=False, repr=False)
+    _fins: array = field(default_factory=lambda: array("q"), init=False, repr=False)
+    _bloqueados: bytearray = field(default_factory=bytearray, init=False, repr=False)
+    _maior_duracao: int = field(default=0, init=False, repr=False)
+    _regras: List[RegraRecorrencia] = field(default_factory=list, init=False, repr=False)
+
+    @classmethod
+    def restaurar(cls, medico_id: str, intervalos: Iterable[Tuple[int, int, bool]]) -> "Agenda":
+        """
+        Agenda a partir de (início, fim, bloqueado) em minutos desde a época, como lidos de uma
+        agenda já gravada: os arrays são montados direto, sem revalidar cada slot.
+        """
+        agenda = cls(medico_id=medico_id)
+        for ini, fi, bloqueado in sorted(intervalos):
+            agenda._inicios.append(ini)
+            agenda._fins.append(fi)
+            agenda._bloqueados.append(1 if bloqueado else 0)
+            agenda._maior_duracao = max(agenda._maior_duracao, fi - ini)
+        return agenda
+
+    def __len__(self) -> int:
+        return len(self._inicios)
+
+    def slots(self, de: Optional[datetime] = None, ate: Optional[datetime] = None) -> Iterator[SlotAgenda]:
+        """
+        Slots em ordem de início; `de`/`ate` restringem aos que começam em [de, ate).
+        Slots de regras são gerados a partir de `de` (ou de agora) até `ate` (ou `HORIZONTE_REGRAS`).
+        """
+        primeiro = bisect_left(self._inicios, _limite_em_minutos(de)) if de is not None else 0
+        ultimo = bisect_left(self._inicios, _limite_em_minutos(ate)) if ate is not None else len(self._inicios)
+        explicitos = (self._materializar(i) for i in range(primeiro, ultimo))
+        if not self._regras:
+            return explicitos
+        return heapq.merge(explicitos, self.slots_de_regras(de, ate), key=lambda s: s.inicio)
+
+    def slots_de_regras(self, de: Optional[datetime] = None, ate: Optional[datetime] = None) -> Iterator[SlotAgenda]:
+        """Só os slots gerados por regras, na mesma janela de `slots()`."""
+        if not self._regras:
+            return iter(())
+        de_min = _limite_em_minutos(de if de is not None else datetime.utcnow())
+        ate_min = _limite_em_minutos(ate) if ate is not None else de_min + HORIZONTE_REGRAS // _MINUTO
+        return (
+            SlotAgenda(instante_de_minutos(ini), instante_de_minutos(fi)) for ini, fi in self._gerar(de_min, ate_min)
+        )
+
+    def explicitos(self, inicio: int, fim: int) -> Iterator[Tuple[int, int, bool]]:
+        """(início, fim, bloqueado) em minutos de cada slot explícito que colide com [inicio, fim)."""
+        for pos in self._sobrepostos(inicio, fim):
+            yield self._inicios[pos], self._fins[pos], bool(self._bloqueados[pos])
 
-    def slots(self) -> List[SlotAgenda]:
-        return list(self._slots)
+    def intervalos(self, inicio: int, fim: int) -> Iterator[Tuple[int, int, bool]]:
+        """(início, fim, bloqueado) em minutos de cada slot, explícito ou gerado, que colide com [inicio, fim)."""
+        yield from self.explicitos(inicio, fim)
+        if self._regras:
+            # slots de regras não atravessam a meia-noite: basta começar a gerar um dia antes
+            for ini, fi in self._gerar(inicio - _MINUTOS_POR_DIA, fim):
+                if fi > inicio:
+                    yield ini, fi, False
+
+    def regras(self) -> List[RegraRecorrencia]:
+        return list(self._regras)
+
+    def adicionar_regra(self, regra: RegraRecorrencia) -> None:
+        if any(r.sobrepoe(regra) for r in self._regras):
+            raise ValidationError("Nova regra se sobrepõe a uma regra existente.")
+        self._regras.append(regra)
+
+    def remover_regra(self, regra: RegraRecorrencia) -> None:
+        if regra not in self._regras:
+            raise ValidationError("Regra não encontrada.")
+        self._regras.remove(regra)
 
     def adicionar_slot(self, inicio: datetime, fim: datetime) -> None:
-        self._validar_intervalo(inicio, fim)
-        novo = SlotAgenda(inicio=inicio, fim=fim, bloqueado=False)
-        for s in self._slots:
-            if s.sobrepoe(novo):
-                raise ValidationError("Novo slot se sobrepõe a um slot existente.")
-        self._slots.append(novo)
-        self._slots.sort(key=lambda s: s.inicio)
+        ini, fi = self._validar_intervalo(inicio, fim)
+        if next(self._sobrepostos(ini, fi), None) is not None:
+            raise ValidationError("Novo slot se sobrepõe a um slot existente.")
+        self._inserir(ini, fi, bloqueado=False)
+
+    def adicionar_slots(self, intervalos: Iterable[Tuple[datetime, datetime]]) -> Tuple[int, List[Tuple[int, str]]]:
+        """
+        Publica vários slots livres numa única passada: valida, ordena e mescla os aceitos com
+        os arrays existentes. Retorna quantos entraram e (posição no lote, motivo) dos rejeitados.
+        """
+        rejeitados: List[Tuple[int, str]] = []
+        candidatos = []
+        for posicao, (inicio, fim) in enumerate(intervalos):
+            try:
+                ini, fi = self._validar_intervalo(inicio, fim)
+            except ValidationError as err:
+                rejeitados.append((posicao, str(err)))
+                continue
+            candidatos.append((ini, fi, posicao))
+        candidatos.sort()
+        aceitos: List[Tuple[int, int]] = []
+        for ini, fi, posicao in candidatos:
+            # aceitos estão ordenados e não se sobrepõem: basta comparar com o último
+            if aceitos and ini < aceitos[-1][1]:
+                rejeitados.append((posicao, "Novo slot se sobrepõe a outro slot do mesmo lote."))
+            elif next(self._sobrepostos(ini, fi), None) is not None:
+                rejeitados.append((posicao, "Novo slot se sobrepõe a um slot existente."))
+            else:
+                aceitos.append((ini, fi))
+        self._mesclar(aceitos)
+        rejeitados.sort()
+        return len(aceitos), rejeitados
 
     def bloquear(self, inicio: datetime, fim: datetime) -> None:
-        self._validar_intervalo(inicio, fim)
-        self._slots.append(SlotAgenda(inicio, fim, bloqueado=True))
-        self._slots.sort(key=lambda s: s.inicio)
+        ini, fi = self._validar_intervalo(inicio, fim)
+        self._inserir(ini, fi, bloqueado=True)
 
     def desbloquear(self, inicio: datetime, fim: datetime) -> None:
-        self._slots = [
-            s
-            for s in self._slots
-            if not (s.inicio == inicio and s.fim == fim and s.bloqueado)
-        ]
+        ini, fi = minutos_desde_epoca(inicio), minutos_desde_epoca(fim)
+        pos = bisect_left(self._inicios, ini)
+        while pos < len(self._inicios) and self._inicios[pos] == ini:
+            if self._fins[pos] == fi and self._bloqueados[pos]:
+                del self._inicios[pos]
+                del self._fins[pos]
+                del self._bloqueados[pos]
+            else:
+                pos += 1
 
     def encontrar_slot_disponivel(self, inicio: datetime, fim: datetime) -> Optional[SlotAgenda]:
-        alvo = SlotAgenda(inicio, fim, bloqueado=False)
-        for s in self._slots:
-            if s.sobrepoe(alvo) and not s.bloqueado:
-                if s.inicio == inicio and s.fim == fim:
-                    return s
+        try:
+            ini, fi = minutos_desde_epoca(inicio), minutos_desde_epoca(fim)
+        except ValidationError:
+            return None
+        pos = bisect_left(self._inicios, ini)
+        while pos < len(self._inicios) and self._inicios[pos] == ini:
+            if self._fins[pos] == fi and not self._bloqueados[pos]:
+                return self._materializar(pos)
+            pos += 1
+        for regra in self._regras:
+            if regra.gera(ini, fi) and next(self._sobrepostos(ini, fi), None) is None:
+                return SlotAgenda(instante_de_minutos(ini), instante_de_minutos(fi))
         return None
 
-    def _validar_intervalo(self, inicio: datetime, fim: datetime) -> None:
+    def _gerar(self, de_min: int, ate_min: int) -> Iterator[Tuple[int, int]]:
+        por_dia: Dict[int, List[RegraRecorrencia]] = {}
+        for regra in sorted(self._regras, key=lambda r: r.hora_inicio):
+            por_dia.setdefault(regra.dia_semana, []).append(regra)
+        dia = instante_de_minutos(de_min).date()
+        while dia <= instante_de_minutos(ate_min).date():
+            for regra in por_dia.get(dia.weekday(), ()):
+                for ini, fi in regra.gerar(dia):
+                    if ini < de_min:
+                        continue
+                    if ini >= ate_min:
+                        return
+                    if next(self._sobrepostos(ini, fi), None) is None:
+                        yield ini, fi
+            dia += timedelta(days=1)
+
+    def _materializar(self, pos: int) -> SlotAgenda:
+        return SlotAgenda(
+            instante_de_minutos(self._inicios[pos]),
+            instante_de_minutos(self._fins[pos]),
+            bloqueado=bool(self._bloqueados[pos]),
+        )
+
+    def _inserir(self, inicio: int, fim: int, bloqueado: bool) -> None:
+        pos = bisect_right(self._inicios, inicio)
+        self._inicios.insert(pos, inicio)
+        self._fins.insert(pos, fim)
+        self._bloqueados.insert(pos, 1 if bloqueado else 0)
+        self._maior_duracao = max(self._maior_duracao, fim - inicio)
+
+    def _mesclar(self, novos: List[Tuple[int, int]]) -> None:
+        # Poucos slots: inserções pontuais; muitos: reconstrói os arrays numa única mesclagem O(n + m).
+        if len(novos) <= _INSERCOES_PONTUAIS:
+            for ini, fi in novos:
+                self._inserir(ini, fi, bloqueado=False)
+            return
+        inicios, fins, bloqueados = array("q"), array("q"), bytearray()
+        existentes = zip(self._inicios, self._fins, self._bloqueados)
+        for ini, fi, bloqueado in heapq.merge(existentes, ((ini, fi, 0) for ini, fi in novos), key=lambda t: t[0]):
+            inicios.append(ini)
+            fins.append(fi)
+            bloqueados.append(bloqueado)
+        self._inicios, self._fins, self._bloqueados = inicios, fins, bloqueados
+        self._maior_duracao = max(self._maior_duracao, max(fi - ini for ini, fi in novos))
+
+    def _sobrepostos(self, inicio: int, fim: int) -> Iterator[int]:
+        # Nenhum slot dura mais que `_maior_duracao`, então só os vizinhos a partir daí podem colidir.
+        pos = bisect_left(self._inicios, inicio - self._maior_duracao)
+        while pos < len(self._inicios) and self._inicios[pos] < fim:
+            if self._fins[pos] > inicio:
+                yield pos
+            pos += 1
+
+    def _validar_intervalo(self, inicio: datetime, fim: datetime) -> Tuple[int, int]:
         if inicio >= fim:
             raise ValidationError("Intervalo inválido: início deve ser menor que fim.")
+        return minutos_desde_epoca(inicio), minutos_desde_epoca(fim)
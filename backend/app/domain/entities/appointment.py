@@ -6,6 +6,7 @@ import uuid
 
 from ..enums import StatusConsulta
 from ..exceptions import ValidationError, SchedulingError
+from .agenda import utc_sem_fuso
 
 
 @dataclass
@@ -20,6 +21,11 @@ class Consulta:
     _criada_em: datetime = field(default_factory=datetime.utcnow)
     _atualizada_em: datetime = field(default_factory=datetime.utcnow)
 
+    def __post_init__(self) -> None:
+        # como a agenda, a consulta guarda UTC sem fuso: vale para as novas e para as carregadas do banco/journal
+        self._inicio = utc_sem_fuso(self._inicio)
+        self._fim = utc_sem_fuso(self._fim)
+
     @property
     def id(self) -> str:
         return self._id
@@ -61,7 +67,7 @@ class Consulta:
     def cancelar(self, agora: Optional[datetime] = None) -> None:
         if self._status in (StatusConsulta.CANCELADA, StatusConsulta.REALIZADA):
             raise SchedulingError("Consulta já finalizada/cancelada.")
-        if self._inicio <= (agora or datetime.utcnow()):
+        if self._inicio <= (utc_sem_fuso(agora) if agora else datetime.utcnow()):
             raise SchedulingError("Não é possível cancelar consultas no passado.")
         self._status = StatusConsulta.CANCELADA
         self._atualizada_em = (agora or datetime.utcnow())
@@ -73,6 +79,7 @@ class Consulta:
 
     @staticmethod
     def nova(paciente_id: str, medico_id: str, inicio: datetime, fim: datetime) -> "Consulta":
+        inicio, fim = utc_sem_fuso(inicio), utc_sem_fuso(fim)
         if inicio >= fim:
             raise ValidationError("Intervalo de consulta inválido.")
         return Consulta(
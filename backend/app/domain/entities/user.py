@@ -1,6 +1,6 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Optional
+from typing import Callable, Optional
 import uuid
 
 from ..enums import Perfil
@@ -46,13 +46,26 @@ class Usuario:
     def telefone(self, novo: Optional[str]) -> None:
         self._telefone = (novo or "").strip() or None
 
+    @property
+    def senha_armazenada(self) -> Optional[str]:
+        """A senha como está guardada: o hash, depois que a camada de armazenamento a protege."""
+        return self._senha
+
     def atualizar_senha(self, senha: str) -> None:
         if not senha or len(senha) < 4:
             raise ValidationError("Senha inválida.")
         self._senha = senha
 
-    def verificar_senha(self, senha: str) -> bool:
-        return bool(self._senha) and self._senha == senha
+    def substituir_senha_por_hash(self, hash_senha: str) -> None:
+        if not hash_senha:
+            raise ValidationError("Hash de senha inválido.")
+        self._senha = hash_senha
+
+    def verificar_senha(self, senha: str, conferir: Optional[Callable[[str, Optional[str]], bool]] = None) -> bool:
+        """Confere `senha` com a guardada; `conferir` sabe comparar com o hash (sem ele, compara o texto)."""
+        if conferir is None:
+            return bool(self._senha) and self._senha == senha
+        return conferir(senha, self._senha)
 
 
 @dataclass
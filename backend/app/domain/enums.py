@@ -13,3 +13,11 @@ class StatusConsulta(str, Enum):
     CANCELADA = "CANCELADA"
     REALIZADA = "REALIZADA"
     REMARCADA = "REMARCADA"
+
+
+class TipoMudanca(str, Enum):
+    CONSULTA = "CONSULTA"
+    SLOTS = "SLOTS"
+    BLOQUEIO = "BLOQUEIO"
+    DESBLOQUEIO = "DESBLOQUEIO"
+    REGRAS = "REGRAS"
@@ -1,3 +1,6 @@
+from typing import Dict
+
+
 class DomainError(Exception):
     """Erro genérico da camada de domínio."""
 
@@ -8,3 +11,11 @@ class ValidationError(DomainError):
 
 class SchedulingError(DomainError):
     """Regras de agendamento foram violadas."""
+
+
+class LoteRejeitadoError(SchedulingError):
+    """Um ou mais itens de um lote foram rejeitados; nenhum item do lote foi aplicado."""
+
+    def __init__(self, erros: Dict[int, str]) -> None:
+        super().__init__(f"{len(erros)} item(ns) do lote rejeitado(s); nenhuma consulta foi agendada.")
+        self.erros = erros
@@ -1,3 +1,5 @@
+from .repositorio import RepositorioAgendamento, RepositorioComposto
 from .scheduling_service import AgendamentoService
+from .versoes import Mudanca, Versoes
 
-__all__ = ["AgendamentoService"]
+__all__ = ["AgendamentoService", "RepositorioAgendamento", "Mudanca", "RepositorioComposto", "Versoes"]
@@ -0,0 +1,82 @@
+from __future__ import annotations
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class IndiceIntervalos:
+    """Intervalos [inicio, fim) ordenados por início, com busca de sobreposição em O(log n + k)."""
+
+    def __init__(self) -> None:
+        self._chaves: List[Tuple[datetime, str]] = []
+        self._fins: Dict[str, datetime] = {}
+        # Maior duração presente: limita quanto antes de `inicio` uma sobreposição pode começar.
+        # As durações são contadas para que ela volte a diminuir quando o intervalo mais longo sai.
+        self._duracoes: Counter = Counter()
+        self._maior_duracao = timedelta(0)
+
+    def __len__(self) -> int:
+        return len(self._chaves)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._fins
+
+    def adicionar(self, item_id: str, inicio: datetime, fim: datetime) -> None:
+        if item_id in self._fins:
+            return
+        insort(self._chaves, (inicio, item_id))
+        self._fins[item_id] = fim
+        self._contar(fim - inicio)
+
+    def adicionar_varios(self, itens: Iterable[Tuple[str, datetime, datetime]]) -> None:
+        """Como `adicionar` para muitos itens: uma ordenação no fim em vez de uma inserção ordenada por item."""
+        for item_id, inicio, fim in itens:
+            if item_id in self._fins:
+                continue
+            self._chaves.append((inicio, item_id))
+            self._fins[item_id] = fim
+            self._contar(fim - inicio)
+        self._chaves.sort()
+
+    def remover(self, item_id: str, inicio: datetime) -> None:
+        pos = bisect_left(self._chaves, (inicio, item_id))
+        if pos < len(self._chaves) and self._chaves[pos] == (inicio, item_id):
+            del self._chaves[pos]
+            duracao = self._fins.pop(item_id) - inicio
+            self._duracoes[duracao] -= 1
+            if not self._duracoes[duracao]:
+                del self._duracoes[duracao]
+                if duracao == self._maior_duracao:
+                    # as durações distintas são poucas (tamanhos de consulta), então o recálculo é barato
+                    self._maior_duracao = max(self._duracoes, default=timedelta(0))
+
+    def _contar(self, duracao: timedelta) -> None:
+        self._duracoes[duracao] += 1
+        if duracao > self._maior_duracao:
+            self._maior_duracao = duracao
+
+    def sobrepostos(self, inicio: datetime, fim: datetime) -> Iterator[str]:
+        """Ids dos intervalos que colidem com [inicio, fim), em ordem de início."""
+        pos = bisect_left(self._chaves, (inicio - self._maior_duracao,))
+        for i in range(pos, len(self._chaves)):
+            item_inicio, item_id = self._chaves[i]
+            if item_inicio >= fim:
+                break
+            if self._fins[item_id] > inicio:
+                yield item_id
+
+    def itens(self) -> Iterator[Tuple[datetime, str]]:
+        """Pares (inicio, id) em ordem cronológica."""
+        return iter(self._chaves)
+
+    def pagina(self, depois: Tuple[datetime, str], ate: Optional[datetime], quantidade: int) -> List[Tuple[datetime, str]]:
+        """
+        Até `quantidade` pares (inicio, id) estritamente depois de `depois`, com início antes
+        de `ate`. A leitura é uma busca binária e uma fatia da lista, sem percorrer o resto.
+        """
+        pos = bisect_right(self._chaves, depois)
+        fatia = self._chaves[pos:pos + quantidade]
+        if ate is not None and fatia and fatia[-1][0] >= ate:
+            del fatia[bisect_left(fatia, (ate,)):]
+        return fatia
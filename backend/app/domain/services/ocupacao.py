@@ -0,0 +1,115 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+
+try:
+    import numpy as np
+except ImportError:  # NumPy é opcional: sem ele as janelas longas usam apenas inteiros do Python
+    np = None
+
+RESOLUCAO_MINUTOS = 5
+MINUTOS_POR_DIA = 24 * 60
+CELULAS_POR_DIA = MINUTOS_POR_DIA // RESOLUCAO_MINUTOS
+_DIA_INTEIRO = (1 << CELULAS_POR_DIA) - 1
+# A partir de quantos dias a busca de blocos usa o caminho vetorizado (quando há NumPy).
+DIAS_PARA_NUMPY = 7
+
+
+def mascara(inicio: int, fim: int, dia: int, para_fora: bool) -> int:
+    """
+    Bits do `dia` (dias desde a época) cobertos por [inicio, fim) em minutos desde a época.
+    `para_fora` inclui células parcialmente cobertas; caso contrário, só as inteiramente cobertas.
+    """
+    base = dia * MINUTOS_POR_DIA
+    a, b = max(inicio - base, 0), min(fim - base, MINUTOS_POR_DIA)
+    if para_fora:
+        c0, c1 = a // RESOLUCAO_MINUTOS, -(-b // RESOLUCAO_MINUTOS)
+    else:
+        c0, c1 = -(-a // RESOLUCAO_MINUTOS), b // RESOLUCAO_MINUTOS
+    if c1 <= c0:
+        return 0
+    return ((1 << (c1 - c0)) - 1) << c0
+
+
+def _inicios_de_blocos(livre: int, celulas: int) -> int:
+    # Bit i ligado quando as células i..i+celulas-1 estão livres; o passo dobra a cada rodada (O(log n)).
+    resultado, largura = livre, 1
+    while largura < celulas:
+        passo = min(largura, celulas - largura)
+        resultado &= resultado >> passo
+        largura += passo
+    return resultado
+
+
+@dataclass
+class OcupacaoDia:
+    publicado: int = 0
+    bloqueado: int = 0
+    reservado: int = 0
+
+    @property
+    def livre(self) -> int:
+        return self.publicado & ~self.bloqueado & ~self.reservado & _DIA_INTEIRO
+
+
+class MapaOcupacao:
+    """
+    Ocupação de um médico por dia (UTC) em células de 5 minutos: o bit i cobre os minutos
+    [5i, 5i + 5) do dia. Slots livres publicam apenas células inteiras; bloqueios e consultas
+    confirmadas ocupam toda célula que tocam, então horários fora da grade são avaliados de
+    forma conservadora. Dias são montados sob demanda por `construir` e descartados por
+    `invalidar` sempre que a agenda ou as consultas confirmadas daquele dia mudam.
+    """
+
+    def __init__(self, construir: Callable[[int], OcupacaoDia]) -> None:
+        self._construir = construir
+        self._dias: Dict[int, OcupacaoDia] = {}
+
+    def dia(self, dia: int) -> OcupacaoDia:
+        if dia not in self._dias:
+            self._dias[dia] = self._construir(dia)
+        return self._dias[dia]
+
+    def invalidar(self, inicio: int, fim: int) -> None:
+        for dia in range(inicio // MINUTOS_POR_DIA, (fim - 1) // MINUTOS_POR_DIA + 1):
+            self._dias.pop(dia, None)
+
+    def invalidar_tudo(self) -> None:
+        self._dias.clear()
+
+    def livre(self, inicio: int, fim: int) -> bool:
+        for dia in range(inicio // MINUTOS_POR_DIA, (fim - 1) // MINUTOS_POR_DIA + 1):
+            alvo = mascara(inicio, fim, dia, para_fora=True)
+            if self.dia(dia).livre & alvo != alvo:
+                return False
+        return True
+
+    def blocos(self, primeiro_dia: int, ultimo_dia: int, duracao: int) -> List[int]:
+        """Inícios (minutos desde a época) de blocos livres contíguos de `duracao` minutos, dia a dia."""
+        celulas = -(-duracao // RESOLUCAO_MINUTOS)
+        dias = range(primeiro_dia, ultimo_dia + 1)
+        if celulas > CELULAS_POR_DIA:
+            return []
+        if np is not None and len(dias) >= DIAS_PARA_NUMPY:
+            return self._blocos_vetorizado(dias, celulas)
+        inicios = []
+        for dia in dias:
+            bits = _inicios_de_blocos(self.dia(dia).livre, celulas)
+            while bits:
+                menor = bits & -bits
+                inicios.append(dia * MINUTOS_POR_DIA + (menor.bit_length() - 1) * RESOLUCAO_MINUTOS)
+                bits ^= menor
+        return inicios
+
+    def _blocos_vetorizado(self, dias: range, celulas: int) -> List[int]:
+        tamanho = CELULAS_POR_DIA // 8
+        brutos = b"".join(self.dia(dia).livre.to_bytes(tamanho, "little") for dia in dias)
+        grade = np.unpackbits(np.frombuffer(brutos, dtype=np.uint8), bitorder="little").reshape(len(dias), -1)
+        acumulado = np.zeros((len(dias), CELULAS_POR_DIA + 1), dtype=np.int32)
+        np.cumsum(grade, axis=1, out=acumulado[:, 1:])
+        cheios = (acumulado[:, celulas:] - acumulado[:, :-celulas]) == celulas
+        linhas, colunas = np.nonzero(cheios)
+        return [
+            (dias.start + int(linha)) * MINUTOS_POR_DIA + int(coluna) * RESOLUCAO_MINUTOS
+            for linha, coluna in zip(linhas, colunas)
+        ]
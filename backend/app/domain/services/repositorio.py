@@ -0,0 +1,81 @@
+from __future__ import annotations
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from ..entities import Consulta, RegraRecorrencia
+
+
+class RepositorioAgendamento:
+    """
+    Recebe do `AgendamentoService` cada mudança já aplicada em memória (sob as travas da
+    operação). A implementação padrão não persiste nada; a infraestrutura sobrescreve os
+    métodos para gravar as mudanças onde quiser.
+    """
+
+    def verificar(self) -> None:
+        """
+        Chamado pelo serviço antes de mudar o estado em memória: levanta erro se o repositório
+        não aceita mais mudanças (gravação parada por falhas), para a operação ser recusada antes
+        de a memória e o destino divergirem.
+        """
+
+    def slots_adicionados(self, medico_id: str, intervalos: List[Tuple[datetime, datetime]]) -> None:
+        pass
+
+    def bloqueio_adicionado(self, medico_id: str, inicio: datetime, fim: datetime) -> None:
+        pass
+
+    def bloqueio_removido(self, medico_id: str, inicio: datetime, fim: datetime) -> None:
+        pass
+
+    def regra_adicionada(self, medico_id: str, regra: RegraRecorrencia) -> None:
+        pass
+
+    def regra_removida(self, medico_id: str, regra: RegraRecorrencia) -> None:
+        pass
+
+    def consulta_salva(self, consulta: Consulta) -> None:
+        pass
+
+
+class RepositorioComposto(RepositorioAgendamento):
+    """
+    Repassa cada mudança, na ordem dada, a vários repositórios (persistência, caches, ...).
+    A mudança já está em memória, então todos são avisados mesmo que um falhe (caches e
+    assinantes não ficam para trás); o primeiro erro é levantado depois.
+    """
+
+    def __init__(self, *repositorios: RepositorioAgendamento) -> None:
+        self.repositorios = repositorios
+
+    def verificar(self) -> None:
+        for repositorio in self.repositorios:
+            repositorio.verificar()
+
+    def slots_adicionados(self, medico_id: str, intervalos: List[Tuple[datetime, datetime]]) -> None:
+        self._repassar(lambda repositorio: repositorio.slots_adicionados(medico_id, intervalos))
+
+    def bloqueio_adicionado(self, medico_id: str, inicio: datetime, fim: datetime) -> None:
+        self._repassar(lambda repositorio: repositorio.bloqueio_adicionado(medico_id, inicio, fim))
+
+    def bloqueio_removido(self, medico_id: str, inicio: datetime, fim: datetime) -> None:
+        self._repassar(lambda repositorio: repositorio.bloqueio_removido(medico_id, inicio, fim))
+
+    def regra_adicionada(self, medico_id: str, regra: RegraRecorrencia) -> None:
+        self._repassar(lambda repositorio: repositorio.regra_adicionada(medico_id, regra))
+
+    def regra_removida(self, medico_id: str, regra: RegraRecorrencia) -> None:
+        self._repassar(lambda repositorio: repositorio.regra_removida(medico_id, regra))
+
+    def consulta_salva(self, consulta: Consulta) -> None:
+        self._repassar(lambda repositorio: repositorio.consulta_salva(consulta))
+
+    def _repassar(self, avisar: Callable[[RepositorioAgendamento], None]) -> None:
+        erro: Optional[Exception] = None
+        for repositorio in self.repositorios:
+            try:
+                avisar(repositorio)
+            except Exception as falha:
+                erro = erro or falha
+        if erro is not None:
+            raise erro
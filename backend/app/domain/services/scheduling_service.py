@@ -1,19 +1,83 @@
 from __future__ import annotations
+from contextlib import contextmanager
 from dataclasses import dataclass, field
-from datetime import datetime
-from typing import Dict, List, Optional
+from datetime import date, datetime, timedelta
+import heapq
+import threading
+from itertools import islice, repeat
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
-from ..entities import Agenda, Consulta, Medico, Paciente, SlotAgenda
-from ..enums import StatusConsulta
-from ..exceptions import SchedulingError, ValidationError
+from ..entities import Agenda, Consulta, Medico, Paciente, RegraRecorrencia, SlotAgenda
+from ..entities.agenda import instante_de_minutos, minutos_arredondados, minutos_desde_epoca, utc_sem_fuso
+from ..enums import StatusConsulta, TipoMudanca
+from ..exceptions import DomainError, LoteRejeitadoError, SchedulingError, ValidationError
+from .indices import IndiceIntervalos
+from .ocupacao import MINUTOS_POR_DIA, MapaOcupacao, OcupacaoDia, mascara
+from .repositorio import RepositorioAgendamento
+from .slots_livres import EstatisticasSlotsLivres, SlotsLivres
+from .travas import TravasPorChave, chave_medico, chave_paciente
+from .versoes import Mudanca, Versoes
+
+_CONFIRMADAS = (StatusConsulta.CONFIRMADA,)
+_ATIVAS = (StatusConsulta.AGENDADA, StatusConsulta.CONFIRMADA)
+# quantas mudanças ficam no registro de `versoes` para quem acompanha o feed de mudanças
+RETENCAO_MUDANCAS = 10_000
+# Minutos além de qualquer horário representável: janela "agenda inteira" em minutos desde a época.
+_SEM_LIMITE = 2**62
 
 
 @dataclass
 class AgendamentoService:
-    """Regras de negócio de agendamentos (coleções em memória)."""
+    """
+    Regras de negócio de agendamentos (coleções em memória). Toda mudança aplicada é
+    repassada ao `repositorio`, que decide se e como persisti-la; antes de mudar o estado, cada
+    operação pergunta a ele se ainda aceita mudanças (`verificar`).
+
+    Seguro para uso concorrente: cada operação trava a agenda do médico envolvido e depois
+    os pacientes afetados (ver `TravasPorChave`), então médicos diferentes não disputam trava.
+    """
 
     agendas: Dict[str, Agenda] = field(default_factory=dict)
     consultas: Dict[str, Consulta] = field(default_factory=dict)
+    repositorio: RepositorioAgendamento = field(default_factory=RepositorioAgendamento)
+    # avançadas a cada mudança aplicada, por médico e por paciente, com as últimas mudanças
+    # guardadas no registro (ver `Versoes`)
+    versoes: Versoes = field(default_factory=lambda: Versoes(retencao=RETENCAO_MUDANCAS), repr=False)
+    # medico_id / paciente_id -> status -> intervalos das consultas daquela pessoa
+    _por_medico: Dict[str, Dict[StatusConsulta, IndiceIntervalos]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    _por_paciente: Dict[str, Dict[StatusConsulta, IndiceIntervalos]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    # status -> intervalos de todas as consultas, para listagens sem médico nem paciente
+    _por_status: Dict[StatusConsulta, IndiceIntervalos] = field(default_factory=dict, init=False, repr=False)
+    _trava_global: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+    # Mapas de ocupação por médico, montados só quando consultados (ver `mapa_ocupacao`).
+    _mapas: Dict[str, MapaOcupacao] = field(default_factory=dict, init=False, repr=False)
+    # Slots explícitos livres por médico, montados na primeira leitura e mantidos trecho a trecho.
+    _livres: Dict[str, SlotsLivres] = field(default_factory=dict, init=False, repr=False)
+    estatisticas_slots: EstatisticasSlotsLivres = field(
+        default_factory=EstatisticasSlotsLivres, init=False, repr=False
+    )
+    _travas: TravasPorChave = field(default_factory=TravasPorChave, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        # Índices montados em lote: cada um é ordenado uma vez, não a cada consulta. Agrupa pelo
+        # valor do status, pois o hash de um membro de Enum é bem mais caro que o de uma string.
+        pendentes: Dict[Tuple[bool, str, str], List[Tuple[str, datetime, datetime]]] = {}
+        globais: Dict[str, List[Tuple[str, datetime, datetime]]] = {}
+        for c in self.consultas.values():
+            item, status = (c.id, c.inicio, c.fim), c.status.value
+            pendentes.setdefault((True, c.medico_id, status), []).append(item)
+            pendentes.setdefault((False, c.paciente_id, status), []).append(item)
+            globais.setdefault(status, []).append(item)
+        for (do_medico, chave, status), itens in pendentes.items():
+            mapa = self._por_medico if do_medico else self._por_paciente
+            indice = mapa.setdefault(chave, {}).setdefault(StatusConsulta(status), IndiceIntervalos())
+            indice.adicionar_varios(itens)
+        for status, itens in globais.items():
+            self._por_status.setdefault(StatusConsulta(status), IndiceIntervalos()).adicionar_varios(itens)
 
     def criar_agenda_se_nao_existir(self, medico: Medico) -> Agenda:
         if medico.id not in self.agendas:
@@ -21,71 +85,187 @@ class AgendamentoService:
         return self.agendas[medico.id]
 
     def disponibilizar_slot(self, medico: Medico, inicio: datetime, fim: datetime) -> None:
-        self.criar_agenda_se_nao_existir(medico).adicionar_slot(inicio, fim)
+        inicio, fim = utc_sem_fuso(inicio), utc_sem_fuso(fim)
+        with self._travas.adquirir(chave_medico(medico.id)):
+            self.repositorio.verificar()
+            self.criar_agenda_se_nao_existir(medico).adicionar_slot(inicio, fim)
+            self._invalidar_mapa(medico.id, inicio, fim)
+            self.repositorio.slots_adicionados(medico.id, [(inicio, fim)])
+            self._avancar_agenda(TipoMudanca.SLOTS, medico.id, [(inicio, fim)])
+
+    def disponibilizar_slots(
+        self, medico: Medico, intervalos: Iterable[Tuple[datetime, datetime]]
+    ) -> Tuple[int, List[Tuple[int, str]]]:
+        intervalos = [(utc_sem_fuso(inicio), utc_sem_fuso(fim)) for inicio, fim in intervalos]
+        with self._travas.adquirir(chave_medico(medico.id)):
+            self.repositorio.verificar()
+            inseridos, rejeitados = self.criar_agenda_se_nao_existir(medico).adicionar_slots(intervalos)
+            if inseridos:
+                if medico.id in self._mapas:
+                    self._mapas[medico.id].invalidar_tudo()
+                if medico.id in self._livres:
+                    self._livres[medico.id].invalidar_tudo()
+                recusadas = {posicao for posicao, _ in rejeitados}
+                aceitos = [iv for posicao, iv in enumerate(intervalos) if posicao not in recusadas]
+                self.repositorio.slots_adicionados(medico.id, aceitos)
+                self._avancar_agenda(TipoMudanca.SLOTS, medico.id, aceitos)
+            return inseridos, rejeitados
 
     def bloquear_horario(self, medico: Medico, inicio: datetime, fim: datetime) -> None:
-        self.criar_agenda_se_nao_existir(medico).bloquear(inicio, fim)
+        inicio, fim = utc_sem_fuso(inicio), utc_sem_fuso(fim)
+        with self._travas.adquirir(chave_medico(medico.id)):
+            self.repositorio.verificar()
+            self.criar_agenda_se_nao_existir(medico).bloquear(inicio, fim)
+            self._invalidar_mapa(medico.id, inicio, fim)
+            self.repositorio.bloqueio_adicionado(medico.id, inicio, fim)
+            self._avancar_agenda(TipoMudanca.BLOQUEIO, medico.id, [(inicio, fim)])
 
     def desbloquear_horario(self, medico: Medico, inicio: datetime, fim: datetime) -> None:
-        self.criar_agenda_se_nao_existir(medico).desbloquear(inicio, fim)
+        inicio, fim = utc_sem_fuso(inicio), utc_sem_fuso(fim)
+        with self._travas.adquirir(chave_medico(medico.id)):
+            self.repositorio.verificar()
+            self.criar_agenda_se_nao_existir(medico).desbloquear(inicio, fim)
+            self._invalidar_mapa(medico.id, inicio, fim)
+            self.repositorio.bloqueio_removido(medico.id, inicio, fim)
+            self._avancar_agenda(TipoMudanca.DESBLOQUEIO, medico.id, [(inicio, fim)])
 
-    def slots_disponiveis(self, medico: Medico) -> List[SlotAgenda]:
-        # Slots permanecem livres enquanto não há confirmação; apenas consultas confirmadas bloqueiam o slot.
-        ativos = [
-            c
-            for c in self.consultas.values()
-            if c.medico_id == medico.id and c.status == StatusConsulta.CONFIRMADA
-        ]
-        livres = []
-        for s in self.criar_agenda_se_nao_existir(medico).slots():
-            if s.bloqueado:
-                continue
-            if any(not (s.fim <= c.inicio or c.fim <= s.inicio) for c in ativos):
-                continue
-            livres.append(s)
-        return livres
+    def adicionar_regra(self, medico: Medico, regra: RegraRecorrencia) -> None:
+        with self._travas.adquirir(chave_medico(medico.id)):
+            self.repositorio.verificar()
+            self.criar_agenda_se_nao_existir(medico).adicionar_regra(regra)
+            if medico.id in self._mapas:
+                self._mapas[medico.id].invalidar_tudo()
+            self.repositorio.regra_adicionada(medico.id, regra)
+            self._avancar_agenda(TipoMudanca.REGRAS, medico.id)
 
-    def agendar(self, paciente: Paciente, medico: Medico, inicio: datetime, fim: datetime) -> Consulta:
+    def remover_regra(self, medico: Medico, regra: RegraRecorrencia) -> None:
+        with self._travas.adquirir(chave_medico(medico.id)):
+            self.repositorio.verificar()
+            self.criar_agenda_se_nao_existir(medico).remover_regra(regra)
+            if medico.id in self._mapas:
+                self._mapas[medico.id].invalidar_tudo()
+            self.repositorio.regra_removida(medico.id, regra)
+            self._avancar_agenda(TipoMudanca.REGRAS, medico.id)
+
+    def mapa_ocupacao(self, medico: Medico) -> MapaOcupacao:
+        """Bitmap livre/bloqueado/reservado do médico em células de 5 minutos, mantido em sincronia pelo serviço."""
+        if medico.id not in self._mapas:
+            self.criar_agenda_se_nao_existir(medico)
+            self._mapas[medico.id] = MapaOcupacao(lambda dia: self._ocupacao_do_dia(medico.id, dia))
+        return self._mapas[medico.id]
+
+    def horario_livre(self, medico: Medico, inicio: datetime, fim: datetime) -> bool:
+        """Intervalo publicado, sem bloqueios e sem consultas confirmadas (na grade de 5 minutos)."""
+        if inicio >= fim:
+            raise ValidationError("Intervalo inválido: início deve ser menor que fim.")
+        with self._travas.adquirir(chave_medico(medico.id)):
+            mapa = self.mapa_ocupacao(medico)
+            return mapa.livre(minutos_arredondados(inicio), minutos_arredondados(fim, para_cima=True))
+
+    def blocos_livres(self, medico: Medico, de: date, ate: date, duracao_minutos: int) -> List[SlotAgenda]:
+        """Blocos livres contíguos de `duracao_minutos` iniciando na grade de 5 minutos, dia a dia em [de, ate]."""
+        if duracao_minutos <= 0:
+            raise ValidationError("Duração inválida.")
+        if de > ate:
+            raise ValidationError("Intervalo inválido: início deve ser menor que fim.")
+        primeiro = minutos_desde_epoca(datetime.combine(de, datetime.min.time())) // MINUTOS_POR_DIA
+        ultimo = primeiro + (ate - de).days
+        duracao = timedelta(minutes=duracao_minutos)
+        with self._travas.adquirir(chave_medico(medico.id)):
+            inicios = self.mapa_ocupacao(medico).blocos(primeiro, ultimo, duracao_minutos)
+        return [SlotAgenda(instante_de_minutos(m), instante_de_minutos(m) + duracao) for m in inicios]
+
+    def slots_disponiveis(
+        self, medico: Medico, de: Optional[datetime] = None, ate: Optional[datetime] = None
+    ) -> List[SlotAgenda]:
+        with self._travas.adquirir(chave_medico(medico.id)):
+            return list(self._slots_livres(medico, de, ate))
+
+    def proximos_slots(
+        self, medicos: Iterable[Medico], a_partir: datetime, limite: int
+    ) -> List[Tuple[Medico, SlotAgenda]]:
+        """
+        Os `limite` slots livres mais cedo entre vários médicos. Cada médico é travado sozinho,
+        só enquanto seus primeiros `limite` slots são lidos (as agendas são independentes), e a
+        mescla acontece depois, sem trava nenhuma.
+        """
+        candidatos = []
+        for medico in medicos:
+            with self._travas.adquirir(chave_medico(medico.id)):
+                candidatos.append(list(zip(islice(self._slots_livres(medico, a_partir, None), limite), repeat(medico))))
+        mesclado = heapq.merge(*candidatos, key=lambda par: par[0].inicio)
+        return [(medico, slot) for slot, medico in islice(mesclado, limite)]
+
+    def _slots_livres(self, medico: Medico, de: Optional[datetime], ate: Optional[datetime]) -> Iterable[SlotAgenda]:
         agenda = self.criar_agenda_se_nao_existir(medico)
-        slot = agenda.encontrar_slot_disponivel(inicio, fim)
-        if not slot:
-            raise SchedulingError("Horário indisponível na agenda do médico.")
+        explicitos = self._vista_livres(medico.id).slots(
+            minutos_arredondados(de, para_cima=True) if de is not None else None,
+            minutos_arredondados(ate, para_cima=True) if ate is not None else None,
+        )
+        if not agenda.regras():
+            return explicitos
+        # Slots permanecem livres enquanto não há confirmação; apenas consultas confirmadas bloqueiam o slot.
+        gerados = (
+            s
+            for s in agenda.slots_de_regras(de, ate)
+            if next(self._colisoes(self._por_medico, medico.id, _CONFIRMADAS, s.inicio, s.fim), None) is None
+        )
+        return heapq.merge(explicitos, gerados, key=lambda s: s.inicio)
 
-        for c in self.consultas.values():
-            if c.medico_id == medico.id and c.status == StatusConsulta.CONFIRMADA:
-                colide = not (fim <= c.inicio or c.fim <= inicio)
-                if colide:
-                    raise SchedulingError("Há uma consulta confirmada que colide com este horário.")
+    def _vista_livres(self, medico_id: str) -> SlotsLivres:
+        vista = self._livres.get(medico_id)
+        if vista is None:
+            vista = self._livres[medico_id] = SlotsLivres()
+        if vista.valida:
+            self.estatisticas_slots.acertos += 1
+        else:
+            self.estatisticas_slots.faltas += 1
+            vista.montar(self._explicitos_livres(medico_id, -_SEM_LIMITE, _SEM_LIMITE))
+        return vista
 
-        # Paciente não pode ter sobreposição de consultas (mesmo que com outro médico)
-        for c in self.consultas.values():
-            if c.paciente_id == paciente.id and c.status in (StatusConsulta.AGENDADA, StatusConsulta.CONFIRMADA):
-                if not (fim <= c.inicio or c.fim <= inicio):
-                    raise SchedulingError("Você já possui uma consulta neste horário.")
+    def _explicitos_livres(self, medico_id: str, inicio: int, fim: int) -> Iterator[Tuple[int, int]]:
+        for ini, fi, bloqueado in self.agendas[medico_id].explicitos(inicio, fim):
+            if bloqueado:
+                continue
+            confirmadas = self._colisoes(
+                self._por_medico, medico_id, _CONFIRMADAS, instante_de_minutos(ini), instante_de_minutos(fi)
+            )
+            if next(confirmadas, None) is None:
+                yield ini, fi
 
-        consulta = Consulta.nova(paciente.id, medico.id, inicio, fim)
-        self.consultas[consulta.id] = consulta
-        return consulta
+    def agendar(self, paciente: Paciente, medico: Medico, inicio: datetime, fim: datetime) -> Consulta:
+        inicio, fim = utc_sem_fuso(inicio), utc_sem_fuso(fim)
+        with self._travas.adquirir(chave_medico(medico.id), chave_paciente(paciente.id)):
+            self.repositorio.verificar()
+            self._validar_agendamento(paciente, medico, inicio, fim)
+            return self._registrar(Consulta.nova(paciente.id, medico.id, inicio, fim))
+
+    def agendar_lote(self, pedidos: Sequence[Tuple[Paciente, Medico, datetime, datetime]]) -> List[Consulta]:
+        """
+        Agenda todos os pedidos ou nenhum. Cada pedido é validado contra o estado atual e contra
+        os pedidos anteriores do mesmo lote; se algum falhar, levanta `LoteRejeitadoError` com o
+        motivo de cada item rejeitado e nada é gravado.
+        """
+        pedidos = [(p, m, utc_sem_fuso(inicio), utc_sem_fuso(fim)) for p, m, inicio, fim in pedidos]
+        chaves = [chave_medico(m.id) for _, m, _, _ in pedidos] + [chave_paciente(p.id) for p, _, _, _ in pedidos]
+        with self._travas.adquirir(*chaves):
+            self.repositorio.verificar()
+            return self._agendar_lote(pedidos)
 
     def cancelar(self, consulta_id: str, agora: Optional[datetime] = None) -> Consulta:
         consulta = self._obter(consulta_id)
-        consulta.cancelar(agora=agora)
+        with self._travas.adquirir(chave_medico(consulta.medico_id), chave_paciente(consulta.paciente_id)):
+            self.repositorio.verificar()
+            self._transicionar(consulta, lambda: consulta.cancelar(agora=agora))
         return consulta
 
     def confirmar(self, consulta_id: str) -> Consulta:
         consulta = self._obter(consulta_id)
-        consulta.confirmar()
-        # Cancela automaticamente outras consultas agendadas no mesmo intervalo para o mesmo médico
-        for other in self.consultas.values():
-            if other.id == consulta.id:
-                continue
-            if other.medico_id == consulta.medico_id and other.status == StatusConsulta.AGENDADA:
-                overlap = not (consulta.fim <= other.inicio or other.fim <= consulta.inicio)
-                if overlap:
-                    try:
-                        other.cancelar()
-                    except Exception:
-                        other._status = StatusConsulta.CANCELADA
+        with self._travar_colisoes(consulta.medico_id, consulta.inicio, consulta.fim, consulta.paciente_id):
+            self.repositorio.verificar()
+            self._transicionar(consulta, consulta.confirmar)
+            # Cancela automaticamente outras consultas agendadas no mesmo intervalo para o mesmo médico
+            self._cancelar_agendadas_em_conflito(consulta)
         return consulta
 
     def remarcar(
@@ -96,55 +276,285 @@ class AgendamentoService:
         - Se confirmar_nova=True (médico remarcando), a nova já nasce CONFIRMADA e cancela agendadas que colidam.
         - Se confirmar_nova=False (paciente remarcando), a nova fica AGENDADA aguardando confirmação do médico.
         """
+        novo_inicio, novo_fim = utc_sem_fuso(novo_inicio), utc_sem_fuso(novo_fim)
         antiga = self._obter(consulta_id)
-        paciente_id, medico_id = antiga.paciente_id, antiga.medico_id
+        with self._travar_colisoes(antiga.medico_id, novo_inicio, novo_fim, antiga.paciente_id):
+            self.repositorio.verificar()
+            return self._remarcar(antiga, novo_inicio, novo_fim, confirmar_nova)
 
-        # Verifica conflitos para paciente (exceto a própria consulta)
-        for c in self.consultas.values():
-            if c.id == consulta_id:
+    def historico_do_paciente(self, paciente: Paciente) -> List[Consulta]:
+        with self._travas.adquirir(chave_paciente(paciente.id)):
+            return self._em_ordem(self._por_paciente, paciente.id)
+
+    def consultas_do_medico(self, medico: Medico) -> List[Consulta]:
+        with self._travas.adquirir(chave_medico(medico.id)):
+            return self._em_ordem(self._por_medico, medico.id)
+
+    def listar_consultas(
+        self,
+        medico_id: Optional[str] = None,
+        paciente_id: Optional[str] = None,
+        status: Optional[StatusConsulta] = None,
+        de: Optional[datetime] = None,
+        ate: Optional[datetime] = None,
+        depois: Optional[Tuple[datetime, str]] = None,
+        limite: int = 100,
+    ) -> List[Consulta]:
+        """
+        Uma página de consultas em ordem de (inicio, id): a partir de `de` ou logo após o
+        cursor `depois` (o par da última consulta da página anterior), com início antes de
+        `ate`. Lê só os índices do paciente, do médico ou globais dos status pedidos, em fatias
+        do tamanho da página, então o custo acompanha a página e não o total de consultas.
+
+        Com paciente ou médico, a leitura acontece sob a trava dele, a mesma de quem muda as
+        consultas dele: a página é um retrato exato. Sem nenhum dos dois ela é feita sob a trava
+        do índice global, que só impede o índice de mudar no meio da leitura: uma consulta que
+        está mudando de status naquele instante (fora do índice entre um status e outro) pode
+        faltar na página, mas nenhuma aparece duas vezes ou num status que não é o dela.
+        """
+        if paciente_id is not None:
+            trava = self._travas.adquirir(chave_paciente(paciente_id))
+        elif medico_id is not None:
+            trava = self._travas.adquirir(chave_medico(medico_id))
+        else:
+            trava = self._trava_global
+        with trava:
+            return self._listar_consultas(medico_id, paciente_id, status, de, ate, depois, limite)
+
+    def _listar_consultas(
+        self,
+        medico_id: Optional[str],
+        paciente_id: Optional[str],
+        status: Optional[StatusConsulta],
+        de: Optional[datetime],
+        ate: Optional[datetime],
+        depois: Optional[Tuple[datetime, str]],
+        limite: int,
+    ) -> List[Consulta]:
+        if paciente_id is not None:
+            por_status = self._por_paciente.get(paciente_id, {})
+        elif medico_id is not None:
+            por_status = self._por_medico.get(medico_id, {})
+        else:
+            por_status = self._por_status
+        inicio = (utc_sem_fuso(de), "") if de is not None else (datetime.min, "")
+        if depois is not None and (utc_sem_fuso(depois[0]), depois[1]) > inicio:
+            inicio = (utc_sem_fuso(depois[0]), depois[1])
+        ate = utc_sem_fuso(ate) if ate is not None else None
+        indices = [(status, por_status[status])] if status in por_status else []
+        if status is None:
+            indices = list(por_status.items())
+        fluxos = [_percorrer(indice, st, inicio, ate, limite) for st, indice in indices]
+        pagina: List[Consulta] = []
+        for _, cid, st in heapq.merge(*fluxos):
+            consulta = self.consultas.get(cid)
+            if consulta is None or consulta.status != st:
                 continue
-            if c.paciente_id == paciente_id and c.status in (StatusConsulta.AGENDADA, StatusConsulta.CONFIRMADA):
-                overlap = not (novo_fim <= c.inicio or c.fim <= novo_inicio)
-                if overlap:
-                    raise SchedulingError("Paciente possui outra consulta neste horário.")
+            if medico_id is not None and consulta.medico_id != medico_id:
+                continue
+            pagina.append(consulta)
+            if len(pagina) >= limite:
+                break
+        return pagina
+
+    def _obter(self, consulta_id: str) -> Consulta:
+        if consulta_id not in self.consultas:
+            raise ValidationError("Consulta não encontrada.")
+        return self.consultas[consulta_id]
+
+    @contextmanager
+    def _travar_colisoes(self, medico_id: str, inicio: datetime, fim: datetime, paciente_id: str) -> Iterator[None]:
+        """
+        Trava o médico e, só então, o paciente e os donos das consultas agendadas que colidem com
+        [inicio, fim) — as que uma confirmação pode cancelar. Esse conjunto só muda sob a trava do
+        médico, e as travas de paciente são pegas de uma vez, em ordem, depois dela.
+        """
+        with self._travas.adquirir(chave_medico(medico_id)):
+            agendadas = self._colisoes(self._por_medico, medico_id, (StatusConsulta.AGENDADA,), inicio, fim)
+            pacientes = {paciente_id} | {c.paciente_id for c in agendadas}
+            with self._travas.adquirir(*(chave_paciente(p) for p in pacientes)):
+                yield
+
+    def _agendar_lote(self, pedidos: Sequence[Tuple[Paciente, Medico, datetime, datetime]]) -> List[Consulta]:
+        erros: Dict[int, str] = {}
+        do_lote: Dict[str, IndiceIntervalos] = {}
+        for posicao, (paciente, medico, inicio, fim) in enumerate(pedidos):
+            try:
+                if inicio >= fim:
+                    raise ValidationError("Intervalo de consulta inválido.")
+                self._validar_agendamento(paciente, medico, inicio, fim)
+                indice = do_lote.setdefault(paciente.id, IndiceIntervalos())
+                if next(indice.sobrepostos(inicio, fim), None) is not None:
+                    raise SchedulingError("Paciente possui outra consulta neste lote no mesmo horário.")
+                indice.adicionar(str(posicao), inicio, fim)
+            except DomainError as err:
+                erros[posicao] = str(err)
+        if erros:
+            raise LoteRejeitadoError(erros)
+        return [self._registrar(Consulta.nova(p.id, m.id, inicio, fim)) for p, m, inicio, fim in pedidos]
+
+    def _remarcar(self, antiga: Consulta, novo_inicio: datetime, novo_fim: datetime, confirmar_nova: bool) -> Consulta:
+        consulta_id, paciente_id, medico_id = antiga.id, antiga.paciente_id, antiga.medico_id
+
+        # Verifica conflitos para paciente (exceto a própria consulta)
+        for c in self._colisoes(self._por_paciente, paciente_id, _ATIVAS, novo_inicio, novo_fim):
+            if c.id != consulta_id:
+                raise SchedulingError("Paciente possui outra consulta neste horário.")
 
         # Verifica conflitos confirmados para o médico (exceto a própria consulta)
-        for c in self.consultas.values():
-            if c.id == consulta_id:
-                continue
-            if c.medico_id == medico_id and c.status == StatusConsulta.CONFIRMADA:
-                overlap = not (novo_fim <= c.inicio or c.fim <= novo_inicio)
-                if overlap:
-                    raise SchedulingError("Médico já possui consulta confirmada nesse horário.")
+        for c in self._colisoes(self._por_medico, medico_id, _CONFIRMADAS, novo_inicio, novo_fim):
+            if c.id != consulta_id:
+                raise SchedulingError("Médico já possui consulta confirmada nesse horário.")
 
-        try:
-            antiga.cancelar()
-        except Exception:
-            antiga._status = StatusConsulta.CANCELADA
+        self._transicionar(antiga, lambda: self._forcar_cancelamento(antiga))
         fake_pac = type("FakePac", (), {"id": paciente_id})()
         fake_med = type("FakeMed", (), {"id": medico_id})()
         nova = self.agendar(fake_pac, fake_med, novo_inicio, novo_fim)
         if confirmar_nova:
-            nova.confirmar()
-            for other in list(self.consultas.values()):
-                if other.id == nova.id:
-                    continue
-                if other.medico_id == nova.medico_id and other.status == StatusConsulta.AGENDADA:
-                    overlap = not (nova.fim <= other.inicio or other.fim <= nova.inicio)
-                    if overlap:
-                        try:
-                            other.cancelar()
-                        except Exception:
-                            other._status = StatusConsulta.CANCELADA
+            self._transicionar(nova, nova.confirmar)
+            self._cancelar_agendadas_em_conflito(nova)
         return nova
 
-    def historico_do_paciente(self, paciente: Paciente) -> List[Consulta]:
-        return [c for c in self.consultas.values() if c.paciente_id == paciente.id]
+    def _validar_agendamento(self, paciente: Paciente, medico: Medico, inicio: datetime, fim: datetime) -> None:
+        agenda = self.criar_agenda_se_nao_existir(medico)
+        slot = agenda.encontrar_slot_disponivel(inicio, fim)
+        if not slot:
+            raise SchedulingError("Horário indisponível na agenda do médico.")
 
-    def consultas_do_medico(self, medico: Medico) -> List[Consulta]:
-        return [c for c in self.consultas.values() if c.medico_id == medico.id]
+        if next(self._colisoes(self._por_medico, medico.id, _CONFIRMADAS, inicio, fim), None) is not None:
+            raise SchedulingError("Há uma consulta confirmada que colide com este horário.")
 
-    def _obter(self, consulta_id: str) -> Consulta:
-        if consulta_id not in self.consultas:
-            raise ValidationError("Consulta não encontrada.")
-        return self.consultas[consulta_id]
+        # Paciente não pode ter sobreposição de consultas (mesmo que com outro médico)
+        if next(self._colisoes(self._por_paciente, paciente.id, _ATIVAS, inicio, fim), None) is not None:
+            raise SchedulingError("Você já possui uma consulta neste horário.")
+
+    def _registrar(self, consulta: Consulta) -> Consulta:
+        self.consultas[consulta.id] = consulta
+        self._indexar(consulta)
+        self.repositorio.consulta_salva(consulta)
+        self._avancar_consulta(consulta)
+        return consulta
+
+    # --- índices ---
+    def _indexar(self, consulta: Consulta) -> None:
+        _adicionar_ao_indice(self._por_medico.setdefault(consulta.medico_id, {}), consulta)
+        _adicionar_ao_indice(self._por_paciente.setdefault(consulta.paciente_id, {}), consulta)
+        # o índice global é compartilhado entre médicos, que não dividem trava entre si
+        with self._trava_global:
+            _adicionar_ao_indice(self._por_status, consulta)
+
+    def _desindexar(self, consulta: Consulta) -> None:
+        _remover_do_indice(self._por_medico.get(consulta.medico_id, {}), consulta)
+        _remover_do_indice(self._por_paciente.get(consulta.paciente_id, {}), consulta)
+        with self._trava_global:
+            _remover_do_indice(self._por_status, consulta)
+
+    def _transicionar(self, consulta: Consulta, acao: Callable[[], None]) -> None:
+        """Executa uma mudança de status mantendo os índices coerentes, mesmo se a ação falhar."""
+        self._desindexar(consulta)
+        try:
+            acao()
+        finally:
+            self._indexar(consulta)
+            self._invalidar_mapa(consulta.medico_id, consulta.inicio, consulta.fim)
+        self.repositorio.consulta_salva(consulta)
+        self._avancar_consulta(consulta)
+
+    def _avancar_agenda(
+        self, tipo: TipoMudanca, medico_id: str, intervalos: Sequence[Tuple[datetime, datetime]] = ()
+    ) -> None:
+        self.versoes.avancar(chave_medico(medico_id), mudanca=Mudanca(tipo, medico_id, intervalos=tuple(intervalos)))
+
+    def _avancar_consulta(self, consulta: Consulta) -> None:
+        self.versoes.avancar(
+            chave_medico(consulta.medico_id),
+            chave_paciente(consulta.paciente_id),
+            mudanca=Mudanca(TipoMudanca.CONSULTA, consulta.medico_id, consulta_id=consulta.id),
+        )
+
+    def _invalidar_mapa(self, medico_id: str, inicio: datetime, fim: datetime) -> None:
+        """Acerta o que é derivado da agenda do médico no trecho [inicio, fim): mapa de ocupação e slots livres."""
+        ini, fi = minutos_arredondados(inicio), minutos_arredondados(fim, para_cima=True)
+        mapa = self._mapas.get(medico_id)
+        if mapa is not None:
+            mapa.invalidar(ini, fi)
+        vista = self._livres.get(medico_id)
+        if vista is not None and vista.valida:
+            vista.substituir(ini, fi, self._explicitos_livres(medico_id, ini, fi))
+            self.estatisticas_slots.atualizacoes += 1
+
+    def _ocupacao_do_dia(self, medico_id: str, dia: int) -> OcupacaoDia:
+        inicio, fim = dia * MINUTOS_POR_DIA, (dia + 1) * MINUTOS_POR_DIA
+        ocupacao = OcupacaoDia()
+        for ini, fi, bloqueado in self.agendas[medico_id].intervalos(inicio, fim):
+            if bloqueado:
+                ocupacao.bloqueado |= mascara(ini, fi, dia, para_fora=True)
+            else:
+                ocupacao.publicado |= mascara(ini, fi, dia, para_fora=False)
+        confirmadas = self._colisoes(
+            self._por_medico, medico_id, _CONFIRMADAS, instante_de_minutos(inicio), instante_de_minutos(fim)
+        )
+        for c in confirmadas:
+            c_ini, c_fim = minutos_arredondados(c.inicio), minutos_arredondados(c.fim, para_cima=True)
+            ocupacao.reservado |= mascara(c_ini, c_fim, dia, para_fora=True)
+        return ocupacao
+
+    def _colisoes(
+        self,
+        mapa: Dict[str, Dict[StatusConsulta, IndiceIntervalos]],
+        chave: str,
+        status: Tuple[StatusConsulta, ...],
+        inicio: datetime,
+        fim: datetime,
+    ) -> Iterator[Consulta]:
+        por_status = mapa.get(chave, {})
+        for st in status:
+            indice = por_status.get(st)
+            if indice is not None:
+                for cid in indice.sobrepostos(inicio, fim):
+                    yield self.consultas[cid]
+
+    def _em_ordem(self, mapa: Dict[str, Dict[StatusConsulta, IndiceIntervalos]], chave: str) -> List[Consulta]:
+        indices = mapa.get(chave, {}).values()
+        return [self.consultas[cid] for _, cid in heapq.merge(*(list(i.itens()) for i in indices))]
+
+    def _cancelar_agendadas_em_conflito(self, confirmada: Consulta) -> None:
+        colisoes = self._colisoes(
+            self._por_medico, confirmada.medico_id, (StatusConsulta.AGENDADA,), confirmada.inicio, confirmada.fim
+        )
+        for other in list(colisoes):
+            if other.id == confirmada.id:
+                continue
+            self._transicionar(other, lambda: self._forcar_cancelamento(other))
+
+    @staticmethod
+    def _forcar_cancelamento(consulta: Consulta) -> None:
+        try:
+            consulta.cancelar()
+        except Exception:
+            consulta._status = StatusConsulta.CANCELADA
+
+
+def _adicionar_ao_indice(por_status: Dict[StatusConsulta, IndiceIntervalos], consulta: Consulta) -> None:
+    if consulta.status not in por_status:
+        por_status[consulta.status] = IndiceIntervalos()
+    por_status[consulta.status].adicionar(consulta.id, consulta.inicio, consulta.fim)
+
+
+def _remover_do_indice(por_status: Dict[StatusConsulta, IndiceIntervalos], consulta: Consulta) -> None:
+    indice = por_status.get(consulta.status)
+    if indice is not None:
+        indice.remover(consulta.id, consulta.inicio)
+
+
+def _percorrer(
+    indice: IndiceIntervalos, status: StatusConsulta, depois: Tuple[datetime, str], ate: Optional[datetime], lote: int
+) -> Iterator[Tuple[datetime, str, StatusConsulta]]:
+    """(inicio, id, status) de um índice a partir de `depois`, lidos em fatias de `lote`."""
+    while True:
+        fatia = indice.pagina(depois, ate, lote)
+        for inicio, cid in fatia:
+            yield inicio, cid, status
+        if len(fatia) < lote:
+            return
+        depois = fatia[-1]
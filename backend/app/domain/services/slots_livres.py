@@ -0,0 +1,90 @@
+from __future__ import annotations
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from ..entities import SlotAgenda
+from ..entities.agenda import instante_de_minutos
+
+
+@dataclass
+class EstatisticasSlotsLivres:
+    """
+    Contadores das leituras de `slots_disponiveis`. São somados sob a trava de cada médico, não
+    sob uma global, então com muitas threads podem perder alguma unidade: servem para acompanhar
+    proporções, não para contabilidade.
+    """
+
+    acertos: int = 0
+    # leituras que encontraram a vista por montar (primeira vez ou depois de `invalidar_tudo`) e a remontaram
+    faltas: int = 0
+    # trechos refeitos por mudanças na agenda ou nas consultas confirmadas
+    atualizacoes: int = 0
+
+
+class SlotsLivres:
+    """
+    Slots explícitos livres de um médico (publicados, não bloqueados e sem consulta confirmada
+    sobreposta), prontos para leitura: `SlotAgenda` já criados, ordenados por início, com os
+    inícios e fins em minutos num array para a busca binária. O serviço troca só o trecho
+    afetado a cada mudança (`substituir`); `invalidar_tudo` força a remontagem na próxima leitura.
+
+    Slots gerados por regras não entram aqui: dependem de "agora" e continuam gerados na leitura.
+    """
+
+    def __init__(self) -> None:
+        self.valida = False
+        self._slots: List[SlotAgenda] = []
+        self._inicios = array("q")
+        self._fins = array("q")
+        self._maior_duracao = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def montar(self, livres: Iterable[Tuple[int, int]]) -> None:
+        self._slots, self._inicios, self._fins = [], array("q"), array("q")
+        self._maior_duracao = 0
+        self._acrescentar(0, [(ini, fi, None) for ini, fi in sorted(livres)])
+        self.valida = True
+
+    def invalidar_tudo(self) -> None:
+        self.valida = False
+
+    def substituir(self, inicio: int, fim: int, livres: Iterable[Tuple[int, int]]) -> None:
+        """Troca os slots que colidem com [inicio, fim) pelos `livres` (os livres que colidem com ele agora)."""
+        primeiro = bisect_left(self._inicios, inicio - self._maior_duracao)
+        ultimo = bisect_left(self._inicios, fim)
+        # entre primeiro e ultimo podem sobrar slots que terminam antes de `inicio`: ficam
+        mantidos = [pos for pos in range(primeiro, ultimo) if self._fins[pos] <= inicio]
+        antes = [(self._inicios[pos], self._fins[pos], self._slots[pos]) for pos in mantidos]
+        del self._slots[primeiro:ultimo]
+        del self._inicios[primeiro:ultimo]
+        del self._fins[primeiro:ultimo]
+        novos = sorted([(ini, fi, None) for ini, fi in livres] + antes, key=lambda t: t[0])
+        self._acrescentar(primeiro, novos)
+
+    def slots(self, de: Optional[int], ate: Optional[int]) -> Iterator[SlotAgenda]:
+        """
+        Slots que começam em [de, ate), em minutos desde a época; None deixa o lado aberto. Sem
+        cópia: uma busca binária até `de` e depois um slot por vez, então quem para cedo (ver
+        `proximos_slots`) paga só o que leu. Vale enquanto a vista não muda (sob a trava do médico).
+        """
+        pos = bisect_left(self._inicios, de) if de is not None else 0
+        fim = bisect_left(self._inicios, ate) if ate is not None else len(self._inicios)
+        while pos < fim:
+            yield self._slots[pos]
+            pos += 1
+
+    def _acrescentar(self, pos: int, itens: List[Tuple[int, int, Optional[SlotAgenda]]]) -> None:
+        if not itens:
+            return
+        # slots mantidos voltam como estavam; os demais são criados aqui, uma vez
+        self._slots[pos:pos] = [
+            slot if slot is not None else SlotAgenda(instante_de_minutos(ini), instante_de_minutos(fi))
+            for ini, fi, slot in itens
+        ]
+        self._inicios[pos:pos] = array("q", [ini for ini, _, _ in itens])
+        self._fins[pos:pos] = array("q", [fi for _, fi, _ in itens])
+        self._maior_duracao = max(self._maior_duracao, max(fi - ini for ini, fi, _ in itens))
@@ -0,0 +1,59 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from threading import Lock, RLock
+from typing import Dict, Iterator
+
+
+def chave_medico(medico_id: str) -> str:
+    return f"medico:{medico_id}"
+
+
+def chave_paciente(paciente_id: str) -> str:
+    return f"paciente:{paciente_id}"
+
+
+class _Trava:
+    __slots__ = ("trava", "usuarios")
+
+    def __init__(self) -> None:
+        self.trava = RLock()
+        # quem segura a trava ou espera por ela; a entrada sai do dicionário quando chega a zero
+        self.usuarios = 0
+
+
+class TravasPorChave:
+    """
+    Um `RLock` por chave, criado sob demanda e descartado quando ninguém mais o segura nem
+    espera por ele, então o dicionário só guarda as chaves em uso, não todas as já vistas.
+    `adquirir` trava várias chaves sempre em ordem lexicográfica, então todas as travas de
+    médico vêm antes das de paciente e duas threads nunca esperam uma pela outra em ordens opostas.
+    """
+
+    def __init__(self) -> None:
+        self._travas: Dict[str, _Trava] = {}
+        self._guarda = Lock()
+
+    def __len__(self) -> int:
+        return len(self._travas)
+
+    @contextmanager
+    def adquirir(self, *chaves: str) -> Iterator[None]:
+        chaves = sorted(set(chaves))
+        with self._guarda:
+            travas = [self._travas.get(chave) or self._travas.setdefault(chave, _Trava()) for chave in chaves]
+            for trava in travas:
+                trava.usuarios += 1
+        adquiridas = 0
+        try:
+            for trava in travas:
+                trava.trava.acquire()
+                adquiridas += 1
+            yield
+        finally:
+            for trava in reversed(travas[:adquiridas]):
+                trava.trava.release()
+            with self._guarda:
+                for chave, trava in zip(chaves, travas):
+                    trava.usuarios -= 1
+                    if not trava.usuarios:
+                        del self._travas[chave]
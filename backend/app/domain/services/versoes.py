@@ -0,0 +1,71 @@
+from __future__ import annotations
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import islice
+import threading
+from typing import Deque, Dict, List, Optional, Tuple
+
+from ..enums import TipoMudanca
+
+
+@dataclass(frozen=True)
+class Mudanca:
+    """Uma mudança aplicada pelo serviço: a consulta tocada ou os intervalos da agenda afetados."""
+
+    tipo: TipoMudanca
+    medico_id: str
+    consulta_id: Optional[str] = None
+    intervalos: Tuple[Tuple[datetime, datetime], ...] = ()
+
+
+class Versoes:
+    """
+    Contadores de mudança monotônicos: um global e um por chave (médico, paciente, lista...).
+    Cada mudança avança o global e grava o novo valor nas chaves afetadas, então a versão de uma
+    chave só cresce e duas chaves com o mesmo valor foram tocadas pela mesma mudança.
+
+    Quem muda o estado avança a versão depois de aplicar a mudança; quem lê pega a versão antes
+    de ler os dados. Assim uma resposta nunca leva uma versão mais nova que o seu conteúdo.
+
+    Com `retencao` > 0 as últimas mudanças (versão, `Mudanca`) ficam num registro limitado,
+    preenchido sob a mesma trava do contador, então ele é contíguo e em ordem de versão.
+    """
+
+    def __init__(self, retencao: int = 0) -> None:
+        self._atual = 0
+        self._por_chave: Dict[str, int] = {}
+        self._registro: Deque[Tuple[int, Optional[Mudanca]]] = deque(maxlen=retencao)
+        self._guarda = threading.Lock()
+
+    @property
+    def atual(self) -> int:
+        return self._atual
+
+    def de(self, chave: str) -> int:
+        return self._por_chave.get(chave, 0)
+
+    def avancar(self, *chaves: str, mudanca: Optional[Mudanca] = None) -> int:
+        with self._guarda:
+            self._atual += 1
+            for chave in chaves:
+                self._por_chave[chave] = self._atual
+            # avanços sem descrição também ocupam posição, para o registro não ter buracos
+            if self._registro.maxlen:
+                self._registro.append((self._atual, mudanca))
+            return self._atual
+
+    def desde(self, versao: int) -> Optional[List[Tuple[int, Mudanca]]]:
+        """
+        Mudanças posteriores a `versao`, em ordem; None se parte delas já saiu do registro (ou
+        se `versao` é de outro momento), caso em que quem pediu precisa recarregar tudo.
+        """
+        with self._guarda:
+            if versao > self._atual or versao < 0:
+                return None
+            if versao == self._atual:
+                return []
+            if not self._registro or self._registro[0][0] > versao + 1:
+                return None
+            posteriores = islice(self._registro, versao + 1 - self._registro[0][0], None)
+            return [(v, m) for v, m in posteriores if m is not None]
@@ -0,0 +1,83 @@
+import threading
+import unicodedata
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Set
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas (casefold) e sem acentos: "Clínica Geral" e "CLINICA geral" ficam iguais."""
+    decomposto = unicodedata.normalize("NFKD", texto.casefold())
+    return "".join(c for c in decomposto if not unicodedata.combining(c))
+
+
+def termos(texto: str) -> List[str]:
+    return normalizar(texto).split()
+
+
+class IndiceEspecialidades:
+    """
+    Índice invertido das especialidades dos médicos: cada palavra normalizada (ver `normalizar`)
+    aponta para os ids dos médicos que a têm. Os termos ficam ordenados, então a busca por
+    prefixo é uma busca binária seguida dos termos vizinhos; com várias palavras, o médico
+    precisa casar todas ("clin ger" acha "Clínica Geral").
+
+    Os resultados saem na ordem em que os médicos foram indexados pela primeira vez (a mesma do
+    cadastro), estável entre chamadas, e podem ser paginados pela posição (`depois`).
+    """
+
+    def __init__(self) -> None:
+        self._por_termo: Dict[str, Set[str]] = {}
+        self._termos: List[str] = []
+        self._do_medico: Dict[str, Set[str]] = {}
+        self._em_ordem: List[str] = []
+        self._posicao: Dict[str, int] = {}
+        self._guarda = threading.Lock()
+
+    def indexar(self, medico_id: str, especialidades: Optional[Iterable[str]]) -> None:
+        novos = {t for especialidade in especialidades or () for t in termos(especialidade)}
+        with self._guarda:
+            if medico_id not in self._posicao:
+                self._posicao[medico_id] = len(self._em_ordem)
+                self._em_ordem.append(medico_id)
+            antigos = self._do_medico.get(medico_id, set())
+            for termo in antigos - novos:
+                medicos = self._por_termo[termo]
+                medicos.discard(medico_id)
+                if not medicos:
+                    del self._por_termo[termo]
+                    del self._termos[bisect_left(self._termos, termo)]
+            for termo in novos - antigos:
+                if termo not in self._por_termo:
+                    self._por_termo[termo] = set()
+                    self._termos.insert(bisect_left(self._termos, termo), termo)
+                self._por_termo[termo].add(medico_id)
+            self._do_medico[medico_id] = novos
+
+    def posicao(self, medico_id: str) -> int:
+        return self._posicao[medico_id]
+
+    def buscar(self, consulta: Optional[str], depois: Optional[int] = None, limite: Optional[int] = None) -> List[str]:
+        """
+        Ids dos médicos cujas especialidades têm palavras começando por cada palavra da
+        `consulta` (todos, se ela estiver vazia), a partir da posição seguinte a `depois`.
+        """
+        palavras = termos(consulta or "")
+        with self._guarda:
+            if not palavras:
+                inicio = depois + 1 if depois is not None else 0
+                fim = inicio + limite if limite is not None else None
+                return self._em_ordem[inicio:fim]
+            encontrados: Optional[Set[str]] = None
+            for palavra in palavras:
+                casados = set()
+                pos = bisect_left(self._termos, palavra)
+                while pos < len(self._termos) and self._termos[pos].startswith(palavra):
+                    casados |= self._por_termo[self._termos[pos]]
+                    pos += 1
+                encontrados = casados if encontrados is None else encontrados & casados
+                if not encontrados:
+                    return []
+            posicoes = sorted(self._posicao[medico_id] for medico_id in encontrados)
+        inicio = bisect_right(posicoes, depois) if depois is not None else 0
+        fim = inicio + limite if limite is not None else None
+        return [self._em_ordem[p] for p in posicoes[inicio:fim]]
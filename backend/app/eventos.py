@@ -0,0 +1,152 @@
+import asyncio
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from pydantic import TypeAdapter
+
+from .domain import Consulta, RegraRecorrencia, RepositorioAgendamento, TipoMudanca
+from .domain.services.travas import chave_medico, chave_paciente
+from .schemas import MudancaAgendaOut
+
+# Escopo de quem recebe tudo (admins).
+TODOS = "*"
+_MUDANCA_AGENDA = TypeAdapter(MudancaAgendaOut)
+# Assinante que ficou para trás: a fila é esvaziada e recebe só este marcador.
+_DESCARTADO = None
+# Nada chegou em `intervalo_ping` segundos.
+_PING = object()
+
+
+def chave_agenda(medico_id: str) -> str:
+    return f"agenda:{medico_id}"
+
+
+class Assinante:
+    def __init__(self, chaves: Iterable[str], capacidade: int) -> None:
+        self.chaves = frozenset(chaves)
+        self.fila: "asyncio.Queue[Optional[Tuple[str, bytes]]]" = asyncio.Queue(capacidade)
+
+
+class HubEventos(RepositorioAgendamento):
+    """
+    Distribui as mudanças da agenda para quem acompanha por GET /eventos (server-sent events).
+    Recebe os avisos do serviço como qualquer repositório, nas threads das requisições, e repassa
+    ao event loop com `call_soon_threadsafe`; lá cada evento vai só para os assinantes das chaves
+    envolvidas (médico, paciente, agenda do médico ou `TODOS`).
+
+    Cada assinante tem uma fila de `capacidade` eventos. Quem não consome a tempo é descartado
+    (a fila é trocada por um aviso de ressincronizar) em vez de acumular memória ou atrasar os
+    demais. Assinante parado custa só a tarefa esperando a própria fila: nada roda até haver evento.
+    """
+
+    def __init__(self, serializar_consulta: Callable[[Consulta], bytes], capacidade: int = 100) -> None:
+        self._serializar_consulta = serializar_consulta
+        self._capacidade = capacidade
+        self._por_chave: Dict[str, Set[Assinante]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # contadores para /metricas, mexidos só no event loop
+        self.assinantes = 0
+        self.descartados = 0
+
+    # --- avisos do serviço (threads das requisições) ---
+    def consulta_salva(self, consulta: Consulta) -> None:
+        chaves = (chave_medico(consulta.medico_id), chave_paciente(consulta.paciente_id), TODOS)
+        if self._interessados(chaves):
+            self._publicar(chaves, "consulta", self._serializar_consulta(consulta))
+
+    def slots_adicionados(self, medico_id: str, intervalos: List[Tuple[datetime, datetime]]) -> None:
+        self._publicar_agenda(TipoMudanca.SLOTS, medico_id, intervalos)
+
+    def bloqueio_adicionado(self, medico_id: str, inicio: datetime, fim: datetime) -> None:
+        self._publicar_agenda(TipoMudanca.BLOQUEIO, medico_id, [(inicio, fim)])
+
+    def bloqueio_removido(self, medico_id: str, inicio: datetime, fim: datetime) -> None:
+        self._publicar_agenda(TipoMudanca.DESBLOQUEIO, medico_id, [(inicio, fim)])
+
+    def regra_adicionada(self, medico_id: str, regra: RegraRecorrencia) -> None:
+        self._publicar_agenda(TipoMudanca.REGRAS, medico_id, [])
+
+    def regra_removida(self, medico_id: str, regra: RegraRecorrencia) -> None:
+        self._publicar_agenda(TipoMudanca.REGRAS, medico_id, [])
+
+    # --- assinantes (event loop) ---
+    async def acompanhar(
+        self, chaves: Iterable[str], valido: Optional[Callable[[], bool]] = None, intervalo_ping: float = 15.0
+    ) -> AsyncIterator[bytes]:
+        """
+        Mensagens SSE para as `chaves`, com um comentário a cada `intervalo_ping` s para manter a
+        conexão. `valido` é consultado a cada ping e antes de cada evento, numa thread à parte
+        (pode ler o banco): quando deixa de valer (logout, token revogado, sessão expirada) a
+        conexão recebe `sessao_encerrada` e termina.
+        """
+        self._loop = asyncio.get_running_loop()
+        assinante = Assinante(chaves, self._capacidade)
+        for chave in assinante.chaves:
+            self._por_chave.setdefault(chave, set()).add(assinante)
+        self.assinantes += 1
+        try:
+            yield b": conectado\n\n"
+            while True:
+                try:
+                    item = await asyncio.wait_for(assinante.fila.get(), intervalo_ping)
+                except asyncio.TimeoutError:
+                    item = _PING
+                if valido is not None and not await asyncio.to_thread(valido):
+                    yield b"event: sessao_encerrada\ndata: {}\n\n"
+                    return
+                if item is _PING:
+                    yield b": ping\n\n"
+                    continue
+                if item is _DESCARTADO:
+                    # perdeu eventos: o cliente recarrega (ou usa GET /mudancas) e reconecta
+                    yield b"event: ressincronizar\ndata: {}\n\n"
+                    return
+                evento, dados = item
+                yield b"event: %s\ndata: %s\n\n" % (evento.encode("ascii"), dados)
+        finally:
+            self.assinantes -= 1
+            self._remover(assinante)
+
+    def _publicar_agenda(self, tipo: TipoMudanca, medico_id: str, intervalos: List[Tuple[datetime, datetime]]) -> None:
+        chaves = (chave_medico(medico_id), chave_agenda(medico_id), TODOS)
+        if self._interessados(chaves):
+            mudanca = MudancaAgendaOut(
+                tipo=tipo, medico_id=medico_id, intervalos=[{"inicio": i, "fim": f} for i, f in intervalos]
+            )
+            self._publicar(chaves, "agenda", _MUDANCA_AGENDA.dump_json(mudanca))
+
+    def _interessados(self, chaves: Iterable[str]) -> bool:
+        # sem ninguém ouvindo, a mudança não custa nem a serialização
+        return self._loop is not None and any(self._por_chave.get(chave) for chave in chaves)
+
+    def _publicar(self, chaves: Tuple[str, ...], evento: str, dados: bytes) -> None:
+        try:
+            self._loop.call_soon_threadsafe(self._entregar, chaves, evento, dados)
+        except RuntimeError:
+            # loop encerrado (desligamento do servidor): não há mais a quem entregar
+            pass
+
+    def _entregar(self, chaves: Tuple[str, ...], evento: str, dados: bytes) -> None:
+        destinatarios = set()
+        for chave in chaves:
+            destinatarios.update(self._por_chave.get(chave, ()))
+        for assinante in destinatarios:
+            try:
+                assinante.fila.put_nowait((evento, dados))
+            except asyncio.QueueFull:
+                self._descartar(assinante)
+
+    def _descartar(self, assinante: Assinante) -> None:
+        self.descartados += 1
+        self._remover(assinante)
+        while not assinante.fila.empty():
+            assinante.fila.get_nowait()
+        assinante.fila.put_nowait(_DESCARTADO)
+
+    def _remover(self, assinante: Assinante) -> None:
+        for chave in assinante.chaves:
+            assinantes = self._por_chave.get(chave)
+            if assinantes is not None:
+                assinantes.discard(assinante)
+                if not assinantes:
+                    del self._por_chave[chave]
@@ -0,0 +1,574 @@
+from array import array
+import atexit
+from collections import Counter
+from datetime import date, datetime, time, timedelta, timezone
+import logging
+import os
+import re
+import struct
+import sys
+import threading
+from time import sleep
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import zlib
+
+from .domain import Agenda, Consulta, RegraRecorrencia, RepositorioAgendamento, StatusConsulta
+from .domain.entities.agenda import minutos_desde_epoca
+from .persistencia import montar_agenda
+
+# Registro: cabeçalho (tamanho do corpo, crc32 do corpo) + corpo; o primeiro byte do corpo é o tipo.
+# SLOTS e CONSULTAS guardam muitos itens em colunas (arrays) e são o formato dos snapshots:
+# cada coluna é lida de uma vez por `array.frombytes`, sem decodificar item a item.
+SLOT, DESBLOQUEIO, REGRA, REGRA_REMOVIDA, CONSULTA, SLOTS, CONSULTAS = range(1, 8)
+CONSULTAS_POR_BLOCO = 10_000
+
+_CABECALHO = struct.Struct("<II")
+_SLOT = struct.Struct("<qqB")  # início, fim (minutos desde a época), bloqueado
+_INTERVALO = struct.Struct("<qq")
+_REGRA = struct.Struct("<BHHHii")  # dia, abertura, fechamento, duração (minutos), vigência (ordinais)
+# Consulta: início, fim, criada_em, atualizada_em (microssegundos de relógio local desde a época
+# e fuso em minutos), status e tamanhos de id, paciente_id, medico_id e observações; os textos
+# vêm em seguida.
+_CONSULTA = struct.Struct("<qhqhqhqhBHHHI")
+_TAMANHO = struct.Struct("<I")
+_SEM_FUSO = -(2**15)
+_SEM_TEXTO = 2**32 - 1
+_EPOCA = datetime(1970, 1, 1)
+_MICROSSEGUNDO = timedelta(microseconds=1)
+_MINUTO = timedelta(minutes=1)
+_STATUS = list(StatusConsulta)
+_CODIGO_STATUS = {status: codigo for codigo, status in enumerate(_STATUS)}
+_ARQUIVO = re.compile(r"^(journal|snapshot)-(\d{12})\.bin$")
+_TROCAR_BYTES = sys.byteorder == "big"  # o formato em disco é little-endian
+
+logger = logging.getLogger(__name__)
+
+
+def _texto(valor: Optional[str]) -> bytes:
+    if valor is None:
+        return _TAMANHO.pack(_SEM_TEXTO)
+    dados = valor.encode("utf-8")
+    return _TAMANHO.pack(len(dados)) + dados
+
+
+def _coluna(codigo: str, valores: Iterable[int]) -> bytes:
+    coluna = array(codigo, valores)
+    if _TROCAR_BYTES:
+        coluna.byteswap()
+    return coluna.tobytes()
+
+
+def _instante(valor: datetime) -> Tuple[int, int]:
+    fuso = valor.utcoffset()
+    local = (valor.replace(tzinfo=None) - _EPOCA) // _MICROSSEGUNDO
+    return local, _SEM_FUSO if fuso is None else fuso // _MINUTO
+
+
+def _de_instante(local: int, fuso: int) -> datetime:
+    valor = _EPOCA + timedelta(microseconds=local)
+    return valor if fuso == _SEM_FUSO else valor.replace(tzinfo=timezone(timedelta(minutes=fuso)))
+
+
+def _minutos_do_dia(valor: time) -> int:
+    return valor.hour * 60 + valor.minute
+
+
+def codificar(evento: Tuple) -> bytes:
+    """Serializa um evento (ver `JournalAgenda`) como registro do journal."""
+    tipo = evento[0]
+    corpo = bytearray((tipo,))
+    if tipo == SLOT or tipo == DESBLOQUEIO:
+        corpo += _texto(evento[1])
+        corpo += (_SLOT if tipo == SLOT else _INTERVALO).pack(*evento[2:])
+    elif tipo == SLOTS:
+        _, medico_id, inicios, fins, bloqueados = evento
+        corpo += _texto(medico_id)
+        corpo += _TAMANHO.pack(len(inicios))
+        corpo += _coluna("q", inicios) + _coluna("q", fins) + bytes(bloqueados)
+    elif tipo == REGRA or tipo == REGRA_REMOVIDA:
+        _, medico_id, regra = evento
+        corpo += _texto(medico_id)
+        corpo += _REGRA.pack(
+            regra.dia_semana,
+            _minutos_do_dia(regra.hora_inicio),
+            _minutos_do_dia(regra.hora_fim),
+            regra.duracao_minutos,
+            regra.vigente_de.toordinal(),
+            regra.vigente_ate.toordinal() if regra.vigente_ate else 0,
+        )
+    elif tipo == CONSULTA:
+        _, consulta_id, paciente_id, medico_id, inicio, fim, status, observacoes, criada_em, atualizada_em = evento
+        textos = [t.encode("utf-8") for t in (consulta_id, paciente_id, medico_id)]
+        if observacoes is not None:
+            textos.append(observacoes.encode("utf-8"))
+        corpo += _CONSULTA.pack(
+            *_instante(inicio),
+            *_instante(fim),
+            *_instante(criada_em),
+            *_instante(atualizada_em),
+            _CODIGO_STATUS[status],
+            *(len(t) for t in textos[:3]),
+            _SEM_TEXTO if observacoes is None else len(textos[3]),
+        )
+        corpo += b"".join(textos)
+    else:
+        corpo += _codificar_consultas(evento[1])
+    return _CABECALHO.pack(len(corpo), zlib.crc32(corpo)) + corpo
+
+
+def _codificar_consultas(consultas: List[Tuple]) -> bytes:
+    # colunas: 4 de instantes locais, 4 de fusos, status, ids separados por NUL, observações
+    instantes = [[_instante(c[k]) for c in consultas] for k in (4, 5, 8, 9)]
+    ids = [c[k] for k in (1, 2, 3) for c in consultas]
+    if any("\x00" in i for i in ids):
+        raise ValueError("Identificadores não podem conter o caractere NUL.")
+    observacoes = [None if c[7] is None else c[7].encode("utf-8") for c in consultas]
+    partes = [_TAMANHO.pack(len(consultas))]
+    partes += [_coluna("q", (local for local, _ in coluna)) for coluna in instantes]
+    partes += [_coluna("h", (fuso for _, fuso in coluna)) for coluna in instantes]
+    partes.append(bytes(_CODIGO_STATUS[c[6]] for c in consultas))
+    partes.append(_texto("\x00".join(ids)))
+    partes.append(_coluna("I", (_SEM_TEXTO if o is None else len(o) for o in observacoes)))
+    partes.append(b"".join(o for o in observacoes if o is not None))
+    return b"".join(partes)
+
+
+class _Leitor:
+    def __init__(self, corpo: memoryview) -> None:
+        self._corpo = corpo
+        self._pos = 1  # depois do tipo
+
+    def ler(self, formato: struct.Struct) -> Tuple:
+        valores = formato.unpack_from(self._corpo, self._pos)
+        self._pos += formato.size
+        return valores
+
+    def bruto(self, tamanho: int) -> memoryview:
+        self._pos += tamanho
+        return self._corpo[self._pos - tamanho : self._pos]
+
+    def texto(self) -> Optional[str]:
+        (tamanho,) = self.ler(_TAMANHO)
+        if tamanho == _SEM_TEXTO:
+            return None
+        return str(self.bruto(tamanho), "utf-8")
+
+    def coluna(self, codigo: str, quantidade: int) -> array:
+        coluna = array(codigo)
+        coluna.frombytes(self.bruto(quantidade * coluna.itemsize))
+        if _TROCAR_BYTES:
+            coluna.byteswap()
+        return coluna
+
+
+def decodificar(corpo: memoryview, horarios: Optional[Dict[Tuple[int, int], datetime]] = None) -> Tuple:
+    """
+    Evento de um registro. `horarios` guarda os inícios/fins de consulta já convertidos: eles
+    se repetem muito entre médicos, e montar um datetime custa mais que achá-lo.
+    """
+    horarios = {} if horarios is None else horarios
+    leitor = _Leitor(corpo)
+    tipo = corpo[0]
+    if tipo == SLOT:
+        return (tipo, leitor.texto(), *leitor.ler(_SLOT))
+    if tipo == DESBLOQUEIO:
+        return (tipo, leitor.texto(), *leitor.ler(_INTERVALO))
+    if tipo == SLOTS:
+        medico_id = leitor.texto()
+        (quantidade,) = leitor.ler(_TAMANHO)
+        return (tipo, medico_id, leitor.coluna("q", quantidade), leitor.coluna("q", quantidade), leitor.bruto(quantidade))
+    if tipo == REGRA or tipo == REGRA_REMOVIDA:
+        medico_id = leitor.texto()
+        dia, abertura, fechamento, duracao, de, ate = leitor.ler(_REGRA)
+        regra = RegraRecorrencia(
+            dia_semana=dia,
+            hora_inicio=time(abertura // 60, abertura % 60),
+            hora_fim=time(fechamento // 60, fechamento % 60),
+            duracao_minutos=duracao,
+            vigente_de=date.fromordinal(de),
+            vigente_ate=date.fromordinal(ate) if ate else None,
+        )
+        return (tipo, medico_id, regra)
+    if tipo == CONSULTA:
+        return _decodificar_consulta(leitor, horarios)
+    return (tipo, _decodificar_consultas(leitor, horarios))
+
+
+def _horario(horarios: Dict[Tuple[int, int], datetime], local: int, fuso: int) -> datetime:
+    chave = (local, fuso)
+    valor = horarios.get(chave)
+    if valor is None:
+        valor = horarios[chave] = _de_instante(local, fuso)
+    return valor
+
+
+def _decodificar_consulta(leitor: _Leitor, horarios: Dict[Tuple[int, int], datetime]) -> Tuple:
+    i0, f0, i1, f1, c0, c1, a0, a1, status, n_id, n_paciente, n_medico, n_obs = leitor.ler(_CONSULTA)
+    consulta_id, paciente_id, medico_id = (str(leitor.bruto(n), "utf-8") for n in (n_id, n_paciente, n_medico))
+    return (
+        CONSULTA,
+        consulta_id,
+        paciente_id,
+        medico_id,
+        _horario(horarios, i0, f0),
+        _horario(horarios, i1, f1),
+        _STATUS[status],
+        None if n_obs == _SEM_TEXTO else str(leitor.bruto(n_obs), "utf-8"),
+        _de_instante(c0, c1),
+        _de_instante(a0, a1),
+    )
+
+
+def _decodificar_consultas(leitor: _Leitor, horarios: Dict[Tuple[int, int], datetime]) -> List[Tuple]:
+    (n,) = leitor.ler(_TAMANHO)
+    ini, fim, criada, atualizada = (leitor.coluna("q", n) for _ in range(4))
+    fusos = [leitor.coluna("h", n) for _ in range(4)]
+    status = leitor.bruto(n)
+    ids = leitor.texto().split("\x00")
+    tamanhos = leitor.coluna("I", n)
+    blob = leitor.bruto(sum(t for t in tamanhos if t != _SEM_TEXTO))
+    observacoes: List[Optional[str]] = []
+    pos = 0
+    for tamanho in tamanhos:
+        if tamanho == _SEM_TEXTO:
+            observacoes.append(None)
+        else:
+            observacoes.append(str(blob[pos : pos + tamanho], "utf-8"))
+            pos += tamanho
+    return [
+        (
+            CONSULTA,
+            ids[i],
+            ids[n + i],
+            ids[2 * n + i],
+            _horario(horarios, ini[i], fusos[0][i]),
+            _horario(horarios, fim[i], fusos[1][i]),
+            _STATUS[status[i]],
+            observacoes[i],
+            _de_instante(criada[i], fusos[2][i]),
+            _de_instante(atualizada[i], fusos[3][i]),
+        )
+        for i in range(n)
+    ]
+
+
+def ler_eventos(caminho: str) -> Iterator[Tuple]:
+    """Eventos de um arquivo do journal; para no primeiro registro incompleto ou corrompido (escrita interrompida)."""
+    with open(caminho, "rb") as arquivo:
+        dados = memoryview(arquivo.read())
+    horarios: Dict[Tuple[int, int], datetime] = {}
+    pos = 0
+    while pos + _CABECALHO.size <= len(dados):
+        tamanho, crc = _CABECALHO.unpack_from(dados, pos)
+        corpo = dados[pos + _CABECALHO.size : pos + _CABECALHO.size + tamanho]
+        if len(corpo) < tamanho or zlib.crc32(corpo) != crc:
+            return
+        yield decodificar(corpo, horarios)
+        pos += _CABECALHO.size + tamanho
+
+
+class EstadoAgenda:
+    """Estado reconstruído a partir de eventos, sem objetos de domínio até `montar`."""
+
+    def __init__(self) -> None:
+        self.livres: Dict[str, Set[Tuple[int, int]]] = {}
+        self.bloqueios: Dict[str, Counter] = {}
+        self.regras: Dict[str, List[RegraRecorrencia]] = {}
+        self.consultas: Dict[str, Tuple] = {}
+
+    def aplicar(self, evento: Tuple) -> None:
+        tipo = evento[0]
+        if tipo == SLOT:
+            _, medico_id, inicio, fim, bloqueado = evento
+            if bloqueado:
+                self.bloqueios.setdefault(medico_id, Counter())[(inicio, fim)] += 1
+            else:
+                self.livres.setdefault(medico_id, set()).add((inicio, fim))
+        elif tipo == SLOTS:
+            _, medico_id, inicios, fins, bloqueados = evento
+            livres = self.livres.setdefault(medico_id, set())
+            for inicio, fim, bloqueado in zip(inicios, fins, bloqueados):
+                if bloqueado:
+                    self.bloqueios.setdefault(medico_id, Counter())[(inicio, fim)] += 1
+                else:
+                    livres.add((inicio, fim))
+        elif tipo == DESBLOQUEIO:
+            _, medico_id, inicio, fim = evento
+            self.bloqueios.get(medico_id, Counter()).pop((inicio, fim), None)
+        elif tipo == REGRA:
+            self.regras.setdefault(evento[1], []).append(evento[2])
+        elif tipo == REGRA_REMOVIDA:
+            regras = self.regras.get(evento[1], [])
+            if evento[2] in regras:
+                regras.remove(evento[2])
+        elif tipo == CONSULTA:
+            self.consultas[evento[1]] = evento
+        else:
+            self.consultas.update((consulta[1], consulta) for consulta in evento[1])
+
+    def eventos(self) -> Iterator[Tuple]:
+        """O menor conjunto de eventos que reproduz este estado (conteúdo de um snapshot)."""
+        for medico_id in self.livres.keys() | self.bloqueios.keys():
+            intervalos = [(ini, fi, 0) for ini, fi in self.livres.get(medico_id, ())]
+            intervalos += [(ini, fi, 1) for ini, fi in self.bloqueios.get(medico_id, Counter()).elements()]
+            intervalos.sort()
+            inicios, fins, bloqueados = zip(*intervalos) if intervalos else ((), (), ())
+            yield (SLOTS, medico_id, inicios, fins, bloqueados)
+        for medico_id, regras in self.regras.items():
+            for regra in regras:
+                yield (REGRA, medico_id, regra)
+        consultas = list(self.consultas.values())
+        for inicio in range(0, len(consultas), CONSULTAS_POR_BLOCO):
+            yield (CONSULTAS, consultas[inicio : inicio + CONSULTAS_POR_BLOCO])
+
+    def montar(self) -> Tuple[Dict[str, Agenda], Dict[str, Consulta]]:
+        agendas: Dict[str, Agenda] = {}
+        for medico_id in self.livres.keys() | self.bloqueios.keys() | self.regras.keys():
+            bloqueios = self.bloqueios.get(medico_id, Counter()).elements()
+            agenda = montar_agenda(medico_id, self.livres.get(medico_id, ()), bloqueios)
+            for regra in self.regras.get(medico_id, ()):
+                agenda.adicionar_regra(regra)
+            agendas[medico_id] = agenda
+        consultas = {cid: Consulta(*evento[1:]) for cid, evento in self.consultas.items()}
+        return agendas, consultas
+
+
+class JournalAgenda(RepositorioAgendamento):
+    """
+    Persiste a agenda num journal binário só de acréscimo, em segmentos numerados dentro de
+    `pasta`. As mudanças são serializadas na thread que as aplicou e uma thread de fundo grava
+    e sincroniza (fsync) o que acumulou a cada `intervalo` segundos. Quando o segmento atual
+    passa de `limite_segmento` bytes, ele é fechado e compactado em segundo plano: o snapshot
+    anterior mais os segmentos fechados viram um novo snapshot, e os arquivos antigos são
+    apagados. Ao subir, `carregar` lê o snapshot mais recente e só os segmentos seguintes.
+
+    Uma gravação que falha (disco cheio, erro de E/S) desfaz o trecho parcial do segmento e é
+    tentada de novo (`tentativas` vezes, com espera crescente). Se continuar falhando, o journal
+    para: o erro é guardado, novas mudanças são recusadas com ele e `descarregar`/`fechar` o
+    levantam, como em `RepositorioSQLite`.
+    """
+
+    def __init__(
+        self,
+        pasta: str,
+        limite_segmento: int = 64 * 1024 * 1024,
+        intervalo: float = 0.05,
+        tentativas: int = 5,
+        espera_tentativa: float = 0.1,
+    ) -> None:
+        os.makedirs(pasta, exist_ok=True)
+        self._pasta = pasta
+        self._limite_segmento = limite_segmento
+        self._intervalo = intervalo
+        self._tentativas = tentativas
+        self._espera_tentativa = espera_tentativa
+        self._erro: Optional[BaseException] = None
+        self._snapshot, segmentos = self._inventario()
+        self._segmento = max(segmentos, default=self._snapshot) + 1
+        self._arquivo = open(self._caminho("journal", self._segmento), "ab")
+        self._tamanho = 0
+        self._buffer = bytearray()
+        self._guarda = threading.Lock()
+        self._escrita = threading.Lock()
+        self._compactando = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._gravar_periodicamente, name="medsched-journal", daemon=True)
+        self._thread.start()
+        atexit.register(self._fechar_na_saida)
+
+    # --- RepositorioAgendamento ---
+    def verificar(self) -> None:
+        if self._erro is not None:
+            raise RuntimeError("A gravação do journal da agenda parou após falhas repetidas.") from self._erro
+
+    def slots_adicionados(self, medico_id: str, intervalos: List[Tuple[datetime, datetime]]) -> None:
+        inicios = [minutos_desde_epoca(inicio) for inicio, _ in intervalos]
+        fins = [minutos_desde_epoca(fim) for _, fim in intervalos]
+        if len(inicios) == 1:
+            self._anexar([(SLOT, medico_id, inicios[0], fins[0], 0)])
+        else:
+            self._anexar([(SLOTS, medico_id, inicios, fins, bytes(len(inicios)))])
+
+    def bloqueio_adicionado(self, medico_id: str, inicio: datetime, fim: datetime) -> None:
+        self._anexar([(SLOT, medico_id, minutos_desde_epoca(inicio), minutos_desde_epoca(fim), 1)])
+
+    def bloqueio_removido(self, medico_id: str, inicio: datetime, fim: datetime) -> None:
+        self._anexar([(DESBLOQUEIO, medico_id, minutos_desde_epoca(inicio), minutos_desde_epoca(fim))])
+
+    def regra_adicionada(self, medico_id: str, regra: RegraRecorrencia) -> None:
+        self._anexar([(REGRA, medico_id, regra)])
+
+    def regra_removida(self, medico_id: str, regra: RegraRecorrencia) -> None:
+        self._anexar([(REGRA_REMOVIDA, medico_id, regra)])
+
+    def consulta_salva(self, consulta: Consulta) -> None:
+        self._anexar(
+            [
+                (
+                    CONSULTA,
+                    consulta.id,
+                    consulta.paciente_id,
+                    consulta.medico_id,
+                    consulta.inicio,
+                    consulta.fim,
+                    consulta.status,
+                    consulta.observacoes,
+                    consulta._criada_em,
+                    consulta._atualizada_em,
+                )
+            ]
+        )
+
+    # --- leitura ---
+    def carregar(self) -> Tuple[Dict[str, Agenda], Dict[str, Consulta]]:
+        """Agendas e consultas do último snapshot mais os segmentos gravados depois dele."""
+        return self._estado_ate(self._segmento - 1).montar()
+
+    # --- controle ---
+    def descarregar(self) -> None:
+        """Grava e sincroniza imediatamente tudo o que já foi registrado."""
+        with self._escrita:
+            self._gravar_buffer()
+
+    def compactar(self) -> None:
+        """Fecha o segmento atual e gera o snapshot correspondente agora, na thread chamadora."""
+        with self._compactando:
+            with self._escrita:
+                self._gravar_buffer()
+                fechado = self._rotacionar()
+            self._compactar(fechado)
+
+    def fechar(self) -> None:
+        if self._thread.is_alive():
+            self._parar.set()
+            self._thread.join()
+        with self._compactando:
+            try:
+                self._arquivo.close()
+            except OSError:
+                # só acontece depois de uma falha de gravação, que `verificar` relata
+                pass
+        self.verificar()
+
+    def _fechar_na_saida(self) -> None:
+        try:
+            self.fechar()
+        except RuntimeError:
+            # a falha definitiva já foi registrada no log por `_gravar_buffer`
+            pass
+
+    def _anexar(self, eventos: Iterable[Tuple]) -> None:
+        registros = b"".join(codificar(evento) for evento in eventos)
+        with self._guarda:
+            self.verificar()
+            self._buffer += registros
+
+    def _gravar_periodicamente(self) -> None:
+        try:
+            while not self._parar.wait(self._intervalo):
+                self.descarregar()
+                if self._tamanho >= self._limite_segmento and self._compactando.acquire(blocking=False):
+                    with self._escrita:
+                        fechado = self._rotacionar()
+                    threading.Thread(target=self._compactar_em_fundo, args=(fechado,), daemon=True).start()
+            self.descarregar()
+        except RuntimeError:
+            # falha definitiva: o erro fica guardado e é levantado para quem escreve ou fecha
+            return
+
+    def _gravar_buffer(self) -> None:
+        with self._guarda:
+            self.verificar()
+            dados, self._buffer = self._buffer, bytearray()
+        if not dados:
+            return
+        espera = self._espera_tentativa
+        for tentativa in range(1, self._tentativas + 1):
+            try:
+                self._escrever(dados)
+                return
+            except Exception as erro:
+                if tentativa == self._tentativas:
+                    logger.exception("Falha definitiva ao gravar %d bytes no journal da agenda.", len(dados))
+                    with self._guarda:
+                        self._erro = erro
+                    self.verificar()
+                logger.warning("Falha ao gravar %d bytes no journal da agenda (tentativa %d).", len(dados), tentativa)
+                sleep(espera)
+                espera *= 2
+
+    def _escrever(self, dados: bytes) -> None:
+        try:
+            self._arquivo.write(dados)
+            self._arquivo.flush()
+            os.fsync(self._arquivo.fileno())
+        except Exception:
+            self._desfazer_parcial()
+            raise
+        self._tamanho += len(dados)
+
+    def _desfazer_parcial(self) -> None:
+        # parte de `dados` pode ter chegado ao arquivo: volta ao último ponto sincronizado para a
+        # nova tentativa não deixar um registro pela metade no meio do segmento
+        try:
+            self._arquivo.close()
+        except OSError:
+            pass
+        caminho = self._caminho("journal", self._segmento)
+        os.truncate(caminho, self._tamanho)
+        self._arquivo = open(caminho, "ab")
+
+    def _rotacionar(self) -> int:
+        self._arquivo.close()
+        fechado, self._segmento = self._segmento, self._segmento + 1
+        self._arquivo = open(self._caminho("journal", self._segmento), "ab")
+        self._tamanho = 0
+        return fechado
+
+    def _compactar_em_fundo(self, ate: int) -> None:
+        try:
+            self._compactar(ate)
+        except Exception:
+            logger.exception("Falha ao compactar o journal até o segmento %d.", ate)
+        finally:
+            self._compactando.release()
+
+    def _compactar(self, ate: int) -> None:
+        # chamado com `_compactando` travado; o snapshot só fica visível depois de completo (os.replace)
+        estado = self._estado_ate(ate)
+        temporario = self._caminho("snapshot", ate) + ".tmp"
+        with open(temporario, "wb") as arquivo:
+            for evento in estado.eventos():
+                arquivo.write(codificar(evento))
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+        os.replace(temporario, self._caminho("snapshot", ate))
+        anterior, self._snapshot = self._snapshot, ate
+        if anterior:
+            os.remove(self._caminho("snapshot", anterior))
+        for segmento in range(anterior + 1, ate + 1):
+            caminho = self._caminho("journal", segmento)
+            if os.path.exists(caminho):
+                os.remove(caminho)
+
+    def _estado_ate(self, ate: int) -> EstadoAgenda:
+        estado = EstadoAgenda()
+        arquivos = [self._caminho("snapshot", self._snapshot)] if self._snapshot else []
+        arquivos += [self._caminho("journal", n) for n in range(self._snapshot + 1, ate + 1)]
+        for caminho in arquivos:
+            if os.path.exists(caminho):
+                for evento in ler_eventos(caminho):
+                    estado.aplicar(evento)
+        return estado
+
+    def _inventario(self) -> Tuple[int, List[int]]:
+        snapshots, segmentos = [], []
+        for nome in os.listdir(self._pasta):
+            casamento = _ARQUIVO.match(nome)
+            if casamento:
+                (snapshots if casamento.group(1) == "snapshot" else segmentos).append(int(casamento.group(2)))
+        snapshot = max(snapshots, default=0)
+        return snapshot, sorted(n for n in segmentos if n > snapshot)
+
+    def _caminho(self, tipo: str, numero: int) -> str:
+        return os.path.join(self._pasta, f"{tipo}-{numero:012d}.bin")
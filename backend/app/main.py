@@ -1,24 +1,56 @@
-from typing import List, Optional
-
-from fastapi import Depends, FastAPI, Header, HTTPException, Query, status
+import base64
+from datetime import date, datetime
+import hashlib
+from itertools import chain, islice
+import secrets
+import time
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
 
-from .domain import Medico, Paciente, Perfil, StatusConsulta
-from .domain.exceptions import DomainError
+from .domain import Medico, Paciente, Perfil, RegraRecorrencia, StatusConsulta, TipoMudanca
+from .domain.services.travas import chave_medico, chave_paciente
+from .domain.exceptions import DomainError, LoteRejeitadoError
+from .eventos import TODOS, chave_agenda
 from .schemas import (
+    AgendamentoLoteOut,
+    AgendamentoLoteRequest,
     AgendamentoRequest,
     ApiState,
     ConsultaOut,
+    ItemLoteOut,
     LoginRequest,
     LoginResponse,
     MedicoCreate,
+    MetricasOut,
+    MudancaAgendaOut,
+    MudancasOut,
     PacienteCreate,
+    RegraRecorrenciaOut,
     RemarcarRequest,
+    SlotLoteOut,
+    SlotLoteRequest,
+    SlotRejeitadoOut,
+    SlotMedicoOut,
     SlotOut,
     UsuarioOut,
 )
 from .storage import store
 
+LIMITE_SLOTS_POR_LOTE = 20_000
+LIMITE_CONSULTAS_POR_PAGINA = 1_000
+LIMITE_MEDICOS_POR_PAGINA = 1_000
+# GET /consultas e /medicos devolvem a lista da página; o cursor da seguinte vem neste cabeçalho
+CABECALHO_PROXIMO_CURSOR = "X-Proximo-Cursor"
+_USUARIOS = TypeAdapter(List[UsuarioOut])
+# As versões recomeçam do zero a cada subida; o prefixo impede que um ETag antigo case com outro conteúdo.
+_EPOCA_ETAG = secrets.token_hex(4)
+_SLOTS = TypeAdapter(List[SlotOut])
+_MUDANCAS_AGENDA = TypeAdapter(List[MudancaAgendaOut])
+
 app = FastAPI(title="MedSched", version="1.1.0")
 app.add_middleware(
     CORSMiddleware,
@@ -26,25 +58,72 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[CABECALHO_PROXIMO_CURSOR],
 )
 
 
 def _serializar_consulta(consulta) -> ConsultaOut:
-    med = store.medicos.get(consulta.medico_id)
-    pac = store.pacientes.get(consulta.paciente_id)
-    return ConsultaOut(
-        id=consulta.id,
-        paciente_id=consulta.paciente_id,
-        paciente_nome=pac.nome if pac else "Paciente",
-        medico_id=consulta.medico_id,
-        medico_nome=med.nome if med else "Médico",
-        especialidade=(med.especialidades[0] if med and med.especialidades else None),
-        especialidades=getattr(med, "especialidades", None),
-        inicio=consulta.inicio,
-        fim=consulta.fim,
-        status=consulta.status,
-        observacoes=consulta.observacoes,
-    )
+    return store.fragmentos.serializar(consulta)
+
+
+def _resposta_json(conteudo: bytes, headers: Optional[Dict[str, str]] = None) -> Response:
+    # JSON já pronto: devolver um Response faz o FastAPI pular a validação pelo response_model
+    return Response(content=conteudo, media_type="application/json", headers=headers)
+
+
+def _etag(escopo: str, *versoes: int) -> str:
+    """ETag de uma leitura: versões dos dados envolvidos mais um resumo de quem/o que foi lido."""
+    resumo = hashlib.blake2b(escopo.encode("utf-8"), digest_size=6).hexdigest()
+    return f'"{_EPOCA_ETAG}-{resumo}-{"-".join(map(str, versoes))}"'
+
+
+def _nao_modificado(etag: str, if_none_match: Optional[str], headers) -> Optional[Response]:
+    """
+    Registra o ETag em `headers` e, se o cliente já tem essa versão (If-None-Match), devolve o
+    304 que encerra a rota antes de qualquer filtro ou serialização.
+    """
+    headers["ETag"] = etag
+    # o navegador guarda a resposta mas sempre revalida: o fetch do front vira GET condicional sozinho
+    headers["Cache-Control"] = "no-cache"
+    if not if_none_match:
+        return None
+    recebidas = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    if etag in recebidas or "*" in recebidas:
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={k: headers[k] for k in ("ETag", "Cache-Control", "Vary") if k in headers}
+        )
+    return None
+
+
+def _minuto_se_gera_por_regras(medico_id: str, de: Optional[datetime]) -> int:
+    # sem `de`, os slots de regras partem de agora: a resposta muda com o relógio, não só com a versão
+    agenda = store.servico.agendas.get(medico_id)
+    return int(time.time() // 60) if de is None and agenda is not None and agenda.regras() else 0
+
+
+def _json_de(adaptador: TypeAdapter, objetos) -> bytes:
+    return adaptador.dump_json(adaptador.validate_python(objetos, from_attributes=True))
+
+
+def _gerar_cursor(consulta) -> str:
+    texto = f"{consulta.inicio.isoformat()}|{consulta.id}".encode("utf-8")
+    return base64.urlsafe_b64encode(texto).rstrip(b"=").decode("ascii")
+
+
+def _ler_cursor(cursor: str) -> Tuple[datetime, str]:
+    texto = base64.urlsafe_b64decode(cursor.encode("ascii") + b"=" * (-len(cursor) % 4))
+    inicio, consulta_id = texto.decode("utf-8").split("|", 1)
+    return datetime.fromisoformat(inicio), consulta_id
+
+
+def _versao_do_feed(versao: int) -> str:
+    # a época entra na versão: depois de reiniciar, a versão antiga de um cliente não vale mais
+    return f"{_EPOCA_ETAG}.{versao}"
+
+
+def _ler_versao_do_feed(texto: Optional[str]) -> Optional[int]:
+    epoca, _, versao = (texto or "").partition(".")
+    return int(versao) if epoca == _EPOCA_ETAG and versao.isdigit() else None
 
 
 def _handle_domain_error(err: DomainError) -> None:
@@ -91,16 +170,41 @@ def login(payload: LoginRequest):
     return LoginResponse(token=token, usuario=usuario)
 
 
+@app.post("/auth/logout", status_code=status.HTTP_204_NO_CONTENT)
+def logout(auth: Optional[str] = Header(default=None, alias="Authorization")):
+    token = _extract_token(auth)
+    if token:
+        store.encerrar_sessao(token)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
 @app.get("/me", response_model=UsuarioOut)
-def me(usuario=Depends(get_usuario)):
-    return usuario
+def me(response: Response, usuario=Depends(get_usuario), if_none_match: Optional[str] = Header(default=None)):
+    response.headers["Vary"] = "Authorization"
+    etag = _etag(f"me:{usuario.id}", store.versoes.de(usuario.id))
+    return _nao_modificado(etag, if_none_match, response.headers) or usuario
 
 
 @app.get("/medicos", response_model=List[UsuarioOut])
-def listar_medicos(especializacao: Optional[str] = Query(default=None)):
-    medicos = list(store.medicos.values())
-    if especializacao:
-        medicos = [m for m in medicos if m.especialidades and especializacao.lower() in " ".join(m.especialidades).lower()]
+def listar_medicos(
+    response: Response,
+    especializacao: Optional[str] = Query(default=None),
+    cursor: Optional[str] = Query(default=None),
+    limite: Optional[int] = Query(default=None, ge=1, le=LIMITE_MEDICOS_POR_PAGINA),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    # busca por prefixo, sem diferenciar maiúsculas nem acentos; sem `limite` devolve todos
+    etag = _etag("medicos", store.versoes.de(Perfil.MEDICO.value))
+    nao_modificado = _nao_modificado(etag, if_none_match, response.headers)
+    if nao_modificado:
+        return nao_modificado
+    if cursor is not None and not cursor.isdigit():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido")
+    depois = int(cursor) if cursor is not None else None
+    medicos = store.medicos_por_especialidade(especializacao, depois, limite + 1 if limite else None)
+    if limite and len(medicos) > limite:
+        del medicos[limite:]
+        response.headers[CABECALHO_PROXIMO_CURSOR] = str(store.especialidades.posicao(medicos[-1].id))
     return medicos
 
 
@@ -120,8 +224,11 @@ def criar_medico(payload: MedicoCreate, _admin=Depends(require_admin)):
 
 
 @app.get("/pacientes", response_model=List[UsuarioOut])
-def listar_pacientes(_admin=Depends(require_admin)):
-    return list(store.pacientes.values())
+def listar_pacientes(
+    response: Response, _admin=Depends(require_admin), if_none_match: Optional[str] = Header(default=None)
+):
+    etag = _etag("pacientes", store.versoes.de(Perfil.PACIENTE.value))
+    return _nao_modificado(etag, if_none_match, response.headers) or list(store.pacientes.values())
 
 
 @app.post("/pacientes", response_model=UsuarioOut, status_code=status.HTTP_201_CREATED)
@@ -133,11 +240,82 @@ def criar_paciente(payload: PacienteCreate, _admin=Depends(require_admin)):
         _handle_domain_error(err)
 
 
+def _autorizar_agenda(usuario, medico_id: str) -> None:
+    if usuario.perfil not in (Perfil.ADMIN, Perfil.MEDICO) or (usuario.perfil == Perfil.MEDICO and usuario.id != medico_id):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Sem permissão para alterar esta agenda")
+
+
+@app.get("/agendas/proximos-livres", response_model=List[SlotMedicoOut])
+def proximos_livres(
+    response: Response,
+    especializacao: Optional[str] = Query(default=None),
+    a_partir: Optional[datetime] = Query(default=None),
+    limite: int = Query(default=10, gt=0, le=200),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    # cruza agendas de vários médicos: vale a versão global, e o relógio quando não há `a_partir`
+    etag = _etag(
+        "proximos-livres",
+        store.servico.versoes.atual,
+        store.versoes.de(Perfil.MEDICO.value),
+        0 if a_partir else int(time.time() // 60),
+    )
+    nao_modificado = _nao_modificado(etag, if_none_match, response.headers)
+    if nao_modificado:
+        return nao_modificado
+    medicos = store.medicos_por_especialidade(especializacao)
+    encontrados = store.servico.proximos_slots(medicos, a_partir or datetime.utcnow(), limite)
+    return [
+        SlotMedicoOut(
+            inicio=slot.inicio,
+            fim=slot.fim,
+            medico_id=medico.id,
+            medico_nome=medico.nome,
+            especialidades=medico.especialidades,
+        )
+        for medico, slot in encontrados
+    ]
+
+
 @app.get("/agendas/{medico_id}/slots", response_model=List[SlotOut])
-def horarios_disponiveis(medico_id: str):
+def horarios_disponiveis(
+    medico_id: str,
+    response: Response,
+    de: Optional[datetime] = Query(default=None),
+    ate: Optional[datetime] = Query(default=None),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    etag = _etag(
+        f"slots:{medico_id}",
+        store.servico.versoes.de(chave_medico(medico_id)),
+        _minuto_se_gera_por_regras(medico_id, de),
+    )
+    nao_modificado = _nao_modificado(etag, if_none_match, response.headers)
+    if nao_modificado:
+        return nao_modificado
     try:
         medico = store.obter_medico(medico_id)
-        return store.servico.slots_disponiveis(medico)
+        return store.servico.slots_disponiveis(medico, de, ate)
+    except DomainError as err:
+        _handle_domain_error(err)
+
+
+@app.get("/agendas/{medico_id}/livres", response_model=List[SlotOut])
+def blocos_livres(
+    medico_id: str,
+    response: Response,
+    de: date = Query(...),
+    ate: Optional[date] = Query(default=None),
+    duracao: int = Query(default=60, gt=0, description="Duração do bloco contíguo, em minutos"),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    etag = _etag(f"livres:{medico_id}", store.servico.versoes.de(chave_medico(medico_id)))
+    nao_modificado = _nao_modificado(etag, if_none_match, response.headers)
+    if nao_modificado:
+        return nao_modificado
+    try:
+        medico = store.obter_medico(medico_id)
+        return store.servico.blocos_livres(medico, de, ate or de, duracao)
     except DomainError as err:
         _handle_domain_error(err)
 
@@ -146,8 +324,7 @@ def horarios_disponiveis(medico_id: str):
 def criar_slot(medico_id: str, slot: SlotOut, usuario=Depends(get_usuario)):
     try:
         medico = store.obter_medico(medico_id)
-        if usuario.perfil not in (Perfil.ADMIN, Perfil.MEDICO) or (usuario.perfil == Perfil.MEDICO and usuario.id != medico_id):
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Sem permissão para alterar esta agenda")
+        _autorizar_agenda(usuario, medico_id)
         if slot.bloqueado:
             store.servico.bloquear_horario(medico, slot.inicio, slot.fim)
         else:
@@ -157,26 +334,113 @@ def criar_slot(medico_id: str, slot: SlotOut, usuario=Depends(get_usuario)):
         _handle_domain_error(err)
 
 
+@app.get("/agendas/{medico_id}/regras", response_model=List[RegraRecorrenciaOut])
+def listar_regras(medico_id: str, response: Response, if_none_match: Optional[str] = Header(default=None)):
+    etag = _etag(f"regras:{medico_id}", store.servico.versoes.de(chave_medico(medico_id)))
+    nao_modificado = _nao_modificado(etag, if_none_match, response.headers)
+    if nao_modificado:
+        return nao_modificado
+    try:
+        medico = store.obter_medico(medico_id)
+        return store.servico.criar_agenda_se_nao_existir(medico).regras()
+    except DomainError as err:
+        _handle_domain_error(err)
+
+
+@app.post(
+    "/agendas/{medico_id}/regras", response_model=List[RegraRecorrenciaOut], status_code=status.HTTP_201_CREATED
+)
+def criar_regra(medico_id: str, payload: RegraRecorrenciaOut, usuario=Depends(get_usuario)):
+    try:
+        medico = store.obter_medico(medico_id)
+        _autorizar_agenda(usuario, medico_id)
+        store.servico.adicionar_regra(medico, RegraRecorrencia(**payload.model_dump()))
+        return store.servico.criar_agenda_se_nao_existir(medico).regras()
+    except DomainError as err:
+        _handle_domain_error(err)
+
+
+@app.post("/agendas/{medico_id}/slots/bulk", response_model=SlotLoteOut, status_code=status.HTTP_201_CREATED)
+def criar_slots_em_lote(medico_id: str, payload: SlotLoteRequest, usuario=Depends(get_usuario)):
+    try:
+        medico = store.obter_medico(medico_id)
+        _autorizar_agenda(usuario, medico_id)
+        intervalos = [(s.inicio, s.fim) for s in payload.slots]
+        if payload.gerar:
+            g = payload.gerar
+            regras = [
+                RegraRecorrencia(dia, g.hora_inicio, g.hora_fim, g.duracao_minutos, vigente_de=g.de.date())
+                for dia in sorted(set(g.dias_semana))
+            ]
+            gerados = chain.from_iterable(r.intervalos(g.de, g.ate) for r in regras)
+            intervalos.extend(islice(gerados, LIMITE_SLOTS_POR_LOTE + 1))
+        if len(intervalos) > LIMITE_SLOTS_POR_LOTE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Lote excede o limite de {LIMITE_SLOTS_POR_LOTE} slots.",
+            )
+        inseridos, rejeitados = store.servico.disponibilizar_slots(medico, intervalos)
+        return SlotLoteOut(
+            inseridos=inseridos,
+            rejeitados=[
+                SlotRejeitadoOut(inicio=intervalos[i][0], fim=intervalos[i][1], motivo=motivo) for i, motivo in rejeitados
+            ],
+        )
+    except DomainError as err:
+        _handle_domain_error(err)
+
+
 @app.get("/consultas", response_model=List[ConsultaOut])
 def listar_consultas(
     medico_id: Optional[str] = Query(default=None),
     paciente_id: Optional[str] = Query(default=None),
     status_filtro: Optional[StatusConsulta] = Query(default=None, alias="status"),
+    de: Optional[datetime] = Query(default=None),
+    ate: Optional[datetime] = Query(default=None),
+    cursor: Optional[str] = Query(default=None),
+    limite: int = Query(default=100, ge=1, le=LIMITE_CONSULTAS_POR_PAGINA),
     usuario=Depends(optional_usuario),
+    if_none_match: Optional[str] = Header(default=None),
 ):
-    consultas = store.servico.consultas.values()
-    if medico_id:
-        consultas = [c for c in consultas if c.medico_id == medico_id]
-    if paciente_id:
-        consultas = [c for c in consultas if c.paciente_id == paciente_id]
-    if status_filtro:
-        consultas = [c for c in consultas if c.status == status_filtro]
     # proteção mínima: se usuário autenticado, só vê suas consultas (médico/paciente) exceto admin
     if usuario and usuario.perfil == Perfil.PACIENTE:
-        consultas = [c for c in consultas if c.paciente_id == usuario.id]
+        if paciente_id and paciente_id != usuario.id:
+            return []
+        paciente_id = usuario.id
     if usuario and usuario.perfil == Perfil.MEDICO:
-        consultas = [c for c in consultas if c.medico_id == usuario.id]
-    return [_serializar_consulta(c) for c in consultas]
+        if medico_id and medico_id != usuario.id:
+            return []
+        medico_id = usuario.id
+    # a versão do recorte lido (paciente, médico ou tudo) mais a dos usuários, cujos nomes vão no JSON
+    if paciente_id:
+        versao = store.servico.versoes.de(chave_paciente(paciente_id))
+    elif medico_id:
+        versao = store.servico.versoes.de(chave_medico(medico_id))
+    else:
+        versao = store.servico.versoes.atual
+    headers = {"Vary": "Authorization"}
+    etag = _etag(f"consultas:{usuario.id if usuario else ''}", versao, store.versoes.atual)
+    nao_modificado = _nao_modificado(etag, if_none_match, headers)
+    if nao_modificado:
+        return nao_modificado
+    try:
+        depois = _ler_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido")
+    # uma a mais só para saber se existe próxima página
+    consultas = store.servico.listar_consultas(
+        medico_id=medico_id,
+        paciente_id=paciente_id,
+        status=status_filtro,
+        de=de,
+        ate=ate,
+        depois=depois,
+        limite=limite + 1,
+    )
+    if len(consultas) > limite:
+        del consultas[limite:]
+        headers[CABECALHO_PROXIMO_CURSOR] = _gerar_cursor(consultas[-1])
+    return _resposta_json(store.fragmentos.lista_json(consultas), headers)
 
 
 @app.post("/consultas", response_model=ConsultaOut, status_code=status.HTTP_201_CREATED)
@@ -194,6 +458,38 @@ def agendar(payload: AgendamentoRequest, usuario=Depends(get_usuario)):
         _handle_domain_error(err)
 
 
+@app.post("/consultas/lote", response_model=AgendamentoLoteOut, status_code=status.HTTP_201_CREATED)
+def agendar_lote(payload: AgendamentoLoteRequest, response: Response, usuario=Depends(get_usuario)):
+    if usuario.perfil not in (Perfil.PACIENTE, Perfil.ADMIN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Somente pacientes ou admins")
+    if usuario.perfil == Perfil.PACIENTE and any(p.paciente_id != usuario.id for p in payload.consultas):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Paciente inválido")
+    erros = {}
+    pedidos = []
+    for i, item in enumerate(payload.consultas):
+        try:
+            pedidos.append((store.obter_paciente(item.paciente_id), store.obter_medico(item.medico_id), item.inicio, item.fim))
+        except DomainError as err:
+            erros[i] = str(err)
+    if not erros:
+        try:
+            consultas = store.servico.agendar_lote(pedidos)
+            return AgendamentoLoteOut(
+                sucesso=True,
+                itens=[ItemLoteOut(indice=i, consulta=_serializar_consulta(c)) for i, c in enumerate(consultas)],
+            )
+        except LoteRejeitadoError as err:
+            erros = err.erros
+        except DomainError as err:
+            _handle_domain_error(err)
+    # tudo ou nada: itens sem erro próprio também não foram agendados
+    response.status_code = status.HTTP_400_BAD_REQUEST
+    return AgendamentoLoteOut(
+        sucesso=False,
+        itens=[ItemLoteOut(indice=i, erro=erros.get(i)) for i in range(len(payload.consultas))],
+    )
+
+
 def _autorizar_consulta(usuario, consulta):
     if usuario.perfil == Perfil.ADMIN:
         return True
@@ -239,13 +535,121 @@ def remarcar(consulta_id: str, payload: RemarcarRequest, usuario=Depends(get_usu
         _handle_domain_error(err)
 
 
+@app.get("/mudancas", response_model=MudancasOut)
+def listar_mudancas(desde: Optional[str] = Query(default=None), usuario=Depends(optional_usuario)):
+    """
+    Consultas e slots criados ou alterados depois da versão `desde` (a `versao` da resposta
+    anterior). As consultas vêm no estado atual, uma vez cada; as mudanças de agenda vêm em
+    ordem. Sem `desde`, com versão de outra subida ou mais antiga que o registro guardado, a
+    resposta pede `ressincronizar`: o cliente recarrega tudo e segue desta `versao`.
+    """
+    versao = _ler_versao_do_feed(desde)
+    mudancas = store.servico.versoes.desde(versao) if versao is not None else None
+    if mudancas is None:
+        atual = _versao_do_feed(store.servico.versoes.atual)
+        return _resposta_json(b'{"versao":"%s","ressincronizar":true,"consultas":[],"agendas":[]}' % atual.encode("ascii"))
+    # consulta_id -> consulta, na ordem da última mudança de cada uma
+    consultas = {}
+    agendas = []
+    for _, mudanca in mudancas:
+        if mudanca.tipo != TipoMudanca.CONSULTA:
+            intervalos = [{"inicio": inicio, "fim": fim} for inicio, fim in mudanca.intervalos]
+            agendas.append({"tipo": mudanca.tipo, "medico_id": mudanca.medico_id, "intervalos": intervalos})
+            continue
+        consulta = store.servico.consultas.get(mudanca.consulta_id)
+        # mesma proteção de GET /consultas: paciente e médico só recebem as próprias consultas
+        if consulta is None or (usuario and usuario.perfil == Perfil.PACIENTE and consulta.paciente_id != usuario.id):
+            continue
+        if usuario and usuario.perfil == Perfil.MEDICO and consulta.medico_id != usuario.id:
+            continue
+        consultas.pop(consulta.id, None)
+        consultas[consulta.id] = consulta
+    ate = _versao_do_feed(mudancas[-1][0] if mudancas else versao)
+    corpo = b"".join(
+        (
+            b'{"versao":"%s","ressincronizar":false,"consultas":' % ate.encode("ascii"),
+            store.fragmentos.lista_json(consultas.values()),
+            b',"agendas":',
+            _json_de(_MUDANCAS_AGENDA, agendas),
+            b"}",
+        )
+    )
+    return _resposta_json(corpo, {"Vary": "Authorization"})
+
+
+@app.get("/eventos")
+def acompanhar_eventos(
+    medico_id: Optional[str] = Query(default=None),
+    token: Optional[str] = Query(default=None),
+    auth: Optional[str] = Header(default=None, alias="Authorization"),
+):
+    """
+    Server-sent events com as mudanças que interessam ao usuário: consultas dele (todas, para
+    admin) e, com `medico_id`, a agenda desse médico. O token pode vir na query porque o
+    EventSource do navegador não envia cabeçalhos; nesse caso ele aparece nos logs de acesso do
+    servidor e de proxies, então prefira o cabeçalho sempre que o cliente permitir.
+
+    Um evento `ressincronizar` indica que a conexão ficou para trás e foi encerrada; o cliente
+    recarrega (ou usa GET /mudancas) e volta. O token é conferido de novo a cada ping e antes de
+    cada evento, sem renovar a sessão (a conexão aberta não conta como uso): depois de logout,
+    revogação ou expiração a conexão recebe `sessao_encerrada`.
+    """
+    credencial = auth or token
+    usuario = get_usuario(credencial)
+    token_sessao = _extract_token(credencial)
+    if usuario.perfil == Perfil.ADMIN:
+        chaves = {TODOS}
+    elif usuario.perfil == Perfil.MEDICO:
+        chaves = {chave_medico(usuario.id)}
+    else:
+        chaves = {chave_paciente(usuario.id)}
+    if medico_id:
+        chaves.add(chave_agenda(medico_id))
+    return StreamingResponse(
+        store.eventos.acompanhar(chaves, valido=lambda: store.usuario_por_token(token_sessao, renovar=False) is not None),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/metricas", response_model=MetricasOut)
+def metricas(_admin=Depends(require_admin)):
+    return MetricasOut(
+        sessoes_ativas=store.sessions.ativas,
+        assinantes_eventos=store.eventos.assinantes,
+        assinantes_descartados=store.eventos.descartados,
+        slots_acertos=store.servico.estatisticas_slots.acertos,
+        slots_faltas=store.servico.estatisticas_slots.faltas,
+        slots_atualizacoes=store.servico.estatisticas_slots.atualizacoes,
+    )
+
+
 @app.get("/estado", response_model=ApiState)
-def estado_atual(medico_id: Optional[str] = None):
+def estado_atual(medico_id: Optional[str] = None, if_none_match: Optional[str] = Header(default=None)):
     medico_ref = store.medicos.get(medico_id) if medico_id else next(iter(store.medicos.values()), None)
+    headers = {}
+    etag = _etag(
+        f"estado:{medico_ref.id if medico_ref else ''}",
+        store.servico.versoes.atual,
+        store.versoes.atual,
+        _minuto_se_gera_por_regras(medico_ref.id, None) if medico_ref else 0,
+    )
+    nao_modificado = _nao_modificado(etag, if_none_match, headers)
+    if nao_modificado:
+        return nao_modificado
     slots = store.servico.slots_disponiveis(medico_ref) if medico_ref else []
-    return ApiState(
-        medicos=list(store.medicos.values()),
-        pacientes=list(store.pacientes.values()),
-        slots=slots,
-        consultas=[_serializar_consulta(c) for c in store.servico.consultas.values()],
+    # mesmo formato de ApiState, montado por partes: as consultas vêm dos fragmentos prontos
+    corpo = b"".join(
+        (
+            b'{"medicos":',
+            _json_de(_USUARIOS, list(store.medicos.values())),
+            b',"pacientes":',
+            _json_de(_USUARIOS, list(store.pacientes.values())),
+            b',"slots":',
+            _json_de(_SLOTS, slots),
+            b',"consultas":',
+            store.fragmentos.lista_json(list(store.servico.consultas.values())),
+            b"}",
+        )
     )
+    return _resposta_json(corpo, headers)
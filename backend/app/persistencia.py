@@ -0,0 +1,234 @@
+import atexit
+from contextlib import contextmanager
+from datetime import date, datetime, time
+import gc
+from itertools import chain
+import logging
+import queue
+import threading
+from time import sleep
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .db import Database
+from .domain import Agenda, Consulta, RegraRecorrencia, RepositorioAgendamento, StatusConsulta
+from .domain.entities.agenda import minutos_desde_epoca
+
+logger = logging.getLogger(__name__)
+
+_PARAR = object()
+
+
+class RepositorioSQLite(RepositorioAgendamento):
+    """
+    Persiste slots, regras e consultas no SQLite com escrita adiada (write-behind): as
+    mudanças entram numa fila e uma thread as grava em lotes, uma transação por lote, então
+    o caminho do agendamento não espera pelo disco. Cada mudança é copiada para a fila no
+    momento em que acontece, e a ordem da fila é a ordem em que o serviço as aplicou.
+
+    Um lote que falha é tentado de novo (`tentativas` vezes, com espera crescente) antes de
+    qualquer mudança posterior. Se continuar falhando, a gravação para: o erro é guardado, novas
+    mudanças são recusadas com ele e `descarregar`/`fechar` o levantam, em vez de a memória e o
+    banco divergirem em silêncio.
+    """
+
+    def __init__(
+        self,
+        database: Database,
+        tamanho_lote: int = 500,
+        espera: float = 0.05,
+        tentativas: int = 5,
+        espera_tentativa: float = 0.1,
+    ) -> None:
+        self._db = database
+        self._tamanho_lote = tamanho_lote
+        self._espera = espera
+        self._tentativas = tentativas
+        self._espera_tentativa = espera_tentativa
+        self._erro: Optional[BaseException] = None
+        self._fila: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._gravar, name="medsched-persistencia", daemon=True)
+        self._thread.start()
+        atexit.register(self._fechar_na_saida)
+
+    # --- RepositorioAgendamento ---
+    def verificar(self) -> None:
+        if self._erro is not None:
+            raise RuntimeError("A gravação da agenda no banco parou após falhas repetidas.") from self._erro
+
+    def slots_adicionados(self, medico_id: str, intervalos: List[Tuple[datetime, datetime]]) -> None:
+        for inicio, fim in intervalos:
+            self._enfileirar(("slot", (medico_id, minutos_desde_epoca(inicio), minutos_desde_epoca(fim), 0)))
+
+    def bloqueio_adicionado(self, medico_id: str, inicio: datetime, fim: datetime) -> None:
+        self._enfileirar(("slot", (medico_id, minutos_desde_epoca(inicio), minutos_desde_epoca(fim), 1)))
+
+    def bloqueio_removido(self, medico_id: str, inicio: datetime, fim: datetime) -> None:
+        self._enfileirar(("desbloqueio", (medico_id, minutos_desde_epoca(inicio), minutos_desde_epoca(fim))))
+
+    def regra_adicionada(self, medico_id: str, regra: RegraRecorrencia) -> None:
+        self._enfileirar(("regra", _linha_regra(medico_id, regra)))
+
+    def regra_removida(self, medico_id: str, regra: RegraRecorrencia) -> None:
+        self._enfileirar(("regra_removida", _linha_regra(medico_id, regra)))
+
+    def consulta_salva(self, consulta: Consulta) -> None:
+        self._enfileirar(
+            (
+                "consulta",
+                (
+                    consulta.id,
+                    consulta.paciente_id,
+                    consulta.medico_id,
+                    consulta.inicio.isoformat(),
+                    consulta.fim.isoformat(),
+                    consulta.status.value,
+                    consulta.observacoes,
+                    consulta._criada_em.isoformat(),
+                    consulta._atualizada_em.isoformat(),
+                ),
+            )
+        )
+
+    # --- controle da fila ---
+    def descarregar(self) -> None:
+        """Bloqueia até que tudo o que já foi enfileirado esteja gravado."""
+        self._fila.join()
+        self.verificar()
+
+    def fechar(self) -> None:
+        if self._thread.is_alive():
+            self._fila.put(_PARAR)
+            self._thread.join()
+        self.verificar()
+
+    def _fechar_na_saida(self) -> None:
+        try:
+            self.fechar()
+        except RuntimeError:
+            # a falha definitiva já foi registrada no log por `_aplicar`
+            pass
+
+    def _enfileirar(self, item: Tuple) -> None:
+        self.verificar()
+        self._fila.put(item)
+
+    def _gravar(self) -> None:
+        while True:
+            primeira = self._fila.get()
+            lote = [] if primeira is _PARAR else [primeira]
+            parar = primeira is _PARAR
+            # junta o que chegar em seguida (até `espera` segundos) para dividir a transação
+            while not parar and len(lote) < self._tamanho_lote:
+                try:
+                    item = self._fila.get(timeout=self._espera)
+                except queue.Empty:
+                    break
+                if item is _PARAR:
+                    parar = True
+                else:
+                    lote.append(item)
+            try:
+                # depois de uma falha definitiva nada mais é gravado: a ordem das mudanças já se perdeu
+                if lote and self._erro is None:
+                    self._aplicar(lote)
+            finally:
+                for _ in range(len(lote) + int(parar)):
+                    self._fila.task_done()
+            if parar:
+                return
+
+    def _aplicar(self, lote: List[Tuple]) -> None:
+        espera = self._espera_tentativa
+        for tentativa in range(1, self._tentativas + 1):
+            try:
+                self._db.aplicar_alteracoes(lote)
+                return
+            except Exception as erro:
+                if tentativa == self._tentativas:
+                    logger.exception("Falha definitiva ao gravar %d alterações da agenda.", len(lote))
+                    self._erro = erro
+                    return
+                logger.warning("Falha ao gravar %d alterações da agenda (tentativa %d).", len(lote), tentativa)
+                sleep(espera)
+                espera *= 2
+
+
+def _linha_regra(medico_id: str, regra: RegraRecorrencia) -> Tuple:
+    return (
+        medico_id,
+        regra.dia_semana,
+        regra.hora_inicio.isoformat(),
+        regra.hora_fim.isoformat(),
+        regra.duracao_minutos,
+        regra.vigente_de.isoformat(),
+        regra.vigente_ate.isoformat() if regra.vigente_ate else None,
+    )
+
+
+def carregar_agendamentos(database: Database) -> Tuple[Dict[str, Agenda], Dict[str, Consulta]]:
+    """Reconstrói agendas e consultas gravadas por `RepositorioSQLite`."""
+    livres: Dict[str, List[Tuple[int, int]]] = {}
+    bloqueios: Dict[str, List[Tuple[int, int]]] = {}
+    for row in database.carregar_slots():
+        destino = bloqueios if row["bloqueado"] else livres
+        destino.setdefault(row["medico_id"], []).append((row["inicio"], row["fim"]))
+    agendas = {
+        medico_id: montar_agenda(medico_id, livres.get(medico_id, ()), bloqueios.get(medico_id, ()))
+        for medico_id in livres.keys() | bloqueios.keys()
+    }
+
+    for row in database.carregar_regras():
+        agenda = agendas.setdefault(row["medico_id"], Agenda(medico_id=row["medico_id"]))
+        agenda.adicionar_regra(
+            RegraRecorrencia(
+                dia_semana=row["dia_semana"],
+                hora_inicio=time.fromisoformat(row["hora_inicio"]),
+                hora_fim=time.fromisoformat(row["hora_fim"]),
+                duracao_minutos=row["duracao_minutos"],
+                vigente_de=date.fromisoformat(row["vigente_de"]),
+                vigente_ate=_data_opcional(row["vigente_ate"]),
+            )
+        )
+
+    consultas: Dict[str, Consulta] = {}
+    for row in database.carregar_consultas():
+        consultas[row["id"]] = Consulta(
+            _id=row["id"],
+            _paciente_id=row["paciente_id"],
+            _medico_id=row["medico_id"],
+            _inicio=datetime.fromisoformat(row["inicio"]),
+            _fim=datetime.fromisoformat(row["fim"]),
+            _status=StatusConsulta(row["status"]),
+            _observacoes=row["observacoes"],
+            _criada_em=datetime.fromisoformat(row["criada_em"]),
+            _atualizada_em=datetime.fromisoformat(row["atualizada_em"]),
+        )
+    return agendas, consultas
+
+
+@contextmanager
+def sem_coleta_de_lixo() -> Iterator[None]:
+    """
+    Suspende o coletor cíclico enquanto a agenda é carregada: a subida cria milhões de objetos
+    que vivem até o fim do processo, e as coletas disparadas no meio disso só custam tempo.
+    """
+    ativo = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if ativo:
+            gc.enable()
+
+
+def montar_agenda(
+    medico_id: str, livres: Iterable[Tuple[int, int]], bloqueios: Iterable[Tuple[int, int]]
+) -> Agenda:
+    """Agenda a partir de intervalos gravados em minutos desde a época."""
+    return Agenda.restaurar(
+        medico_id, chain(((ini, fi, False) for ini, fi in livres), ((ini, fi, True) for ini, fi in bloqueios))
+    )
+
+
+def _data_opcional(valor: Optional[str]) -> Optional[date]:
+    return date.fromisoformat(valor) if valor else None
@@ -1,9 +1,9 @@
-from datetime import datetime
+from datetime import date, datetime, time
 from typing import List, Optional
 
 from pydantic import BaseModel, ConfigDict, Field
 
-from .domain import Perfil, StatusConsulta
+from .domain import Perfil, StatusConsulta, TipoMudanca
 
 
 class UsuarioBase(BaseModel):
@@ -37,6 +37,51 @@ class SlotOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class SlotMedicoOut(SlotOut):
+    medico_id: str
+    medico_nome: str
+    especialidades: Optional[List[str]] = None
+
+
+class IntervaloIn(BaseModel):
+    inicio: datetime
+    fim: datetime
+
+
+class GeracaoSlots(BaseModel):
+    de: datetime
+    ate: datetime
+    hora_inicio: time
+    hora_fim: time
+    duracao_minutos: int = Field(default=30, gt=0)
+    dias_semana: List[int] = Field(default=[0, 1, 2, 3, 4], description="0 = segunda-feira, 6 = domingo")
+
+
+class SlotLoteRequest(BaseModel):
+    slots: List[IntervaloIn] = Field(default_factory=list)
+    gerar: Optional[GeracaoSlots] = Field(None, description="Gera slots repetindo o expediente no período")
+
+
+class SlotRejeitadoOut(IntervaloIn):
+    motivo: str
+
+
+class SlotLoteOut(BaseModel):
+    inseridos: int
+    rejeitados: List[SlotRejeitadoOut]
+
+
+class RegraRecorrenciaOut(BaseModel):
+    dia_semana: int = Field(ge=0, le=6, description="0 = segunda-feira, 6 = domingo")
+    hora_inicio: time
+    hora_fim: time
+    duracao_minutos: int = Field(default=30, gt=0)
+    vigente_de: date
+    vigente_ate: Optional[date] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class AgendamentoRequest(BaseModel):
     paciente_id: str
     medico_id: str
@@ -75,8 +120,45 @@ class ConsultaOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class AgendamentoLoteRequest(BaseModel):
+    consultas: List[AgendamentoRequest] = Field(min_length=1, max_length=200)
+
+
+class ItemLoteOut(BaseModel):
+    indice: int
+    consulta: Optional[ConsultaOut] = None
+    erro: Optional[str] = None
+
+
+class AgendamentoLoteOut(BaseModel):
+    sucesso: bool
+    itens: List[ItemLoteOut]
+
+
 class ApiState(BaseModel):
     medicos: List[UsuarioOut]
     pacientes: List[UsuarioOut]
     slots: List[SlotOut]
     consultas: List[ConsultaOut]
+
+
+class MetricasOut(BaseModel):
+    sessoes_ativas: int
+    assinantes_eventos: int = 0
+    assinantes_descartados: int = 0
+    slots_acertos: int = 0
+    slots_faltas: int = 0
+    slots_atualizacoes: int = 0
+
+
+class MudancaAgendaOut(BaseModel):
+    tipo: TipoMudanca
+    medico_id: str
+    intervalos: List[IntervaloIn] = Field(default_factory=list)
+
+
+class MudancasOut(BaseModel):
+    versao: str
+    ressincronizar: bool = False
+    consultas: List[ConsultaOut] = Field(default_factory=list)
+    agendas: List[MudancaAgendaOut] = Field(default_factory=list)
@@ -0,0 +1,110 @@
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import secrets
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+# scrypt$<n>$<r>$<p>$<sal>$<hash>, com sal e hash em base64 sem preenchimento
+_PREFIXO = "scrypt$"
+_BLOCO = 8
+_PARALELISMO = 1
+_TAMANHO_SAL = 16
+_TAMANHO_HASH = 32
+
+
+def _b64(dados: bytes) -> str:
+    return base64.b64encode(dados).rstrip(b"=").decode("ascii")
+
+
+def _de_b64(texto: str) -> bytes:
+    return base64.b64decode(texto + "=" * (-len(texto) % 4))
+
+
+def _scrypt(senha: str, sal: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        senha.encode("utf-8"), salt=sal, n=n, r=r, p=p, maxmem=256 * n * r + 2**20, dklen=_TAMANHO_HASH
+    )
+
+
+def eh_hash(armazenada: Optional[str]) -> bool:
+    return bool(armazenada) and armazenada.startswith(_PREFIXO)
+
+
+def gerar_hash(senha: str, custo: int) -> str:
+    sal = secrets.token_bytes(_TAMANHO_SAL)
+    derivada = _scrypt(senha, sal, custo, _BLOCO, _PARALELISMO)
+    return f"{_PREFIXO}{custo}${_BLOCO}${_PARALELISMO}${_b64(sal)}${_b64(derivada)}"
+
+
+def conferir(senha: str, armazenada: Optional[str]) -> bool:
+    """Confere a senha contra o valor do banco: hash scrypt ou, em linhas antigas, texto puro."""
+    if not armazenada:
+        return False
+    if not eh_hash(armazenada):
+        return hmac.compare_digest(senha.encode("utf-8"), armazenada.encode("utf-8"))
+    try:
+        n, r, p, sal, esperada = armazenada[len(_PREFIXO):].split("$")
+        derivada = _scrypt(senha, _de_b64(sal), int(n), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(derivada, _de_b64(esperada))
+
+
+def precisa_atualizar(armazenada: Optional[str], custo: int) -> bool:
+    """Texto puro ou hash com custo abaixo do atual: deve ser regravado no próximo login."""
+    if not eh_hash(armazenada):
+        return True
+    return int(armazenada[len(_PREFIXO):].split("$", 1)[0]) < custo
+
+
+class ServicoSenhas:
+    """
+    Gera e confere hashes scrypt num pool de processos, para que a derivação (dezenas de
+    milissegundos de CPU por senha) não ocupe o interpretador que atende as requisições. A
+    thread da requisição só espera o resultado; o número de derivações em andamento ou na fila
+    é limitado, e acima disso quem chega espera a vez em vez de acumular trabalho sem fim.
+
+    Com `processos=0` a derivação roda na própria thread (útil para scripts e testes).
+    """
+
+    def __init__(self, custo: int = 2**14, processos: Optional[int] = None, fila_por_processo: int = 4) -> None:
+        self.custo = custo
+        self._processos = min(4, os.cpu_count() or 1) if processos is None else processos
+        self._vagas = threading.BoundedSemaphore(max(1, self._processos) * fila_por_processo)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._guarda = threading.Lock()
+
+    def gerar_hash(self, senha: str) -> str:
+        return self._executar(gerar_hash, senha, self.custo)
+
+    def conferir(self, senha: str, armazenada: Optional[str]) -> bool:
+        if not eh_hash(armazenada):
+            # texto puro (ou nada) não envolve derivação; não vale a ida ao pool
+            return conferir(senha, armazenada)
+        return self._executar(conferir, senha, armazenada)
+
+    def precisa_atualizar(self, armazenada: Optional[str]) -> bool:
+        return precisa_atualizar(armazenada, self.custo)
+
+    def fechar(self) -> None:
+        with self._guarda:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def _executar(self, funcao: Callable[..., Any], *args: Any) -> Any:
+        if not self._processos:
+            return funcao(*args)
+        with self._vagas:
+            return self._obter_pool().submit(funcao, *args).result()
+
+    def _obter_pool(self) -> ProcessPoolExecutor:
+        with self._guarda:
+            if self._pool is None:
+                # spawn: o processo principal já tem threads (persistência, journal) e fork as copiaria pela metade
+                self._pool = ProcessPoolExecutor(self._processos, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
@@ -0,0 +1,77 @@
+import threading
+from typing import Any, Dict, Iterable, Mapping
+
+from pydantic_core import to_json
+
+from .domain import Consulta, Medico, Paciente, RepositorioAgendamento
+from .schemas import ConsultaOut
+
+
+class FragmentosConsulta(RepositorioAgendamento):
+    """
+    JSON pronto de cada consulta, com os nomes do médico e do paciente já embutidos, para as
+    listagens grandes (`/consultas`, `/estado`) montarem a resposta juntando bytes em vez de
+    criar e validar um `ConsultaOut` por linha. O fragmento é feito uma vez, com os mesmos
+    campos e o mesmo serializador do `ConsultaOut` (então o formato é idêntico), e descartado
+    quando o serviço informa uma mudança da consulta.
+
+    Guarda no máximo `maximo` fragmentos; acima disso saem os mais antigos.
+    """
+
+    def __init__(self, medicos: Mapping[str, Medico], pacientes: Mapping[str, Paciente], maximo: int = 200_000) -> None:
+        self._medicos = medicos
+        self._pacientes = pacientes
+        self._maximo = maximo
+        self._fragmentos: Dict[str, bytes] = {}
+        # contador de invalidações: um fragmento montado enquanto a consulta mudava não é guardado
+        self._mudancas = 0
+        self._guarda = threading.Lock()
+
+    def consulta_salva(self, consulta: Consulta) -> None:
+        with self._guarda:
+            self._mudancas += 1
+            self._fragmentos.pop(consulta.id, None)
+
+    def limpar(self) -> None:
+        """Descarta tudo; usado quando o nome de um médico ou paciente pode ter mudado."""
+        with self._guarda:
+            self._mudancas += 1
+            self._fragmentos.clear()
+
+    def fragmento(self, consulta: Consulta) -> bytes:
+        fragmento = self._fragmentos.get(consulta.id)
+        if fragmento is not None:
+            return fragmento
+        mudancas = self._mudancas
+        # mesmo serializador do pydantic, sem montar (nem validar) um ConsultaOut
+        fragmento = to_json(self._campos(consulta))
+        with self._guarda:
+            if self._mudancas == mudancas:
+                if len(self._fragmentos) >= self._maximo:
+                    del self._fragmentos[next(iter(self._fragmentos))]
+                self._fragmentos[consulta.id] = fragmento
+        return fragmento
+
+    def lista_json(self, consultas: Iterable[Consulta]) -> bytes:
+        return b"[" + b",".join([self.fragmento(c) for c in consultas]) + b"]"
+
+    def serializar(self, consulta: Consulta) -> ConsultaOut:
+        return ConsultaOut(**self._campos(consulta))
+
+    def _campos(self, consulta: Consulta) -> Dict[str, Any]:
+        # na ordem dos campos de ConsultaOut, para o JSON sair igual ao do modelo
+        med = self._medicos.get(consulta.medico_id)
+        pac = self._pacientes.get(consulta.paciente_id)
+        return {
+            "id": consulta.id,
+            "paciente_id": consulta.paciente_id,
+            "paciente_nome": pac.nome if pac else "Paciente",
+            "medico_id": consulta.medico_id,
+            "medico_nome": med.nome if med else "Médico",
+            "especialidade": med.especialidades[0] if med and med.especialidades else None,
+            "especialidades": getattr(med, "especialidades", None),
+            "inicio": consulta.inicio,
+            "fim": consulta.fim,
+            "status": consulta.status,
+            "observacoes": consulta.observacoes,
+        }
@@ -0,0 +1,84 @@
+from collections import OrderedDict
+import threading
+import time
+from typing import Callable, Optional, Tuple
+import uuid
+
+
+class SessoesAtivas:
+    """
+    Sessões de login com prazo e tamanho limitados. Uma sessão expira depois de `ociosidade`
+    segundos sem uso ou `duracao_maxima` segundos depois do login, o que vier primeiro; acima
+    de `maximo` sessões a usada há mais tempo é descartada.
+
+    As sessões ficam num OrderedDict em ordem de último uso, então a mais antiga está sempre
+    na frente: a limpeza das ociosas e o descarte por tamanho só olham o começo do dicionário
+    e param na primeira sessão ainda válida, sem varrer as demais.
+    """
+
+    def __init__(
+        self,
+        ociosidade: float = 2 * 3600,
+        duracao_maxima: float = 12 * 3600,
+        maximo: int = 100_000,
+        relogio: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ociosidade = ociosidade
+        self.duracao_maxima = duracao_maxima
+        self.maximo = maximo
+        self._relogio = relogio
+        # token -> (usuario_id, criada_em, usada_em)
+        self._sessoes: "OrderedDict[str, Tuple[str, float, float]]" = OrderedDict()
+        self._guarda = threading.Lock()
+
+    def criar(self, usuario_id: str) -> str:
+        token = str(uuid.uuid4())
+        agora = self._relogio()
+        with self._guarda:
+            self._limpar(agora)
+            self._sessoes[token] = (usuario_id, agora, agora)
+            while len(self._sessoes) > self.maximo:
+                self._sessoes.popitem(last=False)
+        return token
+
+    def usuario(self, token: str, renovar: bool = True) -> Optional[str]:
+        """
+        Id do usuário dono do token; None se não existe ou expirou. Com `renovar` o uso conta
+        como atividade e adia a ociosidade; sem ele é só uma conferência (conexões abertas).
+        """
+        agora = self._relogio()
+        with self._guarda:
+            sessao = self._sessoes.get(token)
+            if sessao is None:
+                return None
+            usuario_id, criada_em, usada_em = sessao
+            if agora - usada_em > self.ociosidade or agora - criada_em > self.duracao_maxima:
+                del self._sessoes[token]
+                return None
+            if renovar:
+                self._sessoes[token] = (usuario_id, criada_em, agora)
+                self._sessoes.move_to_end(token)
+            return usuario_id
+
+    def encerrar(self, token: str) -> None:
+        with self._guarda:
+            self._sessoes.pop(token, None)
+
+    @property
+    def ativas(self) -> int:
+        """Quantidade de sessões vivas, depois de descartar as ociosas."""
+        with self._guarda:
+            self._limpar(self._relogio())
+            return len(self._sessoes)
+
+    def __len__(self) -> int:
+        return self.ativas
+
+    def _limpar(self, agora: float) -> None:
+        # a duração máxima é conferida no uso; aqui só saem as ociosas, que estão todas na frente
+        limite = agora - self.ociosidade
+        while self._sessoes:
+            token, (_, _, usada_em) = next(iter(self._sessoes.items()))
+            if usada_em >= limite:
+                break
+            del self._sessoes[token]
@@ -1,29 +1,101 @@
 from datetime import datetime, timedelta
-from typing import Dict, Optional
-import uuid
+from typing import Dict, List, Optional
 import json
+import os
 
 from .db import db
-from .domain import Medico, Paciente, Administrador, AgendamentoService, Perfil
+from .domain import Medico, Paciente, Administrador, AgendamentoService, Perfil, RepositorioComposto, Usuario, Versoes
 from .domain.exceptions import ValidationError
+from .especialidades import IndiceEspecialidades
+from .eventos import HubEventos
+from .journal import JournalAgenda
+from .persistencia import RepositorioSQLite, carregar_agendamentos, sem_coleta_de_lixo
+from .senhas import ServicoSenhas, eh_hash
+from .serializacao import FragmentosConsulta
+from .sessoes import SessoesAtivas
+from .tokens import AssinadorTokens, TokensRevogados
+
+# Médicos, pacientes e agenda de demonstração só são criados quando MEDSCHED_SEED está ligado.
+SEED_DEMO = os.getenv("MEDSCHED_SEED", "").strip().lower() in ("1", "true", "sim")
+# Com MEDSCHED_JOURNAL_DIR a agenda vai para um journal binário com snapshots nessa pasta, em vez das tabelas do SQLite.
+JOURNAL_DIR = os.getenv("MEDSCHED_JOURNAL_DIR") or None
+# Prazos das sessões de login, em segundos, e quantas sessões ficam em memória ao mesmo tempo.
+SESSAO_OCIOSA = float(os.getenv("MEDSCHED_SESSAO_OCIOSA", 2 * 3600))
+SESSAO_MAXIMA = float(os.getenv("MEDSCHED_SESSAO_MAXIMA", 12 * 3600))
+SESSOES_MAX = int(os.getenv("MEDSCHED_SESSOES_MAX", 100_000))
+# Com MEDSCHED_TOKEN_SEGREDO o login emite tokens assinados, aceitos por qualquer worker com o mesmo segredo.
+TOKEN_SEGREDO = os.getenv("MEDSCHED_TOKEN_SEGREDO") or None
+# Custo (N) do scrypt das senhas e quantos processos fazem a derivação; 0 processos deriva na própria thread.
+SENHA_CUSTO = int(os.getenv("MEDSCHED_SENHA_CUSTO", 2**14))
+SENHA_PROCESSOS = int(os.environ["MEDSCHED_SENHA_PROCESSOS"]) if os.getenv("MEDSCHED_SENHA_PROCESSOS") else None
+# Quantas mudanças da agenda ficam guardadas para GET /mudancas; quem ficou mais para trás recarrega tudo.
+MUDANCAS_RETIDAS = int(os.getenv("MEDSCHED_MUDANCAS_RETIDAS", 10_000))
+# Eventos pendentes por assinante de GET /eventos; quem acumula mais que isso é desconectado.
+EVENTOS_POR_ASSINANTE = int(os.getenv("MEDSCHED_EVENTOS_POR_ASSINANTE", 100))
 
 
 class MemoryStore:
-    """Armazena dados em memória com persistência simples em SQLite para usuários."""
+    """Armazena dados em memória com persistência em SQLite para usuários, agendas e consultas."""
 
-    def __init__(self) -> None:
+    def __init__(self, semear: Optional[bool] = None) -> None:
         self.medicos: Dict[str, Medico] = {}
         self.pacientes: Dict[str, Paciente] = {}
         self.admins: Dict[str, Administrador] = {}
-        self.servico = AgendamentoService()
-        self.sessions: Dict[str, str] = {}
+        self.fragmentos = FragmentosConsulta(self.medicos, self.pacientes)
+        self.eventos = HubEventos(self.fragmentos.fragmento, capacidade=EVENTOS_POR_ASSINANTE)
+        # versão de cada lista de usuários (chave = perfil) e de cada usuário (chave = id)
+        self.versoes = Versoes()
+        self.especialidades = IndiceEspecialidades()
+        self.sessions = SessoesAtivas(ociosidade=SESSAO_OCIOSA, duracao_maxima=SESSAO_MAXIMA, maximo=SESSOES_MAX)
+        self.senhas = ServicoSenhas(custo=SENHA_CUSTO, processos=SENHA_PROCESSOS)
+        self.tokens: Optional[AssinadorTokens] = None
+        if TOKEN_SEGREDO:
+            self.tokens = AssinadorTokens(
+                TOKEN_SEGREDO.encode("utf-8"), validade=SESSAO_MAXIMA, revogados=TokensRevogados(db)
+            )
+        # índices de login e de sessão: e-mail normalizado -> usuário e id -> usuário, de qualquer perfil
+        self._por_email: Dict[str, Usuario] = {}
+        self._por_id: Dict[str, Usuario] = {}
         # garante que o arquivo recém-criado (ou recriado) tenha esquema necessário
         db._ensure()
-        self._seed()
+        with sem_coleta_de_lixo():
+            if JOURNAL_DIR:
+                self.repositorio = JournalAgenda(JOURNAL_DIR)
+                agendas, consultas = self.repositorio.carregar()
+            else:
+                agendas, consultas = carregar_agendamentos(db)
+                self.repositorio = RepositorioSQLite(db)
+            self.servico = AgendamentoService(
+                agendas=agendas,
+                consultas=consultas,
+                repositorio=RepositorioComposto(self.repositorio, self.fragmentos, self.eventos),
+                versoes=Versoes(retencao=MUDANCAS_RETIDAS),
+            )
+        self._carregar_usuarios()
+        if not self.admins:
+            self.adicionar_admin(
+                Administrador.novo("Admin", "admin@medsched.com", telefone="1100000000", senha="admin123")
+            )
+        if SEED_DEMO if semear is None else semear:
+            self._seed()
+
+    def fechar(self) -> None:
+        """
+        Grava as mudanças pendentes da agenda, encerra a thread de persistência e libera as conexões.
+        Se a gravação tiver parado por falhas, o erro dela é levantado depois de liberar o resto.
+        """
+        try:
+            self.repositorio.fechar()
+        finally:
+            self.senhas.fechar()
+            db.fechar()
 
     # --- usuários ---
     def adicionar_medico(self, medico: Medico) -> Medico:
+        self._proteger_senha(medico)
         self.medicos[medico.id] = medico
+        self._indexar(medico)
+        self.especialidades.indexar(medico.id, medico.especialidades)
         self.servico.criar_agenda_se_nao_existir(medico)
         db.salvar_usuario(
             id=medico.id,
@@ -32,12 +104,14 @@ class MemoryStore:
             telefone=medico.telefone,
             perfil=medico.perfil.value,
             especialidades=medico.especialidades,
-            senha=medico._senha,
+            senha=medico.senha_armazenada,
         )
         return medico
 
     def adicionar_paciente(self, paciente: Paciente) -> Paciente:
+        self._proteger_senha(paciente)
         self.pacientes[paciente.id] = paciente
+        self._indexar(paciente)
         db.salvar_usuario(
             id=paciente.id,
             nome=paciente.nome,
@@ -45,12 +119,14 @@ class MemoryStore:
             telefone=paciente.telefone,
             perfil=paciente.perfil.value,
             especialidades=None,
-            senha=paciente._senha,
+            senha=paciente.senha_armazenada,
         )
         return paciente
 
     def adicionar_admin(self, admin: Administrador) -> Administrador:
+        self._proteger_senha(admin)
         self.admins[admin.id] = admin
+        self._indexar(admin)
         db.salvar_usuario(
             id=admin.id,
             nome=admin.nome,
@@ -58,10 +134,31 @@ class MemoryStore:
             telefone=admin.telefone,
             perfil=admin.perfil.value,
             especialidades=None,
-            senha=admin._senha,
+            senha=admin.senha_armazenada,
         )
         return admin
 
+    def _proteger_senha(self, usuario: Usuario) -> None:
+        # o domínio recebe a senha em texto; só o hash chega à memória compartilhada e ao banco
+        senha = usuario.senha_armazenada
+        if senha and not eh_hash(senha):
+            usuario.substituir_senha_por_hash(self.senhas.gerar_hash(senha))
+
+    def _indexar(self, usuario: Usuario) -> None:
+        if usuario.id in self._por_id:
+            # o nome pode ter mudado, e ele vai embutido no JSON das consultas
+            self.fragmentos.limpar()
+        # o e-mail é único no banco (o último cadastro prevalece); o índice segue a mesma regra
+        self._por_email[usuario.email] = usuario
+        self._por_id[usuario.id] = usuario
+        self.versoes.avancar(usuario.perfil.value, usuario.id)
+
+    def medicos_por_especialidade(
+        self, termo: Optional[str], depois: Optional[int] = None, limite: Optional[int] = None
+    ) -> List[Medico]:
+        """Médicos com especialidade começando por `termo` (sem diferenciar acentos), na ordem de cadastro; ver `IndiceEspecialidades`."""
+        return [self.medicos[medico_id] for medico_id in self.especialidades.buscar(termo, depois, limite)]
+
     def obter_medico(self, medico_id: str) -> Medico:
         if medico_id not in self.medicos:
             raise ValidationError("Médico não encontrado.")
@@ -78,67 +175,55 @@ class MemoryStore:
         return self.admins[admin_id]
 
     def autenticar(self, email: str, senha: str) -> Optional[str]:
-        usuarios = list(self.admins.values()) + list(self.medicos.values()) + list(self.pacientes.values())
-        for u in usuarios:
-            if u.email == email.lower().strip() and u.verificar_senha(senha):
-                token = str(uuid.uuid4())
-                self.sessions[token] = u.id
-                return token
-        return None
-
-    def usuario_por_token(self, token: str):
-        user_id = self.sessions.get(token)
+        usuario = self._por_email.get(email.lower().strip())
+        if usuario is None or not usuario.verificar_senha(senha, self.senhas.conferir):
+            return None
+        if self.senhas.precisa_atualizar(usuario.senha_armazenada):
+            # linhas antigas em texto puro (ou com custo menor) viram hash no primeiro login que dá certo
+            usuario.substituir_senha_por_hash(self.senhas.gerar_hash(senha))
+            db.atualizar_senha(usuario.id, usuario.senha_armazenada)
+        if self.tokens is not None:
+            return self.tokens.emitir(usuario.id, usuario.perfil.value)
+        return self.sessions.criar(usuario.id)
+
+    def usuario_por_token(self, token: str, renovar: bool = True) -> Optional[Usuario]:
+        """Dono do token; `renovar=False` confere sem contar como uso da sessão (ver `SessoesAtivas.usuario`)."""
+        # tokens assinados têm um ponto; os UUIDs de sessão, não
+        if self.tokens is not None and "." in token:
+            dono = self.tokens.verificar(token)
+            if dono is None:
+                return None
+            usuario = self._por_id.get(dono[0])
+            return usuario if usuario is not None and usuario.perfil.value == dono[1] else None
+        user_id = self.sessions.usuario(token, renovar=renovar)
         if not user_id:
             return None
-        if user_id in self.admins:
-            return self.admins[user_id]
-        if user_id in self.medicos:
-            return self.medicos[user_id]
-        if user_id in self.pacientes:
-            return self.pacientes[user_id]
-        return None
+        return self._por_id.get(user_id)
+
+    def encerrar_sessao(self, token: str) -> None:
+        if self.tokens is not None and "." in token:
+            self.tokens.revogar(token)
+        else:
+            self.sessions.encerrar(token)
 
     # --- dados iniciais ---
-    def _seed(self) -> None:
-        # carregar usuários persistidos
-        for row in db.carregar_por_perfil(Perfil.ADMIN.value):
-            admin = Administrador(
-                _id=row["id"],
-                _nome=row["nome"],
-                _email=row["email"],
-                _perfil=Perfil.ADMIN,
-                _telefone=row["telefone"],
-                _senha=row["senha"],
-            )
-            self.admins[admin.id] = admin
-
-        for row in db.carregar_por_perfil(Perfil.MEDICO.value):
-            med = Medico(
-                _id=row["id"],
-                _nome=row["nome"],
-                _email=row["email"],
-                _perfil=Perfil.MEDICO,
-                _telefone=row["telefone"],
-                _senha=row["senha"],
-                especialidades=json.loads(row["especialidades"]) if row["especialidades"] else [],
-            )
-            self.adicionar_medico(med)
-
-        for row in db.carregar_por_perfil(Perfil.PACIENTE.value):
-            pac = Paciente(
-                _id=row["id"],
-                _nome=row["nome"],
-                _email=row["email"],
-                _perfil=Perfil.PACIENTE,
-                _telefone=row["telefone"],
-                _senha=row["senha"],
-            )
-            self.pacientes[pac.id] = pac
+    def _carregar_usuarios(self) -> None:
+        # uma única leitura do banco, sem regravar nada: as agendas são criadas sob demanda pelo serviço
+        destinos = {
+            Perfil.ADMIN.value: (Perfil.ADMIN, Administrador, self.admins),
+            Perfil.MEDICO.value: (Perfil.MEDICO, Medico, self.medicos),
+            Perfil.PACIENTE.value: (Perfil.PACIENTE, Paciente, self.pacientes),
+        }
+        for id_, nome, email, perfil, telefone, senha, especialidades in db.carregar_usuarios():
+            perfil, classe, mapa = destinos[perfil]
+            if classe is Medico:
+                usuario = Medico(id_, nome, email, perfil, telefone, senha, json.loads(especialidades or "[]"))
+                self.especialidades.indexar(id_, usuario.especialidades)
+            else:
+                usuario = classe(id_, nome, email, perfil, telefone, senha)
+            mapa[id_] = self._por_id[id_] = self._por_email[email] = usuario
 
-        if not self.admins:
-            self.adicionar_admin(
-                Administrador.novo("Admin", "admin@medsched.com", telefone="1100000000", senha="admin123")
-            )
+    def _seed(self) -> None:
         if not self.medicos:
             self.adicionar_medico(
                 Medico.novo(
@@ -170,6 +255,10 @@ class MemoryStore:
             joao = next(iter(self.pacientes.values()))
             maria = next(iter(self.pacientes.values()))
 
+        # agenda de demonstração só quando nada foi persistido ainda
+        if self.servico.consultas or any(len(a) or a.regras() for a in self.servico.agendas.values()):
+            return
+
         # seeds de slots/consultas apenas para médicos já carregados
         medicos_para_seed = list(self.medicos.values())
         if len(medicos_para_seed) >= 2:
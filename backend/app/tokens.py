@@ -0,0 +1,105 @@
+import base64
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from typing import Callable, Optional, Set, Tuple
+
+from .db import Database
+
+
+def _b64(dados: bytes) -> str:
+    return base64.urlsafe_b64encode(dados).rstrip(b"=").decode("ascii")
+
+
+def _de_b64(texto: str) -> bytes:
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+
+class TokensRevogados:
+    """
+    Lista pequena de tokens revogados antes do prazo (logout), guardada no SQLite para valer
+    em todos os workers que usam o mesmo banco. Cada processo mantém uma cópia em memória e a
+    relê a cada `intervalo` segundos, então a verificação normal não toca no disco.
+    """
+
+    def __init__(self, database: Database, intervalo: float = 5.0, relogio: Callable[[], float] = time.time) -> None:
+        self._db = database
+        self._intervalo = intervalo
+        self._relogio = relogio
+        self._revogados: Set[str] = set()
+        self._lido_em: Optional[float] = None
+        self._guarda = threading.Lock()
+
+    def revogar(self, jti: str, expira_em: int) -> None:
+        self._db.revogar_token(jti, expira_em)
+        with self._guarda:
+            self._revogados.add(jti)
+
+    def __contains__(self, jti: str) -> bool:
+        agora = self._relogio()
+        with self._guarda:
+            if self._lido_em is None or agora - self._lido_em >= self._intervalo:
+                self._revogados = set(self._db.carregar_tokens_revogados(int(agora)))
+                self._lido_em = agora
+            return jti in self._revogados
+
+
+class AssinadorTokens:
+    """
+    Tokens autocontidos `<dados>.<assinatura>`: os dados (id do usuário, perfil, expiração e
+    um identificador aleatório) vão em base64url e a assinatura é um HMAC-SHA256 deles. Qualquer
+    processo com o mesmo segredo valida o token sem consultar sessões, o que permite rodar
+    vários workers e nós atrás de um balanceador.
+    """
+
+    def __init__(
+        self,
+        segredo: bytes,
+        validade: float = 12 * 3600,
+        revogados: Optional[TokensRevogados] = None,
+        relogio: Callable[[], float] = time.time,
+    ) -> None:
+        self._segredo = segredo
+        self.validade = validade
+        self._revogados = revogados
+        self._relogio = relogio
+
+    def emitir(self, usuario_id: str, perfil: str) -> str:
+        expira_em = int(self._relogio() + self.validade)
+        dados = _b64(f"{usuario_id}:{perfil}:{expira_em}:{secrets.token_urlsafe(9)}".encode("utf-8"))
+        return f"{dados}.{self._assinar(dados)}"
+
+    def verificar(self, token: str) -> Optional[Tuple[str, str]]:
+        """(usuario_id, perfil) de um token íntegro, dentro do prazo e não revogado; senão None."""
+        campos = self._abrir(token)
+        if campos is None:
+            return None
+        usuario_id, perfil, _, jti = campos
+        if self._revogados is not None and jti in self._revogados:
+            return None
+        return usuario_id, perfil
+
+    def revogar(self, token: str) -> bool:
+        campos = self._abrir(token)
+        if campos is None or self._revogados is None:
+            return False
+        self._revogados.revogar(campos[3], campos[2])
+        return True
+
+    def _assinar(self, dados: str) -> str:
+        return _b64(hmac.new(self._segredo, dados.encode("utf-8"), hashlib.sha256).digest())
+
+    def _abrir(self, token: str) -> Optional[Tuple[str, str, int, str]]:
+        dados, _, assinatura = token.partition(".")
+        if not assinatura or not hmac.compare_digest(assinatura.encode("utf-8"), self._assinar(dados).encode("ascii")):
+            return None
+        try:
+            usuario_id, perfil, expira_em, jti = _de_b64(dados).decode("utf-8").rsplit(":", 3)
+            expira_em = int(expira_em)
+        except ValueError:
+            return None
+        if expira_em <= self._relogio():
+            return None
+        return usuario_id, perfil, expira_em, jti
@@ -0,0 +1,52 @@
+"""
+Compara a memória de um ano de slots de 15 minutos guardados como lista de `SlotAgenda`
+com a representação compacta de `Agenda`.
+
+Uso (a partir de backend/): python -m benchmarks.agenda_memoria
+"""
+import os
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.domain import Agenda, SlotAgenda  # noqa: E402
+
+INICIO = datetime(2030, 1, 1)
+DURACAO = timedelta(minutes=15)
+TOTAL = 365 * 24 * 4
+
+
+def _intervalos():
+    for i in range(TOTAL):
+        inicio = INICIO + DURACAO * i
+        yield inicio, inicio + DURACAO
+
+
+def _medir(construir):
+    tracemalloc.start()
+    objeto = construir()
+    atual, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return objeto, atual
+
+
+def _lista():
+    return [SlotAgenda(inicio, fim) for inicio, fim in _intervalos()]
+
+
+def _agenda():
+    agenda = Agenda(medico_id="benchmark")
+    for inicio, fim in _intervalos():
+        agenda.adicionar_slot(inicio, fim)
+    return agenda
+
+
+if __name__ == "__main__":
+    _, bytes_lista = _medir(_lista)
+    _, bytes_agenda = _medir(_agenda)
+    print(f"slots: {TOTAL}")
+    print(f"list[SlotAgenda]: {bytes_lista / 1024:.0f} KiB ({bytes_lista / TOTAL:.1f} B/slot)")
+    print(f"Agenda compacta:  {bytes_agenda / 1024:.0f} KiB ({bytes_agenda / TOTAL:.1f} B/slot)")
+    print(f"redução: {bytes_lista / bytes_agenda:.1f}x")
@@ -0,0 +1,64 @@
+"""
+Compara a vazão de `Database.salvar_usuario` abrindo uma conexão por chamada (journal padrão,
+como antes do pool) com o pool de conexões duradouras em WAL.
+
+Uso (a partir de backend/): python -m benchmarks.db_conexoes [quantidade]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import Database  # noqa: E402
+
+QUANTIDADE = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+
+
+class _ConexaoPorChamada(Database):
+    """Comportamento anterior: conexão nova, sem pragmas, fechada ao fim de cada operação."""
+
+    @contextmanager
+    def _conexao(self):
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+
+def _medir(classe) -> float:
+    with tempfile.TemporaryDirectory() as pasta:
+        database = classe(os.path.join(pasta, "bench.db"))
+        inicio = time.perf_counter()
+        for i in range(QUANTIDADE):
+            database.salvar_usuario(
+                id=str(uuid.uuid4()),
+                nome=f"Paciente {i}",
+                email=f"paciente{i}@email.com",
+                telefone=None,
+                perfil="PACIENTE",
+                especialidades=None,
+                senha=None,
+            )
+        decorrido = time.perf_counter() - inicio
+        database.fechar()
+    return QUANTIDADE / decorrido
+
+
+def main() -> None:
+    antes = _medir(_ConexaoPorChamada)
+    depois = _medir(Database)
+    print(f"usuários gravados: {QUANTIDADE}")
+    print(f"conexão por chamada: {antes:10.0f} usuários/s")
+    print(f"pool + WAL:          {depois:10.0f} usuários/s")
+    print(f"ganho: {depois / antes:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Custo de muitos assinantes parados em GET /eventos: CPU do processo enquanto milhares de
+conexões só esperam (com o ping de 15 s), e a latência de um evento publicado por uma thread,
+como fazem as rotas, até chegar a um assinante no meio de todos os outros.
+
+Uso (a partir de backend/): python -m benchmarks.eventos_ociosos [assinantes] [segundos]
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.domain.services.travas import chave_medico  # noqa: E402
+from app.eventos import HubEventos  # noqa: E402
+
+ASSINANTES = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+DURACAO = float(sys.argv[2]) if len(sys.argv) > 2 else 30.0
+INICIO = datetime(2030, 1, 1, 8, 0)
+
+
+async def _consumir(hub: HubEventos, chave: str, recebidos: asyncio.Queue) -> None:
+    async for mensagem in hub.acompanhar({chave}):
+        if mensagem.startswith(b"event:"):
+            recebidos.put_nowait(time.perf_counter())
+
+
+async def main() -> None:
+    hub = HubEventos(lambda c: b"{}")
+    recebidos: asyncio.Queue = asyncio.Queue()
+    tarefas = [
+        asyncio.create_task(_consumir(hub, chave_medico(f"m{i}"), recebidos)) for i in range(ASSINANTES)
+    ]
+    while hub.assinantes < ASSINANTES:
+        await asyncio.sleep(0.01)
+
+    cpu, relogio = time.process_time(), time.perf_counter()
+    await asyncio.sleep(DURACAO)
+    cpu, relogio = time.process_time() - cpu, time.perf_counter() - relogio
+    print(f"{ASSINANTES} assinantes parados por {relogio:.0f} s: {cpu * 1000:.0f} ms de CPU ({cpu / relogio:.2%} de um núcleo)")
+
+    latencias = []
+    for i in range(200):
+        publicado = []
+
+        def publicar(medico_id=f"m{i * 7 % ASSINANTES}"):
+            publicado.append(time.perf_counter())
+            hub.slots_adicionados(medico_id, [(INICIO, INICIO + timedelta(minutes=30))])
+
+        thread = threading.Thread(target=publicar)
+        thread.start()
+        chegada = await recebidos.get()
+        thread.join()
+        latencias.append(chegada - publicado[0])
+    latencias.sort()
+    print(
+        f"evento de uma thread até o assinante: p50 {latencias[100] * 1e6:.0f} us, p99 {latencias[198] * 1e6:.0f} us"
+    )
+    for tarefa in tarefas:
+        tarefa.cancel()
+    await asyncio.gather(*tarefas, return_exceptions=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+"""
+Mede quanto `MemoryStore()` leva para subir sobre um banco com muitos usuários.
+
+Importar `app.storage` já constrói o `store` do módulo, então a medição roda num processo novo:
+lá as dependências são importadas antes e o relógio cobre só o import de `app.storage`, ou seja,
+a primeira construção (fria). Uma segunda construção no mesmo processo aparece para comparação.
+
+Uso (a partir de backend/): python -m benchmarks.inicializacao [quantidade]
+"""
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import uuid
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+QUANTIDADE = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+# um médico a cada dez usuários; o resto são pacientes (mais um administrador)
+MEDICOS_A_CADA = 10
+
+
+def _popular(caminho: str) -> None:
+    linhas = [(str(uuid.uuid4()), "Admin", "admin@medsched.com", None, "ADMIN", "[]", "admin123")]
+    for i in range(QUANTIDADE - 1):
+        if i % MEDICOS_A_CADA == 0:
+            linhas.append(
+                (str(uuid.uuid4()), f"Dr. {i}", f"medico{i}@clinic.com", None, "MEDICO", json.dumps(["Ortopedia"]), "1234")
+            )
+        else:
+            linhas.append((str(uuid.uuid4()), f"Paciente {i}", f"paciente{i}@email.com", None, "PACIENTE", "[]", "1234"))
+    conn = sqlite3.connect(caminho)
+    with conn:
+        conn.executemany(
+            "INSERT INTO usuarios (id, nome, email, telefone, perfil, especialidades, senha) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            linhas,
+        )
+    conn.close()
+
+
+# roda no processo novo; imprime o JSON com as medições
+_MEDIR = """
+import importlib, json, time
+# tudo o que app.storage importa, para o relógio pegar só a construção do store
+import app.db, app.domain, app.especialidades, app.eventos, app.journal
+import app.persistencia, app.senhas, app.serializacao, app.sessoes, app.tokens
+
+inicio = time.perf_counter()
+storage = importlib.import_module("app.storage")
+fria = time.perf_counter() - inicio
+store = storage.store
+inicio = time.perf_counter()
+outro = storage.MemoryStore()
+quente = time.perf_counter() - inicio
+print(json.dumps({
+    "usuarios": len(store.admins) + len(store.medicos) + len(store.pacientes),
+    "medicos": len(store.medicos),
+    "fria": fria,
+    "quente": quente,
+}))
+outro.fechar()
+store.fechar()
+"""
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as pasta:
+        os.environ["MEDSCHED_DB_PATH"] = os.path.join(pasta, "bench.db")
+        os.environ.pop("MEDSCHED_SEED", None)
+        from app.db import db
+
+        _popular(db.path)
+        db.fechar()
+        saida = subprocess.run(
+            [sys.executable, "-c", _MEDIR], cwd=BACKEND, env=os.environ, check=True, capture_output=True, text=True
+        ).stdout
+        medicao = json.loads(saida.strip().splitlines()[-1])
+        print(f"usuários carregados: {medicao['usuarios']} ({medicao['medicos']} médicos)")
+        print(f"inicialização (primeira construção): {medicao['fria'] * 1000:.0f} ms")
+        print(f"segunda construção no mesmo processo: {medicao['quente'] * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Mede a subida da agenda a partir do journal: um snapshot com muitas consultas (e um slot
+para cada) mais um segmento recente com 1% delas, como depois de uma compactação.
+
+Uso (a partir de backend/): python -m benchmarks.journal_reinicio [consultas]
+"""
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.domain import AgendamentoService, StatusConsulta  # noqa: E402
+from app.journal import CONSULTA, SLOT, EstadoAgenda, JournalAgenda, codificar  # noqa: E402
+from app.persistencia import sem_coleta_de_lixo  # noqa: E402
+
+QUANTIDADE = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+MEDICOS = 1_000
+PACIENTES = 50_000
+INICIO = datetime(2030, 1, 1)
+DURACAO = timedelta(minutes=30)
+EPOCA_EM_MINUTOS = (INICIO - datetime(1970, 1, 1)) // timedelta(minutes=1)
+
+
+def _escrever(caminho: str, eventos) -> None:
+    with open(caminho, "wb") as arquivo:
+        for evento in eventos:
+            arquivo.write(codificar(evento))
+
+
+def _eventos(medicos, pacientes, de: int, ate: int):
+    for i in range(de, ate):
+        medico = medicos[i % MEDICOS]
+        # cada médico recebe slots consecutivos
+        minuto = EPOCA_EM_MINUTOS + (i // MEDICOS) * 30
+        inicio = INICIO + DURACAO * (i // MEDICOS)
+        yield (SLOT, medico, minuto, minuto + 30, 0)
+        status = StatusConsulta.CONFIRMADA if i % 3 else StatusConsulta.AGENDADA
+        yield (CONSULTA, str(uuid.uuid4()), pacientes[i % PACIENTES], medico, inicio, inicio + DURACAO, status, None, INICIO, INICIO)
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as pasta:
+        medicos = [str(uuid.uuid4()) for _ in range(MEDICOS)]
+        pacientes = [str(uuid.uuid4()) for _ in range(PACIENTES)]
+        corte = QUANTIDADE - QUANTIDADE // 100
+        estado = EstadoAgenda()
+        for evento in _eventos(medicos, pacientes, 0, corte):
+            estado.aplicar(evento)
+        _escrever(os.path.join(pasta, "snapshot-000000000001.bin"), estado.eventos())
+        del estado
+        _escrever(os.path.join(pasta, "journal-000000000002.bin"), _eventos(medicos, pacientes, corte, QUANTIDADE))
+        tamanho = sum(os.path.getsize(os.path.join(pasta, nome)) for nome in os.listdir(pasta))
+
+        # mesmo caminho de MemoryStore com MEDSCHED_JOURNAL_DIR
+        with sem_coleta_de_lixo():
+            inicio = time.perf_counter()
+            journal = JournalAgenda(pasta)
+            agendas, consultas = journal.carregar()
+            lido = time.perf_counter()
+            AgendamentoService(agendas=agendas, consultas=consultas, repositorio=journal)
+            pronto = time.perf_counter()
+        journal.fechar()
+
+    print(f"consultas: {len(consultas)} em {len(agendas)} agendas ({tamanho / 2**20:.0f} MiB em disco)")
+    print(f"leitura do snapshot + journal: {lido - inicio:6.2f} s")
+    print(f"índices do serviço:            {pronto - lido:6.2f} s")
+    print(f"total:                         {pronto - inicio:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Mede a vazão de logins com senha em scrypt e o efeito sobre as demais requisições: várias
+threads (como as do threadpool do FastAPI) conferem senhas enquanto outra atende requisições
+leves, comparando a derivação na própria thread com o pool de processos.
+
+Uso (a partir de backend/): python -m benchmarks.login [segundos]
+"""
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.senhas import ServicoSenhas  # noqa: E402
+
+DURACAO = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+THREADS_DE_LOGIN = 8
+
+
+def _requisicao_leve() -> None:
+    # ordem de grandeza de uma rota simples: um pouco de Python puro
+    sum(i * i for i in range(2_000))
+
+
+def _medir(processos: int):
+    senhas = ServicoSenhas(processos=processos)
+    armazenada = senhas.gerar_hash("senha-de-teste")
+    fim = time.perf_counter() + DURACAO
+    logins = [0] * THREADS_DE_LOGIN
+    latencias = []
+
+    def logar(indice: int) -> None:
+        while time.perf_counter() < fim:
+            assert senhas.conferir("senha-de-teste", armazenada)
+            logins[indice] += 1
+
+    threads = [threading.Thread(target=logar, args=(i,)) for i in range(THREADS_DE_LOGIN)]
+    for thread in threads:
+        thread.start()
+    while time.perf_counter() < fim:
+        inicio = time.perf_counter()
+        _requisicao_leve()
+        latencias.append(time.perf_counter() - inicio)
+    for thread in threads:
+        thread.join()
+    senhas.fechar()
+    latencias.sort()
+    return sum(logins) / DURACAO, statistics.median(latencias), latencias[int(len(latencias) * 0.99)]
+
+
+def main() -> None:
+    print(f"{THREADS_DE_LOGIN} threads fazendo login por {DURACAO:.0f} s, {os.cpu_count()} CPUs")
+    for nome, processos in (("na thread da requisição", 0), ("pool de processos", None)):
+        vazao, p50, p99 = _medir(processos)
+        print(
+            f"{nome:24} {vazao:7.1f} logins/s   requisição leve: p50 {p50 * 1000:6.2f} ms, p99 {p99 * 1000:6.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
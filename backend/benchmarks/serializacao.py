@@ -0,0 +1,76 @@
+"""
+Compara a serialização de uma listagem grande de consultas: o caminho antigo (um `ConsultaOut`
+por linha, revalidado pelo `response_model` e codificado pelo `JSONResponse`, como o FastAPI
+faz) com os fragmentos JSON prontos de `FragmentosConsulta`, com o cache frio e quente.
+
+Uso (a partir de backend/): python -m benchmarks.serializacao [consultas]
+"""
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+from app.domain import Consulta, Medico, Paciente  # noqa: E402
+from app.schemas import ConsultaOut  # noqa: E402
+from app.serializacao import FragmentosConsulta  # noqa: E402
+
+QUANTIDADE = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+INICIO = datetime(2030, 1, 1, 8, 0)
+
+
+def _dados():
+    medicos = [Medico.novo(f"Dr. Médico {i}", f"m{i}@clinic.com", especialidades=["Ortopedia", "Clínica Geral"]) for i in range(200)]
+    pacientes = [Paciente.novo(f"Paciente {i}", f"p{i}@email.com") for i in range(5_000)]
+    consultas = []
+    for i in range(QUANTIDADE):
+        inicio = INICIO + timedelta(minutes=30 * (i // len(medicos)))
+        consulta = Consulta.nova(pacientes[i % len(pacientes)].id, medicos[i % len(medicos)].id, inicio, inicio + timedelta(minutes=30))
+        if i % 3 == 0:
+            consulta.confirmar()
+        consultas.append(consulta)
+    return {m.id: m for m in medicos}, {p.id: p for p in pacientes}, consultas
+
+
+def _caminho_antigo(fragmentos: FragmentosConsulta, consultas, campo) -> bytes:
+    conteudo = [fragmentos.serializar(c) for c in consultas]
+    validado = asyncio.run(serialize_response(field=campo, response_content=conteudo))
+    return JSONResponse(validado).body
+
+
+def _medir(funcao, *args):
+    inicio = time.perf_counter()
+    corpo = funcao(*args)
+    return time.perf_counter() - inicio, corpo
+
+
+def main() -> None:
+    medicos, pacientes, consultas = _dados()
+    campo = create_response_field(name="resposta", type_=List[ConsultaOut])
+    fragmentos = FragmentosConsulta(medicos, pacientes)
+
+    antigo, corpo_antigo = _medir(_caminho_antigo, fragmentos, consultas, campo)
+    frio, corpo_novo = _medir(fragmentos.lista_json, consultas)
+    quente, _ = _medir(fragmentos.lista_json, consultas)
+    for consulta in consultas[::100]:
+        fragmentos.consulta_salva(consulta)
+    um_por_cento, _ = _medir(fragmentos.lista_json, consultas)
+
+    # mesmos bytes que o caminho antigo produzia
+    assert corpo_novo == corpo_antigo
+    print(f"consultas: {QUANTIDADE} ({len(corpo_novo) / 2**20:.1f} MiB de JSON)")
+    print(f"ConsultaOut + response_model:   {antigo * 1000:8.1f} ms")
+    print(f"fragmentos, cache frio:         {frio * 1000:8.1f} ms")
+    print(f"fragmentos, cache quente:       {quente * 1000:8.1f} ms")
+    print(f"fragmentos, 1% invalidado:      {um_por_cento * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Leituras de `slots_disponiveis` (GET /agendas/{id}/slots) numa agenda grande: o cálculo antigo,
+que percorria todos os slots procurando consultas confirmadas em cada um, contra a vista de
+slots livres mantida pelo serviço, lida sem e com mudanças (confirmações) entre as leituras.
+
+Uso (a partir de backend/): python -m benchmarks.slots_disponiveis [slots]
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.domain import AgendamentoService, Medico, Paciente, StatusConsulta  # noqa: E402
+
+QUANTIDADE = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+LEITURAS = 50
+INICIO = datetime(2030, 1, 1, 8, 0)
+
+
+def _recalcular(servico: AgendamentoService, medico: Medico):
+    # o que slots_disponiveis fazia a cada chamada
+    return [
+        s
+        for s in servico.agendas[medico.id].slots()
+        if not s.bloqueado
+        and next(servico._colisoes(servico._por_medico, medico.id, (StatusConsulta.CONFIRMADA,), s.inicio, s.fim), None)
+        is None
+    ]
+
+
+def _por_leitura(funcao) -> float:
+    inicio = time.perf_counter()
+    for _ in range(LEITURAS):
+        funcao()
+    return (time.perf_counter() - inicio) / LEITURAS
+
+
+def main() -> None:
+    medico = Medico.novo("Dr. Médico", "medico@clinic.com")
+    servico = AgendamentoService()
+    intervalos = [(INICIO + timedelta(minutes=30 * i), INICIO + timedelta(minutes=30 * i + 30)) for i in range(QUANTIDADE)]
+    servico.disponibilizar_slots(medico, intervalos)
+    pacientes = [Paciente.novo(f"Paciente {i}", f"p{i}@email.com") for i in range(QUANTIDADE // 10)]
+    for i, paciente in enumerate(pacientes):
+        inicio, fim = intervalos[i * 10]
+        servico.confirmar(servico.agendar(paciente, medico, inicio, fim).id)
+
+    antigo = _por_leitura(lambda: _recalcular(servico, medico))
+    primeira = _por_leitura(lambda: (servico._livres.clear(), servico.slots_disponiveis(medico)))
+    quente = _por_leitura(lambda: servico.slots_disponiveis(medico))
+    livres = iter(intervalos[1::10])
+
+    def com_mudanca():
+        inicio, fim = next(livres)
+        servico.confirmar(servico.agendar(pacientes[0], medico, inicio, fim).id)
+        return servico.slots_disponiveis(medico)
+
+    mudando = _por_leitura(com_mudanca)
+    assert servico.slots_disponiveis(medico) == _recalcular(servico, medico)
+    print(f"slots: {QUANTIDADE}, confirmadas: {len(pacientes) + LEITURAS}, por leitura:")
+    print(f"recalculando tudo:              {antigo * 1000:8.2f} ms")
+    print(f"vista remontada (falta):        {primeira * 1000:8.2f} ms")
+    print(f"vista pronta (acerto):          {quente * 1000:8.2f} ms")
+    print(f"confirmação + leitura:          {mudando * 1000:8.2f} ms")
+    print(servico.estatisticas_slots)
+
+
+if __name__ == "__main__":
+    main()
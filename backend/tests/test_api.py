@@ -3,15 +3,17 @@ import os
 import sys
 import json
 from importlib import reload
+from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Optional
+from urllib.parse import parse_qs, urlsplit
 
 # Adiciona o diretório backend ao Python path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import pytest
-from fastapi import HTTPException, status
+from fastapi import HTTPException, Response, status
 from fastapi.encoders import jsonable_encoder
-from app.schemas import LoginRequest, AgendamentoRequest, RemarcarRequest
+from app.schemas import LoginRequest, AgendamentoLoteRequest, AgendamentoRequest, RemarcarRequest, SlotLoteRequest
 
 
 class SimpleResponse:
@@ -41,9 +43,13 @@ class TestClient:
 
 # Configura BD temporário antes de carregar a app
 os.environ["MEDSCHED_DB_PATH"] = os.environ.get("PYTEST_DB_PATH", "/tmp/medsched_test.db")
+os.environ["MEDSCHED_SEED"] = "1"
+# scrypt barato nos testes; o formato e o pool de processos são os mesmos
+os.environ.setdefault("MEDSCHED_SENHA_CUSTO", "1024")
 
 import app.storage as storage  # noqa: E402
 import app.main as main  # noqa: E402
+from app.domain import Paciente, StatusConsulta  # noqa: E402
 
 
 def _optional_user(headers: Dict[str, str]):
@@ -61,9 +67,15 @@ def _require_user(headers: Dict[str, str]):
     return user
 
 
-def _response(payload, status_code: int) -> SimpleResponse:
+def _cabecalho(headers: Dict[str, str], nome: str) -> Optional[str]:
+    return next((v for k, v in headers.items() if k.lower() == nome.lower()), None)
+
+
+def _response(payload, status_code: int, resposta: Optional[Response] = None) -> SimpleResponse:
+    if isinstance(payload, Response):
+        return SimpleResponse(payload.status_code, payload.body, payload.raw_headers)
     body = json.dumps(jsonable_encoder(payload)).encode("utf-8") if payload is not None else b""
-    return SimpleResponse(status_code, body)
+    return SimpleResponse(status_code, body, resposta.raw_headers if resposta is not None else None)
 
 
 def _error_response(exc: HTTPException) -> SimpleResponse:
@@ -80,8 +92,18 @@ def dispatch_request(app, method: str, path: str, body_json: Optional[Dict], hea
 
         if method == "GET" and path.startswith("/agendas/") and path.endswith("/slots"):
             medico_id = path.split("/")[2]
-            res = main.horarios_disponiveis(medico_id)
-            return _response(res, status.HTTP_200_OK)
+            resposta = Response()
+            res = main.horarios_disponiveis(
+                medico_id, resposta, de=None, ate=None, if_none_match=_cabecalho(headers, "If-None-Match")
+            )
+            return _response(res, status.HTTP_200_OK, resposta)
+
+        if method == "POST" and path.startswith("/agendas/") and path.endswith("/slots/bulk"):
+            medico_id = path.split("/")[2]
+            usuario = _require_user(headers)
+            payload = SlotLoteRequest(**(body_json or {}))
+            res = main.criar_slots_em_lote(medico_id, payload, usuario=usuario)
+            return _response(res, status.HTTP_201_CREATED)
 
         if method == "POST" and path == "/consultas":
             usuario = _require_user(headers)
@@ -89,9 +111,32 @@ def dispatch_request(app, method: str, path: str, body_json: Optional[Dict], hea
             res = main.agendar(payload, usuario=usuario)
             return _response(res, status.HTTP_201_CREATED)
 
-        if method == "GET" and path == "/consultas":
+        if method == "POST" and path == "/consultas/lote":
+            usuario = _require_user(headers)
+            payload = AgendamentoLoteRequest(**(body_json or {}))
+            resposta = Response(status_code=status.HTTP_201_CREATED)
+            res = main.agendar_lote(payload, resposta, usuario=usuario)
+            return _response(res, resposta.status_code)
+
+        if method == "GET" and (path == "/consultas" or path.startswith("/consultas?")):
             usuario = _optional_user(headers)
-            res = main.listar_consultas(medico_id=None, paciente_id=None, status_filtro=None, usuario=usuario)
+            query = {k: v[0] for k, v in parse_qs(urlsplit(path).query).items()}
+            res = main.listar_consultas(
+                medico_id=query.get("medico_id"),
+                paciente_id=query.get("paciente_id"),
+                status_filtro=StatusConsulta(query["status"]) if "status" in query else None,
+                de=datetime.fromisoformat(query["de"]) if "de" in query else None,
+                ate=datetime.fromisoformat(query["ate"]) if "ate" in query else None,
+                cursor=query.get("cursor"),
+                limite=int(query.get("limite", 100)),
+                usuario=usuario,
+                if_none_match=_cabecalho(headers, "If-None-Match"),
+            )
+            return _response(res, status.HTTP_200_OK)
+
+        if method == "GET" and (path == "/mudancas" or path.startswith("/mudancas?")):
+            query = {k: v[0] for k, v in parse_qs(urlsplit(path).query).items()}
+            res = main.listar_mudancas(desde=query.get("desde"), usuario=_optional_user(headers))
             return _response(res, status.HTTP_200_OK)
 
         if method == "POST" and path.startswith("/consultas/") and path.endswith("/remarcar"):
@@ -111,6 +156,8 @@ def dispatch_request(app, method: str, path: str, body_json: Optional[Dict], hea
 
 def fresh_client() -> TestClient:
     db_path = os.environ.get("MEDSCHED_DB_PATH", "/tmp/medsched_test.db")
+    # a escrita adiada do store anterior não pode cair no arquivo recriado
+    storage.store.fechar()
     if os.path.exists(db_path):
         os.remove(db_path)
     # cria store novo e injeta na app
@@ -136,6 +183,129 @@ def test_login_admin():
     assert body["usuario"]["perfil"] == "ADMIN"
 
 
+def test_login_pelo_indice_de_email():
+    client = fresh_client()
+    paciente = storage.store.adicionar_paciente(Paciente.novo("Carla Souza", "Carla@Email.com", senha="carla123"))
+    res = client.post("/auth/login", json={"email": "  CARLA@email.com ", "senha": "carla123"})
+    assert res.status_code == 200
+    assert res.json()["usuario"]["id"] == paciente.id
+    assert storage.store.usuario_por_token(res.json()["token"]) is paciente
+    res = client.post("/auth/login", json={"email": "carla@email.com", "senha": "errada"})
+    assert res.status_code == 401
+
+
+def test_consultas_paginadas_pelo_cabecalho_de_cursor():
+    client = fresh_client()
+    headers = auth_headers(client, "admin@medsched.com", "admin123")
+    esperado = sorted((c.inicio, c.id) for c in storage.store.servico.consultas.values())
+    assert len(esperado) >= 2
+    vistos, caminho = [], "/consultas?limite=1"
+    while caminho:
+        res = client.get(caminho, headers=headers)
+        assert res.status_code == 200
+        vistos += [c["id"] for c in res.json()]
+        cursor = res.headers.get("x-proximo-cursor")
+        caminho = f"/consultas?limite=1&cursor={cursor}" if cursor else None
+    assert vistos == [cid for _, cid in esperado]
+    assert client.get("/consultas?cursor=invalido", headers=headers).status_code == 400
+
+
+def test_json_pronto_das_consultas_acompanha_mudancas():
+    client = fresh_client()
+    headers = auth_headers(client, "admin@medsched.com", "admin123")
+    servico = storage.store.servico
+
+    def como_antes():
+        consultas = sorted(servico.consultas.values(), key=lambda c: (c.inicio, c.id))
+        return [jsonable_encoder(main._serializar_consulta(c)) for c in consultas]
+
+    assert client.get("/consultas", headers=headers).json() == como_antes()
+    agendada = next(c for c in servico.consultas.values() if c.status == StatusConsulta.AGENDADA)
+    servico.confirmar(agendada.id)
+    listadas = client.get("/consultas", headers=headers).json()
+    assert listadas == como_antes()
+    assert next(c for c in listadas if c["id"] == agendada.id)["status"] == "CONFIRMADA"
+    estado = json.loads(main.estado_atual(if_none_match=None).body)
+    assert sorted(estado["consultas"], key=lambda c: c["id"]) == sorted(como_antes(), key=lambda c: c["id"])
+    assert estado["medicos"] == jsonable_encoder([main.UsuarioOut.model_validate(m) for m in storage.store.medicos.values()])
+
+
+def test_etag_responde_304_ate_a_agenda_ou_as_consultas_mudarem():
+    client = fresh_client()
+    joao = auth_headers(client, "joao@email.com", "joao123")
+    primeira = client.get("/consultas", headers=joao)
+    etag = primeira.headers["etag"]
+    assert client.get("/consultas", headers={**joao, "If-None-Match": etag}).status_code == 304
+
+    # mudança de outro paciente não invalida a lista do João
+    maria = next(p for p in storage.store.pacientes.values() if p.email == "maria@email.com")
+    da_maria = next(c for c in storage.store.servico.consultas.values() if c.paciente_id == maria.id)
+    storage.store.servico.confirmar(da_maria.id)
+    assert client.get("/consultas", headers={**joao, "If-None-Match": etag}).status_code == 304
+
+    do_joao = next(c for c in storage.store.servico.consultas.values() if c.id == primeira.json()[0]["id"])
+    storage.store.servico.cancelar(do_joao.id)
+    depois = client.get("/consultas", headers={**joao, "If-None-Match": etag})
+    assert depois.status_code == 200 and depois.headers["etag"] != etag
+
+    medico_id = do_joao.medico_id
+    slots = client.get(f"/agendas/{medico_id}/slots")
+    assert client.get(f"/agendas/{medico_id}/slots", headers={"If-None-Match": slots.headers["etag"]}).status_code == 304
+    medico = storage.store.obter_medico(medico_id)
+    inicio = do_joao.inicio + timedelta(days=30)
+    storage.store.servico.disponibilizar_slot(medico, inicio, inicio + timedelta(minutes=30))
+    assert client.get(f"/agendas/{medico_id}/slots", headers={"If-None-Match": slots.headers["etag"]}).status_code == 200
+
+
+def test_mudancas_entregam_so_o_que_mudou_desde_a_versao():
+    client = fresh_client()
+    joao_headers = auth_headers(client, "joao@email.com", "joao123")
+    inicial = client.get("/mudancas", headers=joao_headers).json()
+    assert inicial["ressincronizar"] and not inicial["consultas"]
+    versao = inicial["versao"]
+    assert client.get(f"/mudancas?desde={versao}", headers=joao_headers).json() == {
+        "versao": versao, "ressincronizar": False, "consultas": [], "agendas": []
+    }
+
+    servico = storage.store.servico
+    maria = next(p for p in storage.store.pacientes.values() if p.email == "maria@email.com")
+    servico.confirmar(next(c for c in servico.consultas.values() if c.paciente_id == maria.id).id)
+    joao = next(p for p in storage.store.pacientes.values() if p.email == "joao@email.com")
+    do_joao = next(c for c in servico.consultas.values() if c.paciente_id == joao.id)
+    medico = storage.store.obter_medico(do_joao.medico_id)
+    inicio = do_joao.inicio + timedelta(days=30)
+    servico.disponibilizar_slot(medico, inicio, inicio + timedelta(minutes=30))
+    nova = servico.agendar(joao, medico, inicio, inicio + timedelta(minutes=30))
+    servico.confirmar(nova.id)
+    servico.cancelar(do_joao.id)
+
+    delta = client.get(f"/mudancas?desde={versao}", headers=joao_headers).json()
+    assert not delta["ressincronizar"] and delta["versao"] != versao
+    # a consulta da Maria não vai para o João; cada uma das dele vem uma vez, no estado atual
+    assert [(c["id"], c["status"]) for c in delta["consultas"]] == [(nova.id, "CONFIRMADA"), (do_joao.id, "CANCELADA")]
+    assert [(a["tipo"], a["medico_id"], len(a["intervalos"])) for a in delta["agendas"]] == [("SLOTS", medico.id, 1)]
+    assert client.get(f"/mudancas?desde={delta['versao']}", headers=joao_headers).json()["consultas"] == []
+    assert client.get("/mudancas?desde=outra-subida.1", headers=joao_headers).json()["ressincronizar"]
+
+
+def test_senha_em_texto_puro_vira_hash_no_login():
+    fresh_client()
+    admin = next(iter(storage.store.admins.values()))
+    assert admin.senha_armazenada.startswith("scrypt$") and "admin123" not in admin.senha_armazenada
+    # linha gravada antes dos hashes: senha em texto puro no banco
+    storage.db.atualizar_senha(admin.id, "admin123")
+    storage.store.fechar()
+    recarregado = storage.MemoryStore()
+    try:
+        assert recarregado.autenticar("admin@medsched.com", "errada") is None
+        assert recarregado.autenticar("admin@medsched.com", "admin123")
+        (senha,) = [linha[5] for linha in storage.db.carregar_usuarios() if linha[0] == admin.id]
+        assert senha.startswith("scrypt$")
+        assert recarregado.autenticar("admin@medsched.com", "admin123")
+    finally:
+        recarregado.fechar()
+
+
 def test_patient_cannot_overlap_same_patient():
     client = fresh_client()
     headers = auth_headers(client, "joao@email.com", "joao123")
@@ -206,5 +376,156 @@ def test_reschedule_by_doctor_confirms_and_cancels_conflicts():
     assert agendar.status_code == 400  # slot já confirmado pelo médico
 
 
+def test_bulk_slots_generates_range_and_reports_rejections():
+    client = fresh_client()
+    headers_doc = auth_headers(client, "bruno@clinic.com", "bruno123")
+    bruno_id = storage.store.usuario_por_token(headers_doc["Authorization"].split(" ", 1)[1]).id
+    res = client.post(
+        f"/agendas/{bruno_id}/slots/bulk",
+        json={
+            "slots": [
+                {"inicio": "2031-03-03T12:15:00", "fim": "2031-03-03T12:45:00"},
+                {"inicio": "2031-03-04T07:00:00", "fim": "2031-03-04T07:00:00"},
+            ],
+            "gerar": {
+                "de": "2031-03-03T00:00:00",
+                "ate": "2031-03-08T00:00:00",
+                "hora_inicio": "08:00",
+                "hora_fim": "18:00",
+                "duracao_minutos": 30,
+            },
+        },
+        headers=headers_doc,
+    )
+    assert res.status_code == 201, res.text
+    body = res.json()
+    # 5 dias úteis x 20 slots; o slot avulso das 12:15 colide com o gerado das 12:00
+    assert body["inseridos"] == 5 * 20
+    assert [r["motivo"] for r in body["rejeitados"]] == [
+        "Novo slot se sobrepõe a outro slot do mesmo lote.",
+        "Intervalo inválido: início deve ser menor que fim.",
+    ]
+
+    slots = client.get(f"/agendas/{bruno_id}/slots").json()
+    assert sum(s["inicio"].startswith("2031-03-03") for s in slots) == 20
+
+
+def test_slots_e_consultas_com_fuso_utc():
+    client = fresh_client()
+    headers_doc = auth_headers(client, "bruno@clinic.com", "bruno123")
+    headers_pac = auth_headers(client, "joao@email.com", "joao123")
+    bruno_id = storage.store.usuario_por_token(headers_doc["Authorization"].split(" ", 1)[1]).id
+    joao_id = storage.store.usuario_por_token(headers_pac["Authorization"].split(" ", 1)[1]).id
+    res = client.post(
+        f"/agendas/{bruno_id}/slots/bulk",
+        json={"slots": [{"inicio": "2031-03-03T10:00Z", "fim": "2031-03-03T10:30Z"}, {"inicio": "2031-03-03T11:00:00", "fim": "2031-03-03T11:30:00"}]},
+        headers=headers_doc,
+    )
+    assert res.status_code == 201, res.text
+    res = client.post(
+        "/consultas",
+        json={"paciente_id": joao_id, "medico_id": bruno_id, "inicio": "2031-03-03T10:00:00+00:00", "fim": "2031-03-03T10:30:00+00:00"},
+        headers=headers_pac,
+    )
+    assert res.status_code == 201, res.text
+    storage.store.servico.confirmar(res.json()["id"])
+    slots = client.get(f"/agendas/{bruno_id}/slots")
+    assert slots.status_code == 200, slots.text
+    assert [s["inicio"] for s in slots.json() if s["inicio"].startswith("2031-03-03")] == ["2031-03-03T11:00:00"]
+
+    # o índice global (admin, sem filtro) e os filtros com fuso aceitam a consulta vinda com fuso
+    headers_admin = auth_headers(client, "admin@medsched.com", "admin123")
+    todas = client.get("/consultas?limite=1000", headers=headers_admin)
+    assert todas.status_code == 200, todas.text
+    assert res.json()["id"] in [c["id"] for c in todas.json()]
+    filtradas = client.get("/consultas?de=2031-03-03T09:00:00%2B00:00&ate=2031-03-03T12:00:00Z", headers=headers_admin)
+    assert [c["id"] for c in filtradas.json()] == [res.json()["id"]]
+
+
+def test_bulk_slots_requires_agenda_owner():
+    client = fresh_client()
+    headers_pac = auth_headers(client, "joao@email.com", "joao123")
+    medico_id = list(storage.store.medicos.values())[0].id
+    res = client.post(
+        f"/agendas/{medico_id}/slots/bulk",
+        json={"slots": [{"inicio": "2031-03-03T12:00:00", "fim": "2031-03-03T12:30:00"}]},
+        headers=headers_pac,
+    )
+    assert res.status_code == 403
+
+
+def _pedidos_lote(paciente_id: str, pares) -> Dict:
+    return {
+        "consultas": [
+            {"paciente_id": paciente_id, "medico_id": medico_id, "inicio": slot["inicio"], "fim": slot["fim"]}
+            for medico_id, slot in pares
+        ]
+    }
+
+
+def test_batch_booking_is_all_or_nothing():
+    client = fresh_client()
+    headers_admin = auth_headers(client, "admin@medsched.com", "admin123")
+    ana, bruno = list(storage.store.medicos.values())[:2]
+    joao = list(storage.store.pacientes.values())[0]
+    ana_slots = client.get(f"/agendas/{ana.id}/slots").json()
+    bruno_slots = client.get(f"/agendas/{bruno.id}/slots").json()
+    antes = len(storage.store.servico.consultas)
+
+    # o primeiro slot de Bruno coincide com a consulta confirmada de João com Ana
+    res = client.post(
+        "/consultas/lote",
+        json=_pedidos_lote(joao.id, [(ana.id, ana_slots[1]), (bruno.id, bruno_slots[0])]),
+        headers=headers_admin,
+    )
+    assert res.status_code == 400
+    body = res.json()
+    assert body["sucesso"] is False
+    assert body["itens"][0]["erro"] is None and body["itens"][0]["consulta"] is None
+    assert "consulta" in body["itens"][1]["erro"].lower()
+    assert len(storage.store.servico.consultas) == antes
+
+    res = client.post(
+        "/consultas/lote",
+        json=_pedidos_lote(joao.id, [(ana.id, ana_slots[1]), (bruno.id, bruno_slots[-1])]),
+        headers=headers_admin,
+    )
+    assert res.status_code == 201, res.text
+    assert [i["consulta"]["status"] for i in res.json()["itens"]] == ["AGENDADA", "AGENDADA"]
+    assert len(storage.store.servico.consultas) == antes + 2
+
+
+def test_batch_booking_rejects_overlaps_inside_the_batch():
+    client = fresh_client()
+    headers = auth_headers(client, "maria@email.com", "maria123")
+    ana, bruno = list(storage.store.medicos.values())[:2]
+    maria = list(storage.store.pacientes.values())[1]
+    slot = client.get(f"/agendas/{ana.id}/slots").json()[-1]
+    res = client.post("/consultas/lote", json=_pedidos_lote(maria.id, [(ana.id, slot), (bruno.id, slot)]), headers=headers)
+    assert res.status_code == 400
+    assert res.json()["itens"][1]["erro"] == "Paciente possui outra consulta neste lote no mesmo horário."
+
+
+def test_agenda_e_consultas_sobrevivem_ao_reinicio():
+    client = fresh_client()
+    headers = auth_headers(client, "joao@email.com", "joao123")
+    antes = client.get("/consultas", headers=headers).json()
+    medico_id = antes[0]["medico_id"]
+    slots_antes = client.get(f"/agendas/{medico_id}/slots").json()
+
+    status_antes = {c.id: c.status for c in storage.store.servico.consultas.values()}
+
+    storage.store.fechar()
+    recarregado = storage.MemoryStore()
+    try:
+        # mesmas consultas, nos mesmos status: o seed não duplica a agenda já persistida
+        assert {c.id: c.status for c in recarregado.servico.consultas.values()} == status_antes
+        medico = recarregado.obter_medico(medico_id)
+        slots_depois = jsonable_encoder(recarregado.servico.slots_disponiveis(medico))
+        assert slots_depois == slots_antes
+    finally:
+        recarregado.fechar()
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -0,0 +1,509 @@
+# -*- coding: utf-8 -*-
+import os
+import random
+import sys
+import threading
+from datetime import date, datetime, time, timedelta, timezone
+
+# Adiciona o diretório backend ao Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from app.domain import (
+    Agenda,
+    AgendamentoService,
+    Medico,
+    Paciente,
+    RegraRecorrencia,
+    RepositorioAgendamento,
+    RepositorioComposto,
+    SchedulingError,
+    SlotAgenda,
+    StatusConsulta,
+    TipoMudanca,
+    ValidationError,
+    Versoes,
+)
+from app.domain.services.indices import IndiceIntervalos
+
+
+BASE = datetime(2030, 1, 7, 8, 0)
+
+
+def _medico(nome: str = "Dr. Teste") -> Medico:
+    return Medico.novo(nome, f"{nome.split()[-1].lower()}@clinic.com", especialidades=["Ortopedia"])
+
+
+def _paciente(nome: str = "Paciente Teste") -> Paciente:
+    return Paciente.novo(nome, f"{nome.split()[-1].lower()}@email.com")
+
+
+def _servico_com_slots(medico: Medico, quantidade: int = 4) -> AgendamentoService:
+    servico = AgendamentoService()
+    for i in range(quantidade):
+        inicio = BASE + timedelta(minutes=30 * i)
+        servico.disponibilizar_slot(medico, inicio, inicio + timedelta(minutes=30))
+    return servico
+
+
+def test_confirmar_cancela_apenas_agendadas_sobrepostas():
+    medico = _medico()
+    servico = _servico_com_slots(medico)
+    a, b, c = _paciente("Paciente A"), _paciente("Paciente B"), _paciente("Paciente C")
+    primeira = servico.agendar(a, medico, BASE, BASE + timedelta(minutes=30))
+    concorrente = servico.agendar(b, medico, BASE, BASE + timedelta(minutes=30))
+    vizinha = servico.agendar(c, medico, BASE + timedelta(minutes=30), BASE + timedelta(minutes=60))
+
+    servico.confirmar(primeira.id)
+
+    assert primeira.status == StatusConsulta.CONFIRMADA
+    assert concorrente.status == StatusConsulta.CANCELADA
+    assert vizinha.status == StatusConsulta.AGENDADA
+    assert BASE not in [s.inicio for s in servico.slots_disponiveis(medico)]
+    with pytest.raises(SchedulingError):
+        servico.agendar(b, medico, BASE, BASE + timedelta(minutes=30))
+
+
+class _RepositorioEmLista(RepositorioAgendamento):
+    def __init__(self):
+        self.consultas = []
+
+    def consulta_salva(self, consulta):
+        self.consultas.append((consulta.id, consulta.status))
+
+
+def test_repositorio_recebe_cada_mudanca_de_consulta():
+    medico = _medico()
+    servico = _servico_com_slots(medico)
+    servico.repositorio = repositorio = _RepositorioEmLista()
+    a, b = _paciente("Paciente A"), _paciente("Paciente B")
+    primeira = servico.agendar(a, medico, BASE, BASE + timedelta(minutes=30))
+    concorrente = servico.agendar(b, medico, BASE, BASE + timedelta(minutes=30))
+
+    servico.confirmar(primeira.id)
+    with pytest.raises(SchedulingError):
+        servico.confirmar(primeira.id)
+
+    assert repositorio.consultas == [
+        (primeira.id, StatusConsulta.AGENDADA),
+        (concorrente.id, StatusConsulta.AGENDADA),
+        (primeira.id, StatusConsulta.CONFIRMADA),
+        (concorrente.id, StatusConsulta.CANCELADA),
+    ]
+
+
+class _RepositorioParado(RepositorioAgendamento):
+    def __init__(self):
+        self.parado = False
+
+    def verificar(self):
+        if self.parado:
+            raise RuntimeError("gravação parada")
+
+    def consulta_salva(self, consulta):
+        self.verificar()
+
+
+def test_repositorio_parado_recusa_a_mudanca_antes_de_aplicar():
+    medico = _medico()
+    servico = _servico_com_slots(medico)
+    gravacao, cache = _RepositorioParado(), _RepositorioEmLista()
+    servico.repositorio = RepositorioComposto(gravacao, cache)
+    consulta = servico.agendar(_paciente(), medico, BASE, BASE + timedelta(minutes=30))
+    versao = servico.versoes.atual
+
+    gravacao.parado = True
+    with pytest.raises(RuntimeError):
+        servico.confirmar(consulta.id)
+    with pytest.raises(RuntimeError):
+        servico.disponibilizar_slot(medico, BASE + timedelta(hours=5), BASE + timedelta(hours=6))
+    # nada mudou em memória: status, agenda e versões continuam como o destino os conhece
+    assert consulta.status == StatusConsulta.AGENDADA
+    assert servico.versoes.atual == versao
+    assert len(servico.slots_disponiveis(medico)) == 4
+
+    # se a gravação parar depois da verificação, os demais repositórios ainda recebem a mudança
+    with pytest.raises(RuntimeError):
+        servico.repositorio.consulta_salva(consulta)
+    assert cache.consultas[-1] == (consulta.id, StatusConsulta.AGENDADA)
+    assert len(cache.consultas) == 2
+
+
+def test_indices_reconstruidos_a_partir_de_consultas_existentes():
+    medico = _medico()
+    servico = _servico_com_slots(medico)
+    consulta = servico.agendar(_paciente(), medico, BASE, BASE + timedelta(minutes=30))
+    servico.confirmar(consulta.id)
+
+    copia = AgendamentoService(agendas=servico.agendas, consultas=dict(servico.consultas))
+
+    assert [c.id for c in copia.consultas_do_medico(medico)] == [consulta.id]
+    with pytest.raises(SchedulingError):
+        copia.agendar(_paciente("Outro Paciente"), medico, BASE, BASE + timedelta(minutes=30))
+
+
+def test_indice_de_intervalos_esquece_a_duracao_do_intervalo_removido():
+    indice = IndiceIntervalos()
+    meia_hora, dia = timedelta(minutes=30), timedelta(days=1)
+    indice.adicionar_varios([("longo", BASE, BASE + dia), ("curto", BASE, BASE + meia_hora)])
+    indice.adicionar("outro curto", BASE + dia, BASE + dia + meia_hora)
+    assert indice._maior_duracao == dia
+    assert list(indice.sobrepostos(BASE + dia - meia_hora, BASE + dia)) == ["longo"]
+
+    indice.remover("longo", BASE)
+    # a busca volta a recuar só o tamanho dos intervalos que restam
+    assert indice._maior_duracao == meia_hora
+    assert list(indice.sobrepostos(BASE + dia - meia_hora, BASE + dia)) == []
+    assert list(indice.sobrepostos(BASE + timedelta(minutes=15), BASE + dia + meia_hora)) == ["curto", "outro curto"]
+    indice.remover("curto", BASE)
+    indice.remover("outro curto", BASE + dia)
+    assert indice._maior_duracao == timedelta(0) and not indice._duracoes
+
+
+def test_conflito_e_historico_do_paciente_entre_medicos():
+    ana, bruno = _medico("Dra. Ana"), _medico("Dr. Bruno")
+    servico = _servico_com_slots(ana)
+    for i in range(4):
+        inicio = BASE + timedelta(minutes=30 * i)
+        servico.disponibilizar_slot(bruno, inicio, inicio + timedelta(minutes=30))
+    paciente = _paciente()
+    tardia = servico.agendar(paciente, bruno, BASE + timedelta(minutes=60), BASE + timedelta(minutes=90))
+    cedo = servico.agendar(paciente, ana, BASE, BASE + timedelta(minutes=30))
+
+    with pytest.raises(SchedulingError):
+        servico.agendar(paciente, bruno, BASE, BASE + timedelta(minutes=30))
+
+    servico.cancelar(cedo.id, agora=BASE - timedelta(days=1))
+    nova = servico.agendar(paciente, bruno, BASE, BASE + timedelta(minutes=30))
+
+    historico = servico.historico_do_paciente(paciente)
+    assert {c.id for c in historico} == {cedo.id, nova.id, tardia.id}
+    assert [c.inicio for c in historico] == sorted(c.inicio for c in historico)
+
+
+def test_listagem_paginada_por_cursor_segue_inicio_e_id():
+    ana, bruno = _medico("Dra. Ana"), _medico("Dr. Bruno")
+    servico = _servico_com_slots(ana, quantidade=6)
+    for i in range(6):
+        inicio = BASE + timedelta(minutes=30 * i)
+        servico.disponibilizar_slot(bruno, inicio, inicio + timedelta(minutes=30))
+    pacientes = [_paciente(f"Paciente {n}") for n in "ABCDEF"]
+    for i, paciente in enumerate(pacientes):
+        inicio = BASE + timedelta(minutes=30 * i)
+        servico.agendar(paciente, ana if i % 2 else bruno, inicio, inicio + timedelta(minutes=30))
+        # mesmo início em outro médico: o id desempata
+        servico.agendar(pacientes[(i + 3) % 6], bruno if i % 2 else ana, inicio, inicio + timedelta(minutes=30))
+    servico.confirmar(next(iter(servico.consultas)))
+
+    todas, depois = [], None
+    while True:
+        pagina = servico.listar_consultas(depois=depois, limite=5)
+        todas += pagina
+        if len(pagina) < 5:
+            break
+        depois = (pagina[-1].inicio, pagina[-1].id)
+    assert [(c.inicio, c.id) for c in todas] == sorted((c.inicio, c.id) for c in servico.consultas.values())
+
+    da_ana = servico.listar_consultas(medico_id=ana.id, status=StatusConsulta.AGENDADA)
+    assert da_ana == [c for c in todas if c.medico_id == ana.id and c.status == StatusConsulta.AGENDADA]
+    janela = servico.listar_consultas(de=BASE + timedelta(minutes=60), ate=BASE + timedelta(minutes=120))
+    assert janela == [c for c in todas if BASE + timedelta(minutes=60) <= c.inicio < BASE + timedelta(minutes=120)]
+    com_fuso = servico.listar_consultas(de=datetime(2030, 1, 7, 7, 0, tzinfo=timezone(timedelta(hours=-3))))
+    assert com_fuso == [c for c in todas if c.inicio >= datetime(2030, 1, 7, 10, 0)]
+    assert servico.listar_consultas(paciente_id=pacientes[0].id, medico_id=ana.id) == [
+        c for c in todas if c.paciente_id == pacientes[0].id and c.medico_id == ana.id
+    ]
+
+
+def test_agenda_mantem_slots_ordenados_e_consulta_por_intervalo():
+    agenda = Agenda(medico_id="m1")
+    for i in (3, 0, 2, 1):
+        inicio = BASE + timedelta(minutes=30 * i)
+        agenda.adicionar_slot(inicio, inicio + timedelta(minutes=30))
+    agenda.bloquear(BASE + timedelta(minutes=60), BASE + timedelta(minutes=75))
+
+    with pytest.raises(ValidationError):
+        agenda.adicionar_slot(BASE + timedelta(minutes=15), BASE + timedelta(minutes=45))
+    assert [s.inicio for s in agenda.slots()] == sorted(s.inicio for s in agenda.slots())
+
+    janela = list(agenda.slots(BASE + timedelta(minutes=30), BASE + timedelta(minutes=90)))
+    assert [(s.inicio - BASE, s.bloqueado) for s in janela] == [
+        (timedelta(minutes=30), False),
+        (timedelta(minutes=60), False),
+        (timedelta(minutes=60), True),
+    ]
+    assert agenda.encontrar_slot_disponivel(BASE + timedelta(minutes=60), BASE + timedelta(minutes=90))
+    assert agenda.encontrar_slot_disponivel(BASE + timedelta(minutes=60), BASE + timedelta(minutes=75)) is None
+
+    agenda.desbloquear(BASE + timedelta(minutes=60), BASE + timedelta(minutes=75))
+    assert not any(s.bloqueado for s in agenda.slots())
+
+
+def test_agenda_compacta_normaliza_para_utc_em_minutos():
+    agenda = Agenda(medico_id="m1")
+    brasilia = timezone(timedelta(hours=-3))
+    agenda.adicionar_slot(datetime(2030, 1, 7, 9, 0, tzinfo=brasilia), datetime(2030, 1, 7, 9, 30, tzinfo=brasilia))
+
+    assert list(agenda.slots()) == [SlotAgenda(datetime(2030, 1, 7, 12, 0), datetime(2030, 1, 7, 12, 30))]
+    assert agenda.encontrar_slot_disponivel(datetime(2030, 1, 7, 12, 0), datetime(2030, 1, 7, 12, 30))
+    with pytest.raises(ValidationError):
+        agenda.adicionar_slot(datetime(2030, 1, 7, 13, 0, 30), datetime(2030, 1, 7, 13, 30))
+
+
+def test_regra_semanal_gera_slots_sob_demanda_com_excecoes():
+    medico = _medico()
+    servico = AgendamentoService()
+    # BASE é uma segunda-feira; expediente das 08:00 às 10:00 com slots de 30 minutos
+    regra = RegraRecorrencia(0, time(8, 0), time(10, 0), 30, vigente_de=BASE.date(), vigente_ate=date(2030, 12, 31))
+    servico.adicionar_regra(medico, regra)
+    with pytest.raises(ValidationError):
+        servico.adicionar_regra(medico, RegraRecorrencia(0, time(9, 0), time(11, 0), 30, vigente_de=BASE.date()))
+    servico.bloquear_horario(medico, BASE + timedelta(days=7), BASE + timedelta(days=7, minutes=30))
+
+    janela = servico.slots_disponiveis(medico, BASE, BASE + timedelta(days=14))
+    assert len(janela) == 4 + 3
+    assert BASE + timedelta(days=7) not in [s.inicio for s in janela]
+    assert len(servico.agendas[medico.id]) == 1  # apenas o bloqueio foi materializado
+
+    consulta = servico.agendar(_paciente(), medico, BASE + timedelta(minutes=30), BASE + timedelta(minutes=60))
+    servico.confirmar(consulta.id)
+    assert len(servico.slots_disponiveis(medico, BASE, BASE + timedelta(days=1))) == 3
+    with pytest.raises(SchedulingError):
+        servico.agendar(_paciente("Outro Paciente"), medico, BASE + timedelta(minutes=10), BASE + timedelta(minutes=40))
+
+
+def test_mapa_de_ocupacao_acompanha_agenda_e_confirmacoes():
+    medico = _medico()
+    servico = _servico_com_slots(medico)  # 08:00-10:00 em slots de 30 minutos
+    fim_do_dia = BASE + timedelta(hours=2)
+
+    assert servico.horario_livre(medico, BASE, fim_do_dia)
+    assert [s.inicio for s in servico.blocos_livres(medico, BASE.date(), BASE.date(), 120)] == [BASE]
+
+    consulta = servico.agendar(_paciente(), medico, BASE + timedelta(minutes=30), BASE + timedelta(minutes=60))
+    assert servico.horario_livre(medico, BASE, fim_do_dia)  # ainda não confirmada
+    servico.confirmar(consulta.id)
+    servico.bloquear_horario(medico, BASE + timedelta(minutes=90), BASE + timedelta(minutes=95))
+
+    assert not servico.horario_livre(medico, BASE + timedelta(minutes=45), BASE + timedelta(minutes=75))
+    assert servico.horario_livre(medico, BASE + timedelta(minutes=60), BASE + timedelta(minutes=90))
+    blocos = servico.blocos_livres(medico, BASE.date(), BASE.date(), 30)
+    assert [b.inicio - BASE for b in blocos] == [timedelta(0), timedelta(minutes=60)]
+
+
+def test_busca_vetorizada_de_blocos_equivale_a_busca_com_inteiros(monkeypatch):
+    from app.domain.services import ocupacao
+
+    if ocupacao.np is None:
+        pytest.skip("NumPy não instalado")
+    medico = _medico()
+    servico = AgendamentoService()
+    servico.adicionar_regra(medico, RegraRecorrencia(BASE.weekday(), time(8, 0), time(12, 0), 20, vigente_de=BASE.date()))
+    servico.bloquear_horario(medico, BASE + timedelta(days=7, minutes=35), BASE + timedelta(days=7, minutes=50))
+    de, ate = BASE.date(), BASE.date() + timedelta(days=20)
+
+    vetorizado = servico.blocos_livres(medico, de, ate, 45)
+    monkeypatch.setattr(ocupacao, "np", None)
+    assert vetorizado == servico.blocos_livres(medico, de, ate, 45)
+    assert len(vetorizado) > 0
+
+
+def test_proximos_slots_intercala_medicos_em_ordem_de_inicio():
+    ana, bruno = _medico("Dra. Ana"), _medico("Dr. Bruno")
+    servico = AgendamentoService()
+    for i in range(3):
+        inicio = BASE + timedelta(hours=i)
+        servico.disponibilizar_slot(ana, inicio, inicio + timedelta(minutes=30))
+        servico.disponibilizar_slot(bruno, inicio + timedelta(minutes=30), inicio + timedelta(minutes=60))
+    confirmada = servico.agendar(_paciente(), ana, BASE + timedelta(hours=1), BASE + timedelta(hours=1, minutes=30))
+    servico.confirmar(confirmada.id)
+
+    encontrados = servico.proximos_slots([ana, bruno], BASE + timedelta(minutes=1), limite=3)
+
+    assert [(m.nome, s.inicio - BASE) for m, s in encontrados] == [
+        ("Dr. Bruno", timedelta(minutes=30)),
+        ("Dr. Bruno", timedelta(minutes=90)),
+        ("Dra. Ana", timedelta(hours=2)),
+    ]
+
+
+def _em_paralelo(tarefas):
+    """Dispara todas as tarefas ao mesmo tempo (com troca de threads agressiva) e devolve os erros."""
+    barreira = threading.Barrier(len(tarefas))
+    erros = []
+
+    def executar(tarefa):
+        barreira.wait()
+        try:
+            tarefa()
+        except SchedulingError as err:
+            erros.append(err)
+
+    intervalo_original = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=executar, args=(t,)) for t in tarefas]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        sys.setswitchinterval(intervalo_original)
+    return erros
+
+
+def test_concorrencia_nao_gera_consultas_sobrepostas_para_o_paciente():
+    medicos = [_medico(f"Dr. Medico{i}") for i in range(8)]
+    servico = AgendamentoService()
+    for medico in medicos:
+        servico.disponibilizar_slot(medico, BASE, BASE + timedelta(minutes=30))
+    paciente = _paciente()
+
+    for _ in range(20):
+        erros = _em_paralelo([lambda m=m: servico.agendar(paciente, m, BASE, BASE + timedelta(minutes=30)) for m in medicos])
+        ativas = [c for c in servico.historico_do_paciente(paciente) if c.status == StatusConsulta.AGENDADA]
+        assert len(ativas) == 1 and len(erros) == len(medicos) - 1
+        servico.cancelar(ativas[0].id, agora=BASE - timedelta(days=1))
+
+
+def test_confirmacoes_concorrentes_confirmam_uma_unica_consulta():
+    medico = _medico()
+    servico = _servico_com_slots(medico, quantidade=1)
+    for rodada in range(20):
+        pacientes = [_paciente(f"Paciente R{rodada}P{i}") for i in range(8)]
+        consultas = [servico.agendar(p, medico, BASE, BASE + timedelta(minutes=30)) for p in pacientes]
+        _em_paralelo([lambda c=c: servico.confirmar(c.id) for c in consultas])
+        confirmadas = [c for c in consultas if c.status == StatusConsulta.CONFIRMADA]
+        assert len(confirmadas) == 1
+        assert all(c.status == StatusConsulta.CANCELADA for c in consultas if c is not confirmadas[0])
+        servico.cancelar(confirmadas[0].id, agora=BASE - timedelta(days=1))
+
+
+def test_listagem_do_medico_e_um_retrato_mesmo_com_mudancas_concorrentes():
+    medico = _medico()
+    servico = _servico_com_slots(medico, quantidade=8)
+    for rodada in range(10):
+        consultas = [
+            servico.agendar(
+                _paciente(f"Paciente R{rodada}P{i}"),
+                medico,
+                BASE + timedelta(minutes=30 * i),
+                BASE + timedelta(minutes=30 * (i + 1)),
+            )
+            for i in range(8)
+        ]
+        todas = sorted(servico.consultas)
+        paginas = []
+        mudancas = [lambda c=c: servico.confirmar(c.id) for c in consultas[::2]]
+        mudancas += [lambda c=c: servico.cancelar(c.id, agora=BASE - timedelta(days=1)) for c in consultas[1::2]]
+        leituras = [lambda: paginas.append(sorted(c.id for c in servico.listar_consultas(medico_id=medico.id))) for _ in range(4)]
+        _em_paralelo(mudancas + leituras)
+        # cada leitura viu todas as consultas do médico, uma vez cada, nenhuma no meio de uma troca de status
+        assert paginas == [todas] * 4
+        for consulta in consultas[::2]:
+            servico.cancelar(consulta.id, agora=BASE - timedelta(days=1))
+    # as travas por chave somem quando ninguém mais as usa
+    assert len(servico._travas) == 0
+
+
+def test_registro_de_mudancas_limitado_pede_ressincronizar():
+    medico, paciente = _medico(), _paciente()
+    servico = AgendamentoService(versoes=Versoes(retencao=3))
+    servico.disponibilizar_slot(medico, BASE, BASE + timedelta(minutes=30))
+    consulta = servico.agendar(paciente, medico, BASE, BASE + timedelta(minutes=30))
+    assert [(m.tipo, m.consulta_id) for _, m in servico.versoes.desde(0)] == [
+        (TipoMudanca.SLOTS, None),
+        (TipoMudanca.CONSULTA, consulta.id),
+    ]
+    servico.confirmar(consulta.id)
+    servico.cancelar(consulta.id)
+    # só as três últimas ficaram: quem parou na versão 0 perdeu a primeira
+    assert servico.versoes.desde(0) is None
+    assert [v for v, _ in servico.versoes.desde(1)] == [2, 3, 4]
+    assert servico.versoes.desde(4) == []
+    assert servico.versoes.desde(5) is None
+
+
+def test_slots_livres_em_cache_acompanham_cada_mudanca():
+    medico = _medico()
+    pacientes = [_paciente(f"Paciente {i}") for i in range(6)]
+    servico = AgendamentoService()
+    sorteio = random.Random(7)
+
+    def recalculados():
+        agenda = servico.agendas[medico.id]
+        return [
+            s
+            for s in agenda.slots()
+            if not s.bloqueado
+            and not any(
+                c.status == StatusConsulta.CONFIRMADA and c.medico_id == medico.id and c.inicio < s.fim and s.inicio < c.fim
+                for c in servico.consultas.values()
+            )
+        ]
+
+    servico.disponibilizar_slots(medico, [(BASE + timedelta(minutes=30 * i), BASE + timedelta(minutes=30 * i + 30)) for i in range(40)])
+    assert servico.slots_disponiveis(medico) == recalculados()
+    for _ in range(200):
+        inicio = BASE + timedelta(minutes=30 * sorteio.randrange(50))
+        fim = inicio + timedelta(minutes=30)
+        acao = sorteio.random()
+        try:
+            if acao < 0.3:
+                servico.agendar(sorteio.choice(pacientes), medico, inicio, fim)
+            elif acao < 0.55:
+                agendadas = [c for c in servico.consultas.values() if c.status == StatusConsulta.AGENDADA]
+                if agendadas:
+                    servico.confirmar(sorteio.choice(agendadas).id)
+            elif acao < 0.75:
+                ativas = [c for c in servico.consultas.values() if c.status in (StatusConsulta.AGENDADA, StatusConsulta.CONFIRMADA)]
+                if ativas:
+                    servico.cancelar(sorteio.choice(ativas).id, agora=BASE - timedelta(days=1))
+            elif acao < 0.85:
+                servico.disponibilizar_slot(medico, inicio, fim)
+            elif acao < 0.95:
+                servico.bloquear_horario(medico, inicio, fim)
+            else:
+                servico.desbloquear_horario(medico, inicio, fim)
+        except (SchedulingError, ValidationError):
+            pass
+        assert servico.slots_disponiveis(medico) == recalculados()
+        de = BASE + timedelta(minutes=15 * sorteio.randrange(100))
+        assert servico.slots_disponiveis(medico, de, de + timedelta(hours=3)) == [
+            s for s in recalculados() if de <= s.inicio < de + timedelta(hours=3)
+        ]
+    estatisticas = servico.estatisticas_slots
+    # montada uma vez; depois disso só trechos refeitos
+    assert estatisticas.faltas == 1 and estatisticas.acertos >= 400 and estatisticas.atualizacoes > 0
+
+
+def test_horarios_com_fuso_sao_guardados_em_utc_sem_fuso():
+    medico, ana, bia = _medico(), _paciente("Paciente Ana"), _paciente("Paciente Bia")
+    servico = AgendamentoService()
+    dez_z = datetime.fromisoformat("2031-03-03T10:00:00Z")
+    servico.disponibilizar_slot(medico, dez_z, dez_z + timedelta(minutes=30))
+    servico.disponibilizar_slot(medico, datetime(2031, 3, 3, 11, 0), datetime(2031, 3, 3, 11, 30))
+    # 12:00 em Brasília = 15:00 UTC
+    servico.disponibilizar_slot(
+        medico, datetime.fromisoformat("2031-03-03T12:00:00-03:00"), datetime.fromisoformat("2031-03-03T12:30:00-03:00")
+    )
+
+    com_fuso = servico.agendar(
+        ana, medico, datetime.fromisoformat("2031-03-03T10:00:00+00:00"), datetime.fromisoformat("2031-03-03T10:30:00+00:00")
+    )
+    servico.confirmar(com_fuso.id)
+    sem_fuso = servico.agendar(bia, medico, datetime(2031, 3, 3, 11, 0), datetime(2031, 3, 3, 11, 30))
+    assert com_fuso.inicio == datetime(2031, 3, 3, 10, 0) and com_fuso.inicio.tzinfo is None
+
+    assert [s.inicio for s in servico.slots_disponiveis(medico)] == [datetime(2031, 3, 3, 11, 0), datetime(2031, 3, 3, 15, 0)]
+    assert [c.id for c in servico.listar_consultas()] == [com_fuso.id, sem_fuso.id]
+    assert [c.id for c in servico.listar_consultas(medico_id=medico.id, de=datetime.fromisoformat("2031-03-03T10:30:00Z"))] == [
+        sem_fuso.id
+    ]
+    remarcada = servico.remarcar(sem_fuso.id, datetime.fromisoformat("2031-03-03T15:00:00Z"), datetime.fromisoformat("2031-03-03T15:30:00Z"))
+    assert remarcada.inicio == datetime(2031, 3, 3, 15, 0)
+    servico.cancelar(com_fuso.id, agora=datetime.fromisoformat("2031-03-01T00:00:00+00:00"))
+    assert [s.inicio for s in servico.slots_disponiveis(medico)] == [
+        datetime(2031, 3, 3, 10, 0), datetime(2031, 3, 3, 11, 0), datetime(2031, 3, 3, 15, 0)
+    ]
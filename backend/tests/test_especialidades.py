@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+# Adiciona o diretório backend ao Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.especialidades import IndiceEspecialidades, normalizar  # noqa: E402
+
+
+def test_busca_por_prefixo_sem_acento_em_ordem_estavel_e_paginada():
+    indice = IndiceEspecialidades()
+    indice.indexar("ana", ["Cardiologia", "Clínica Geral"])
+    indice.indexar("bruno", ["Ortopedia"])
+    indice.indexar("carla", ["CLINICA médica"])
+    indice.indexar("davi", ["Cardiologia pediátrica"])
+
+    assert normalizar("Clínica Geral") == normalizar("CLINICA geral") == "clinica geral"
+    assert indice.buscar("clinica geral") == ["ana"]
+    assert indice.buscar("Clín") == ["ana", "carla"]
+    assert indice.buscar("card ped") == ["davi"]
+    assert indice.buscar("logia") == []
+    assert indice.buscar("  ") == ["ana", "bruno", "carla", "davi"]
+
+    # páginas pela posição do último da página anterior
+    primeira = indice.buscar("c", limite=2)
+    assert primeira == ["ana", "carla"]
+    assert indice.buscar("c", depois=indice.posicao(primeira[-1]), limite=2) == ["davi"]
+    assert indice.buscar(None, depois=indice.posicao("bruno")) == ["carla", "davi"]
+
+    # recadastro troca os termos, mas o médico mantém a posição
+    indice.indexar("ana", ["Dermatologia"])
+    assert indice.buscar("clin") == ["carla"]
+    assert indice.buscar("derm") == ["ana"]
+    assert indice.buscar("cardiologia") == ["davi"]
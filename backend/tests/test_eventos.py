@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+# Adiciona o diretório backend ao Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.domain import AgendamentoService, Medico, Paciente  # noqa: E402
+from app.domain.services.travas import chave_medico, chave_paciente  # noqa: E402
+from app.eventos import HubEventos, chave_agenda  # noqa: E402
+
+BASE = datetime(2030, 1, 7, 8, 0)
+
+
+def _mensagem(bruta: bytes):
+    evento, dados = bruta.decode("utf-8").strip().split("\n")
+    return evento.removeprefix("event: "), json.loads(dados.removeprefix("data: "))
+
+
+def test_eventos_vao_so_para_o_escopo_e_quem_atrasa_e_descartado():
+    medico, outro = Medico.novo("Dr. Ana", "ana@clinic.com"), Medico.novo("Dr. Bruno", "bruno@clinic.com")
+    paciente = Paciente.novo("João", "joao@email.com")
+    hub = HubEventos(lambda c: json.dumps({"id": c.id, "status": c.status.value}).encode(), capacidade=2)
+    servico = AgendamentoService(repositorio=hub)
+
+    async def cenario():
+        do_paciente = hub.acompanhar({chave_paciente(paciente.id)})
+        da_agenda = hub.acompanhar({chave_agenda(medico.id)})
+        do_outro = hub.acompanhar({chave_medico(outro.id)}, intervalo_ping=0.01)
+        for assinante in (do_paciente, da_agenda, do_outro):
+            assert await anext(assinante) == b": conectado\n\n"
+        assert hub.assinantes == 3
+
+        # as mudanças acontecem nas threads das requisições
+        fim = BASE + timedelta(minutes=30)
+        await asyncio.to_thread(servico.disponibilizar_slot, medico, BASE, fim)
+        consulta = await asyncio.to_thread(servico.agendar, paciente, medico, BASE, fim)
+        assert _mensagem(await anext(da_agenda)) == (
+            "agenda",
+            {"tipo": "SLOTS", "medico_id": medico.id, "intervalos": [{"inicio": BASE.isoformat(), "fim": fim.isoformat()}]},
+        )
+        assert _mensagem(await anext(do_paciente)) == ("consulta", {"id": consulta.id, "status": "AGENDADA"})
+
+        # sem consumir, a fila de 2 estoura no terceiro evento e o assinante é desconectado
+        for _ in range(3):
+            await asyncio.to_thread(servico.bloquear_horario, medico, BASE, fim)
+            await asyncio.to_thread(servico.desbloquear_horario, medico, BASE, fim)
+        await asyncio.sleep(0)
+        assert hub.descartados == 1
+        assert await anext(da_agenda) == b"event: ressincronizar\ndata: {}\n\n"
+        assert await anext(da_agenda, None) is None
+
+        # nada da Dra. Ana chegou ao assinante do outro médico, que só recebe o ping
+        assert await anext(do_outro) == b": ping\n\n"
+        for assinante in (do_paciente, do_outro):
+            await assinante.aclose()
+        assert hub.assinantes == 0 and not hub._por_chave
+
+    asyncio.run(cenario())
+
+
+def test_conexao_termina_quando_a_sessao_deixa_de_valer():
+    medico = Medico.novo("Dr. Ana", "ana@clinic.com")
+    hub = HubEventos(lambda c: b"{}")
+    servico = AgendamentoService(repositorio=hub)
+    sessao = {"ativa": True}
+
+    async def cenario():
+        ociosa = hub.acompanhar({chave_medico(medico.id)}, valido=lambda: sessao["ativa"], intervalo_ping=0.01)
+        ativa = hub.acompanhar({chave_agenda(medico.id)}, valido=lambda: sessao["ativa"], intervalo_ping=60)
+        for assinante in (ociosa, ativa):
+            assert await anext(assinante) == b": conectado\n\n"
+        assert await anext(ociosa) == b": ping\n\n"
+
+        # depois do logout nem o ping nem a mudança seguinte chegam: a conexão é encerrada
+        sessao["ativa"] = False
+        await asyncio.to_thread(servico.disponibilizar_slot, medico, BASE, BASE + timedelta(minutes=30))
+        for assinante in (ociosa, ativa):
+            assert await anext(assinante) == b"event: sessao_encerrada\ndata: {}\n\n"
+            assert await anext(assinante, None) is None
+        assert hub.assinantes == 0 and not hub._por_chave
+
+    asyncio.run(cenario())
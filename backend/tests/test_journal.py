@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+from datetime import date, datetime, time, timedelta, timezone
+
+import pytest
+
+# Adiciona o diretório backend ao Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app.journal importa app.db, que abre o banco ao ser importado
+os.environ.setdefault("MEDSCHED_DB_PATH", os.environ.get("PYTEST_DB_PATH", "/tmp/medsched_test.db"))
+
+from app.domain import AgendamentoService, Medico, Paciente, RegraRecorrencia, StatusConsulta  # noqa: E402
+from app.journal import JournalAgenda  # noqa: E402
+
+BASE = datetime(2030, 1, 7, 8, 0)
+MEIA_HORA = timedelta(minutes=30)
+
+
+def _abrir(pasta):
+    journal = JournalAgenda(str(pasta))
+    agendas, consultas = journal.carregar()
+    return journal, AgendamentoService(agendas=agendas, consultas=consultas, repositorio=journal)
+
+
+def _retrato(servico, medico):
+    consultas = {c.id: (c.status, c.inicio, c.fim, c.observacoes) for c in servico.consultas.values()}
+    agenda = servico.criar_agenda_se_nao_existir(medico)
+    slots = list(agenda.slots(BASE, BASE + timedelta(days=14)))
+    return consultas, slots, agenda.regras()
+
+
+def _movimentar(servico, medico, pacientes, deslocamento):
+    inicio = BASE + deslocamento
+    servico.disponibilizar_slots(medico, [(inicio + MEIA_HORA * i, inicio + MEIA_HORA * (i + 1)) for i in range(4)])
+    servico.bloquear_horario(medico, inicio + MEIA_HORA * 3, inicio + MEIA_HORA * 4)
+    a = servico.agendar(pacientes[0], medico, inicio, inicio + MEIA_HORA)
+    b = servico.agendar(pacientes[1], medico, inicio, inicio + MEIA_HORA)
+    servico.confirmar(a.id)
+    c = servico.agendar(pacientes[1], medico, inicio + MEIA_HORA, inicio + MEIA_HORA * 2)
+    servico.cancelar(c.id, agora=BASE - timedelta(days=1))
+    return a, b, c
+
+
+def test_journal_reconstroi_agenda_e_consultas(tmp_path):
+    medico = Medico.novo("Dr. Journal", "journal@clinic.com")
+    pacientes = [Paciente.novo("Paciente A", "a@email.com"), Paciente.novo("Paciente B", "b@email.com")]
+    journal, servico = _abrir(tmp_path)
+    a, b, _ = _movimentar(servico, medico, pacientes, timedelta(0))
+    servico.adicionar_regra(medico, RegraRecorrencia(0, time(13, 0), time(15, 0), 30, date(2030, 1, 1)))
+    # instantes com fuso e texto livre sobrevivem à serialização
+    brasilia = timezone(timedelta(hours=-3))
+    servico.disponibilizar_slot(medico, datetime(2030, 1, 8, 9, 0, tzinfo=brasilia), datetime(2030, 1, 8, 10, 0, tzinfo=brasilia))
+    a.anotar("retorno em 30 dias")
+    servico.repositorio.consulta_salva(a)
+    esperado = _retrato(servico, medico)
+    journal.fechar()
+
+    journal, reaberto = _abrir(tmp_path)
+    assert _retrato(reaberto, medico) == esperado
+    assert reaberto.consultas[b.id].status == StatusConsulta.CANCELADA
+    journal.fechar()
+
+
+def test_snapshot_substitui_segmentos_e_ignora_registro_truncado(tmp_path):
+    medico = Medico.novo("Dr. Snapshot", "snapshot@clinic.com")
+    pacientes = [Paciente.novo("Paciente A", "a@email.com"), Paciente.novo("Paciente B", "b@email.com")]
+    journal, servico = _abrir(tmp_path)
+    _movimentar(servico, medico, pacientes, timedelta(0))
+    servico.desbloquear_horario(medico, BASE + MEIA_HORA * 3, BASE + MEIA_HORA * 4)
+    journal.compactar()
+    _movimentar(servico, medico, pacientes, timedelta(days=1))
+    esperado = _retrato(servico, medico)
+    journal.fechar()
+
+    arquivos = sorted(os.listdir(tmp_path))
+    assert arquivos == ["journal-000000000002.bin", "snapshot-000000000001.bin"]
+    # simula uma queda no meio de uma escrita: o registro incompleto é descartado
+    with open(tmp_path / arquivos[0], "ab") as arquivo:
+        arquivo.write(b"\x40\x00\x00\x00\x00")
+
+    journal, reaberto = _abrir(tmp_path)
+    assert _retrato(reaberto, medico) == esperado
+    reaberto.disponibilizar_slot(medico, BASE + timedelta(days=2), BASE + timedelta(days=2) + MEIA_HORA)
+    journal.fechar()
+    journal, de_novo = _abrir(tmp_path)
+    assert len(de_novo.agendas[medico.id]) == len(reaberto.agendas[medico.id])
+    journal.fechar()
+
+
+def _fsync_que_falha(falhas):
+    restantes = {"falhas": falhas}
+    original = os.fsync
+
+    def fsync(descritor):
+        if restantes["falhas"]:
+            restantes["falhas"] -= 1
+            raise OSError(28, "No space left on device")
+        original(descritor)
+
+    return fsync
+
+
+def test_falha_de_gravacao_e_refeita_sem_duplicar_registros(tmp_path, monkeypatch):
+    medico = Medico.novo("Dr. Disco", "disco@clinic.com")
+    pacientes = [Paciente.novo("Paciente A", "a@email.com"), Paciente.novo("Paciente B", "b@email.com")]
+    journal = JournalAgenda(str(tmp_path), intervalo=60, espera_tentativa=0.001)
+    servico = AgendamentoService(repositorio=journal)
+    _movimentar(servico, medico, pacientes, timedelta(0))
+    esperado = _retrato(servico, medico)
+    # os bytes chegam ao arquivo, mas o fsync falha duas vezes: o trecho é desfeito e regravado
+    monkeypatch.setattr(os, "fsync", _fsync_que_falha(2))
+    journal.descarregar()
+    journal.fechar()
+
+    journal, reaberto = _abrir(tmp_path)
+    assert _retrato(reaberto, medico) == esperado
+    journal.fechar()
+
+
+def test_falha_definitiva_para_o_journal_e_recusa_novas_mudancas(tmp_path, monkeypatch):
+    medico = Medico.novo("Dr. Disco", "disco@clinic.com")
+    journal = JournalAgenda(str(tmp_path), intervalo=60, tentativas=2, espera_tentativa=0.001)
+    servico = AgendamentoService(repositorio=journal)
+    servico.disponibilizar_slot(medico, BASE, BASE + MEIA_HORA)
+    monkeypatch.setattr(os, "fsync", _fsync_que_falha(2))
+    with pytest.raises(RuntimeError) as erro:
+        journal.descarregar()
+    assert isinstance(erro.value.__cause__, OSError)
+    with pytest.raises(RuntimeError):
+        servico.disponibilizar_slot(medico, BASE + MEIA_HORA, BASE + MEIA_HORA * 2)
+    with pytest.raises(RuntimeError):
+        journal.fechar()
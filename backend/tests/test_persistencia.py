@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+# Adiciona o diretório backend ao Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app.persistencia importa app.db, que abre o banco ao ser importado
+os.environ.setdefault("MEDSCHED_DB_PATH", os.environ.get("PYTEST_DB_PATH", "/tmp/medsched_test.db"))
+
+from app.persistencia import RepositorioSQLite  # noqa: E402
+
+INICIO = datetime(2030, 1, 7, 8, 0)
+FIM = INICIO + timedelta(minutes=30)
+
+
+class BancoInstavel:
+    """Falha nas primeiras `falhas` chamadas de `aplicar_alteracoes` e guarda os lotes aceitos."""
+
+    def __init__(self, falhas: int) -> None:
+        self.falhas = falhas
+        self.lotes = []
+
+    def aplicar_alteracoes(self, lote):
+        if self.falhas:
+            self.falhas -= 1
+            raise OSError("disco indisponível")
+        self.lotes.append(list(lote))
+
+
+def test_lote_que_falha_e_regravado_na_ordem():
+    banco = BancoInstavel(falhas=2)
+    repositorio = RepositorioSQLite(banco, espera_tentativa=0.001)
+    repositorio.slots_adicionados("m1", [(INICIO, FIM)])
+    repositorio.bloqueio_adicionado("m1", INICIO, FIM)
+    repositorio.fechar()
+    gravados = [item for lote in banco.lotes for item in lote]
+    assert [tipo for tipo, _ in gravados] == ["slot", "slot"]
+    assert [linha[3] for _, linha in gravados] == [0, 1]
+
+
+def test_falha_definitiva_para_a_gravacao_e_aparece_no_fechar():
+    banco = BancoInstavel(falhas=3)
+    repositorio = RepositorioSQLite(banco, tentativas=3, espera_tentativa=0.001)
+    repositorio.slots_adicionados("m1", [(INICIO, FIM)])
+    with pytest.raises(RuntimeError) as erro:
+        repositorio.descarregar()
+    assert isinstance(erro.value.__cause__, OSError)
+    # novas mudanças são recusadas em vez de gravadas fora de ordem
+    with pytest.raises(RuntimeError):
+        repositorio.bloqueio_adicionado("m1", INICIO, FIM)
+    with pytest.raises(RuntimeError):
+        repositorio.fechar()
+    assert banco.lotes == []
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+# Adiciona o diretório backend ao Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.sessoes import SessoesAtivas  # noqa: E402
+
+
+class _Relogio:
+    def __init__(self) -> None:
+        self.agora = 0.0
+
+    def __call__(self) -> float:
+        return self.agora
+
+
+def test_sessoes_expiram_por_ociosidade_prazo_e_tamanho():
+    relogio = _Relogio()
+    sessoes = SessoesAtivas(ociosidade=60, duracao_maxima=300, maximo=3, relogio=relogio)
+    usada, ociosa = sessoes.criar("u1"), sessoes.criar("u2")
+    relogio.agora = 50
+    assert sessoes.usuario(usada) == "u1"
+    relogio.agora = 100
+    # só a sessão sem uso há mais de 60 s sai
+    assert sessoes.ativas == 1
+    assert sessoes.usuario(ociosa) is None
+    assert sessoes.usuario(usada) == "u1"
+
+    # acima do máximo sai a usada há mais tempo, mesmo que ainda válida
+    novas = [sessoes.criar(f"n{i}") for i in range(3)]
+    assert sessoes.usuario(usada) is None
+    assert [sessoes.usuario(t) for t in novas] == ["n0", "n1", "n2"]
+
+    # renovar o uso não estende a duração máxima
+    for relogio.agora in range(130, 400, 50):
+        assert sessoes.usuario(novas[0]) == "n0"
+    relogio.agora = 401
+    assert sessoes.usuario(novas[0]) is None
+    sessoes.encerrar(novas[1])
+    assert sessoes.ativas == 0
+
+
+def test_conferir_sem_renovar_nao_adia_a_ociosidade():
+    relogio = _Relogio()
+    sessoes = SessoesAtivas(ociosidade=60, relogio=relogio)
+    token = sessoes.criar("u1")
+    # uma conexão aberta conferindo o token não mantém a sessão viva
+    for relogio.agora in (30, 55):
+        assert sessoes.usuario(token, renovar=False) == "u1"
+    relogio.agora = 61
+    assert sessoes.usuario(token, renovar=False) is None
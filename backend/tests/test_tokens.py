@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+# Adiciona o diretório backend ao Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app.db abre o banco ao ser importado; os testes nunca tocam o data.db versionado
+os.environ.setdefault("MEDSCHED_DB_PATH", os.environ.get("PYTEST_DB_PATH", "/tmp/medsched_test.db"))
+
+from app.db import Database  # noqa: E402
+from app.tokens import AssinadorTokens, TokensRevogados  # noqa: E402
+
+
+class _Relogio:
+    def __init__(self) -> None:
+        self.agora = 1_900_000_000.0
+
+    def __call__(self) -> float:
+        return self.agora
+
+
+def test_token_assinado_vale_em_outro_processo_ate_expirar_ou_ser_revogado(tmp_path):
+    relogio = _Relogio()
+    database = Database(str(tmp_path / "tokens.db"))
+    # dois "workers": mesmo segredo e mesmo banco, nenhum estado em memória compartilhado
+    emissor = AssinadorTokens(b"segredo", validade=600, revogados=TokensRevogados(database, relogio=relogio), relogio=relogio)
+    outro = AssinadorTokens(b"segredo", validade=600, revogados=TokensRevogados(database, intervalo=0, relogio=relogio), relogio=relogio)
+
+    token = emissor.emitir("usuario-1", "PACIENTE")
+    assert outro.verificar(token) == ("usuario-1", "PACIENTE")
+    dados, assinatura = token.split(".")
+    assert outro.verificar(f"{dados}x.{assinatura}") is None
+    assert AssinadorTokens(b"outro segredo", relogio=relogio).verificar(token) is None
+    assert outro.verificar("ção.ção") is None
+
+    revogado = emissor.emitir("usuario-1", "PACIENTE")
+    assert emissor.revogar(revogado)
+    assert outro.verificar(revogado) is None
+    assert outro.verificar(token) is not None
+
+    relogio.agora += 601
+    assert outro.verificar(token) is None
+    # revogações de tokens já expirados saem da tabela
+    assert database.carregar_tokens_revogados(int(relogio.agora)) == []
+    database.fechar()
@@ -68,6 +68,25 @@ async function fetchJson<T>(path: string, init?: RequestInit, token?: string): P
   return res.json();
 }
 
+// GET /consultas é paginado: o cursor da próxima página vem no cabeçalho X-Proximo-Cursor
+async function fetchConsultas(token?: string): Promise<Consulta[]> {
+  const todas: Consulta[] = [];
+  let cursor: string | null = null;
+  do {
+    const query = cursor ? `?limite=1000&cursor=${encodeURIComponent(cursor)}` : "?limite=1000";
+    const res = await fetch(`${API_URL}/consultas${query}`, {
+      headers: token ? { Authorization: `Bearer ${token}` } : {},
+    });
+    if (!res.ok) {
+      const detail = await res.json().catch(() => ({} as any));
+      throw new Error(detail.detail || res.statusText);
+    }
+    todas.push(...((await res.json()) as Consulta[]));
+    cursor = res.headers.get("X-Proximo-Cursor");
+  } while (cursor);
+  return todas;
+}
+
 function formatDateTime(value: string) {
   const dt = new Date(value);
   const day = dt.toLocaleDateString("pt-BR", { weekday: "short", day: "2-digit", month: "short" });
@@ -158,7 +177,7 @@ function App() {
       const [med, pac, cons] = await Promise.all([
         fetchJson<Usuario[]>("/medicos", undefined, session.token),
         fetchJson<Usuario[]>("/pacientes", undefined, session.token),
-        fetchJson<Consulta[]>("/consultas", undefined, session.token),
+        fetchConsultas(session.token),
       ]);
       setMedicos(med);
       setPacientes(pac);
@@ -171,7 +190,7 @@ function App() {
   async function carregarPacienteDados(pacienteId: string, medicoId?: string) {
     if (!session) return;
     try {
-      const cons = await fetchJson<Consulta[]>("/consultas", undefined, session.token);
+      const cons = await fetchConsultas(session.token);
       setConsultas(cons);
       if (medicoId) await carregarSlots(medicoId);
     } catch (err) {
@@ -183,7 +202,7 @@ function App() {
     if (!session) return;
     try {
       const [cons, slotsDisponiveis] = await Promise.all([
-        fetchJson<Consulta[]>("/consultas", undefined, session.token),
+        fetchConsultas(session.token),
         fetchJson<Slot[]>(`/agendas/${medicoId}/slots`),
       ]);
       setConsultas(cons);